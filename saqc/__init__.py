@@ -4,5 +4,6 @@
 __version__ = "1.3.0"
 
 from saqc.core.core import run
+from saqc.core.plan import compilePlan
 from saqc.flagger import *
 from saqc.funcs import register
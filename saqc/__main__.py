@@ -9,6 +9,7 @@ import pandas as pd
 from saqc.core import run
 from saqc.flagger import CategoricalFlagger
 from saqc.flagger.dmpflagger import DmpFlagger, FlagFields
+from saqc.flagger.store import readFlags, writeFlags
 
 
 FLAGGERS = {
@@ -26,6 +27,12 @@ FLAGGERS = {
     "-d", "--data", type=click.Path(exists=True), required=True, help="path to the data file",
 )
 @click.option("-o", "--outfile", type=click.Path(exists=False), help="path to the output file")
+@click.option(
+    "--flags",
+    type=click.Path(exists=True, file_okay=False),
+    help="path to a flag store (e.g. of a previous run) to start with",
+)
+@click.option("--flags-out", type=click.Path(file_okay=False), help="path to write the flag store to")
 @click.option(
     "--flagger", default="category", type=click.Choice(FLAGGERS.keys()), help="the flagging scheme to use",
 )
@@ -34,19 +41,32 @@ FLAGGERS = {
     "--log-level", default="INFO", type=click.Choice(["DEBUG", "INFO", "WARNING"]), help="set output verbosity"
 )
 @click.option("--fail/--no-fail", default=True, help="whether to stop the program run on errors")
-def main(config, data, flagger, outfile, nodata, log_level, fail):
+@click.option(
+    "--spill-dir", type=click.Path(file_okay=False), help="path to write large harmonization backtracking data to",
+)
+@click.option(
+    "--spill-threshold", type=int, help="size in bytes, above which harmonization backtracking data is written to disk",
+)
+def main(config, data, flagger, outfile, flags, flags_out, nodata, log_level, fail, spill_dir, spill_threshold):
 
     data = pd.read_csv(data, index_col=0, parse_dates=True,)
+    flagger = FLAGGERS[flagger]
 
     data_result, flagger_result = run(
         config_file=config,
-        flagger=FLAGGERS[flagger],
+        flagger=flagger,
         data=data,
+        flags=readFlags(flags, flagger, index=data.index) if flags else None,
         nodata=nodata,
         log_level=log_level,
         error_policy="raise" if fail else "warn",
+        spill_dir=spill_dir,
+        spill_threshold=spill_threshold,
     )
 
+    if flags_out:
+        writeFlags(flags_out, flagger_result)
+
     if outfile:
         flags = flagger_result.getFlags()
         flags_out = flags.where((flags.isnull() | flagger_result.isFlagged()), flagger_result.GOOD)
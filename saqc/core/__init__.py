@@ -2,3 +2,4 @@
 # -*- coding: utf-8 -*-
 
 from saqc.core.core import run
+from saqc.core.plan import compilePlan, Plan
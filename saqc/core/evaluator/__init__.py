@@ -3,7 +3,10 @@
 
 from saqc.core.evaluator.evaluator import (
     compileExpression,
+    compileWithEnv,
+    transformWithEnv,
     evalExpression,
+    evalCompiled,
     compileTree,
     parseExpression,
     initLocalEnv,
@@ -13,3 +16,7 @@ from saqc.core.evaluator.evaluator import (
 from saqc.core.evaluator.checker import DslChecker, ConfigChecker
 
 from saqc.core.evaluator.transformer import DslTransformer, ConfigTransformer
+
+from saqc.core.evaluator.fused import DslFuser, FusedExpression
+
+from saqc.core.evaluator.cache import ExpressionCache, eliminateCommonSubexpressions
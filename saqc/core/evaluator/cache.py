@@ -0,0 +1,151 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Common subexpression elimination across the generic expressions of a configuration.
+
+`eliminateCommonSubexpressions` finds the subexpressions of the (transformed) generic
+expressions, that occur more than once within a configuration, and rewrites them into
+
+    __cse__.lookup(key) if __cse__.valid(key, refs, data, flagger) else __cse__.store(key, <subexpression>)
+
+The `ExpressionCache` (see `saqc.lib.cache`) behind `__cse__` lives as long as a run and
+tracks a version of every referenced variable (its data and its flags), so a cached
+result is only reused as long as none of its inputs has changed.
+"""
+
+import ast
+from collections import Counter
+from typing import Iterable, List, Sequence, Set, Tuple
+
+from saqc.core.config import Params
+from saqc.core.evaluator.fused import FUSED_FUNCTION, FLAGGED, CONSTANT
+from saqc.lib.cache import ResultCache, resultCache, INDEX, DATA, FLAGS
+
+
+CACHE_NAME = "__cse__"
+
+# NOTE: the common subexpressions are cached along with the other results of a run
+ExpressionCache = ResultCache
+expressionCache = resultCache
+
+
+def _references(node: ast.AST) -> Tuple[Tuple[str, str], ...]:
+    """
+    The variables (data and flags) a transformed generic (sub)expression depends on
+    """
+    refs = [(INDEX, "")]
+    for n in ast.walk(node):
+        if (
+            isinstance(n, ast.Subscript)
+            and isinstance(n.value, ast.Name)
+            and n.value.id == "data"
+            and isinstance(_subscriptValue(n), ast.Constant)
+        ):
+            refs.append((DATA, _subscriptValue(n).value))
+        elif isinstance(n, ast.Call) and isinstance(n.func, ast.Name):
+            if n.func.id == "isflagged" and n.args and isinstance(n.args[0], ast.Constant):
+                refs.append((FLAGS, n.args[0].value))
+            elif n.func.id == FUSED_FUNCTION:
+                for kind, name in n.args[1].value:
+                    if kind != CONSTANT:
+                        refs.append((FLAGS if kind == FLAGGED else DATA, name))
+    # NOTE: the index alone does not make an expression worth caching
+    return tuple(sorted(set(refs))) if len(refs) > 1 else ()
+
+
+def _subscriptValue(node: ast.Subscript) -> ast.AST:
+    # NOTE: python < 3.9 wraps the subscript into an ast.Index
+    value = node.slice
+    return value.value if isinstance(value, ast.Index) else value
+
+
+def _genericKeywords(tree: ast.AST) -> List[ast.keyword]:
+    out = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and getattr(node.func, "id", None) in (Params.FLAG_GENERIC, Params.PROC_GENERIC):
+            out.extend(k for k in node.keywords if k.arg == Params.FUNC)
+    return out
+
+
+def _isCandidate(node: ast.AST) -> bool:
+    if not isinstance(node, (ast.BinOp, ast.UnaryOp, ast.Compare, ast.Call)):
+        return False
+    return bool(_references(node))
+
+
+def _candidates(tree: ast.AST) -> Iterable[ast.AST]:
+    for keyword in _genericKeywords(tree):
+        for node in ast.walk(keyword.value):
+            if _isCandidate(node):
+                yield node
+
+
+class _CseTransformer(ast.NodeTransformer):
+    def __init__(self, common: Set[str]):
+        self.common = common
+
+    def visit(self, node):
+        key = ast.dump(node) if _isCandidate(node) else None
+        if key not in self.common:
+            return super().visit(node)
+
+        refs = _references(node)
+        node = super().visit(node)
+        key = ast.Constant(value=key)
+
+        def method(name, *args):
+            func = ast.Attribute(value=ast.Name(id=CACHE_NAME, ctx=ast.Load()), attr=name, ctx=ast.Load())
+            return ast.Call(func=func, args=list(args), keywords=[])
+
+        return ast.IfExp(
+            test=method(
+                "valid",
+                key,
+                ast.Constant(value=refs),
+                ast.Name(id="data", ctx=ast.Load()),
+                ast.Name(id="flagger", ctx=ast.Load()),
+            ),
+            body=method("lookup", key),
+            orelse=method("store", key, node),
+        )
+
+
+def eliminateCommonSubexpressions(trees: Sequence[ast.AST], weights: Sequence[int] = None) -> Sequence[ast.AST]:
+    """
+    Rewrite the subexpressions of the generic expressions in `trees` (in place), that
+    occur more than once, into lookups of the `ExpressionCache`. Subexpressions only
+    occurring within the same larger common subexpression are not cached separately.
+
+    :param trees: The transformed (see `ConfigTransformer`) test expressions.
+    :param weights: The number of occurrences of every tree, default: 1.
+    """
+    weights = [1] * len(trees) if weights is None else weights
+    counts = Counter()
+    for tree, weight in zip(trees, weights):
+        for node in _candidates(tree):
+            counts[ast.dump(node)] += weight
+
+    common = set()
+    for tree in trees:
+        for keyword in _genericKeywords(tree):
+            _collectCommon(keyword.value, counts, common, parent_count=0)
+
+    if common:
+        transformer = _CseTransformer(common)
+        for tree in trees:
+            for keyword in _genericKeywords(tree):
+                keyword.value = transformer.visit(keyword.value)
+    return trees
+
+
+def _collectCommon(node: ast.AST, counts: Counter, common: Set[str], parent_count: int):
+    count = parent_count
+    if _isCandidate(node):
+        key = ast.dump(node)
+        # NOTE: if the parent is as common, the node is cached along with it
+        if counts[key] > max(parent_count, 1):
+            common.add(key)
+            count = counts[key]
+    for child in ast.iter_child_nodes(node):
+        _collectCommon(child, counts, common, count)
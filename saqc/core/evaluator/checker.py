@@ -2,6 +2,9 @@
 # -*- coding: utf-8 -*-
 
 import ast
+import sys
+
+import pandas as pd
 
 from saqc.funcs.register import FUNC_MAP
 from saqc.core.config import Params
@@ -36,6 +39,9 @@ class DslChecker(ast.NodeVisitor):
         ast.Call,
     )
 
+    # NOTE: the functions accepting an offset string as their second argument
+    WINDOW_FUNCTIONS = ("rolling_mean", "rolling_std", "rolling_max")
+
     def __init__(self, environment):
         self.environment = environment
 
@@ -43,6 +49,13 @@ class DslChecker(ast.NodeVisitor):
         func_name = node.func.id
         if func_name not in self.environment:
             raise NameError(f"unspported function: '{func_name}'")
+        if func_name in self.WINDOW_FUNCTIONS and len(node.args) == 2:
+            window = _stringValue(node.args[1])
+            if window is not None:
+                _checkWindow(window)
+                self.visit(node.func)
+                self.visit(node.args[0])
+                return
         self.generic_visit(node)
 
     def visit_Name(self, node):
@@ -105,7 +118,7 @@ class ConfigChecker(ast.NodeVisitor):
             DslChecker(self.environment).visit(value)
             return
 
-        if key not in FUNC_MAP[self.func_name].signature + self.pass_parameter:
+        if key not in FUNC_MAP.signature(self.func_name) + self.pass_parameter:
             raise TypeError(f"unknown function parameter '{node.arg}'")
 
         if not isinstance(value, self.SUPPORTED_ARGUMENTS):
@@ -120,3 +133,20 @@ class ConfigChecker(ast.NodeVisitor):
         if not isinstance(node, self.SUPPORTED_NODES):
             raise TypeError(f"invalid node: '{node}'")
         return super().generic_visit(node)
+
+
+def _stringValue(node: ast.AST):
+    # NOTE: python < 3.8 parses strings into ast.Str
+    if sys.version_info < (3, 8):
+        return node.s if isinstance(node, ast.Str) else None
+    return node.value if isinstance(node, ast.Constant) and isinstance(node.value, str) else None
+
+
+def _checkWindow(window: str):
+    # NOTE: the windows are converted like in `saqc.lib.tools.rollingWindows`
+    try:
+        delta = pd.to_timedelta(window)
+    except ValueError:
+        raise ValueError(f"invalid window: '{window}'")
+    if delta <= pd.Timedelta(0):
+        raise ValueError(f"window needs to be positive, got '{window}'")
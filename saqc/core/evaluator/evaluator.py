@@ -5,17 +5,21 @@ import ast
 import logging
 
 from functools import partial
-from typing import Any, Dict
+from types import CodeType
+from typing import Any, Dict, Iterable
 
-import astor
 import numpy as np
 import pandas as pd
 
 from saqc.flagger.baseflagger import BaseFlagger
 from saqc.core.config import Params
 from saqc.funcs.register import FUNC_MAP
+from saqc.lib.tools import rollingWindows
 from saqc.core.evaluator.checker import ConfigChecker
 from saqc.core.evaluator.transformer import ConfigTransformer
+from saqc.core.evaluator.fused import FUSED_FUNCTION, FUSIBLE_FUNCTION, evalFused, fusible, checkBackend
+from saqc.core.evaluator.cache import CACHE_NAME, expressionCache
+from saqc.lib.cache import resultCache, dataIdentity
 
 
 logger = logging.getLogger("SaQC")
@@ -27,7 +31,29 @@ def _dslIsFlagged(flagger, field, flag=None, comparator=None):
     return flagger.isFlagged(field, flag=flag, comparator=comparator)
 
 
-def initLocalEnv(data: pd.DataFrame, field: str, flagger: BaseFlagger, nodata: float) -> Dict[str, Any]:
+def _dslRolling(reducer, data, window):
+    # NOTE: the kernels are looked up by name, importing numba only if needed
+    from saqc.lib import kernels
+
+    starts, ends = rollingWindows(data.index, window)
+    values = getattr(kernels, reducer)(data.values.astype(np.float64), starts, ends)
+    return pd.Series(values, index=data.index, name=data.name)
+
+
+def _dslShift(data, periods=1):
+    return data.shift(periods)
+
+
+def _dslDiff(data, periods=1):
+    return data - data.shift(periods)
+
+
+def initLocalEnv(
+    data: pd.DataFrame, field: str, flagger: BaseFlagger, nodata: float, variables: Iterable[str] = None
+) -> Dict[str, Any]:
+
+    if variables is None:
+        variables = flagger.getFlags().columns.tolist()
 
     return {
         # general
@@ -36,7 +62,7 @@ def initLocalEnv(data: pd.DataFrame, field: str, flagger: BaseFlagger, nodata: f
         "flagger": flagger,
         "this": field,
         # transformation only
-        "variables": set(flagger.getFlags().columns.tolist()),
+        "variables": set(variables),
         "nolookup": set(["isflagged"]),  # no variable lookup for flagger based functions,
         # missing values/data
         "NAN": np.nan,
@@ -48,6 +74,11 @@ def initLocalEnv(data: pd.DataFrame, field: str, flagger: BaseFlagger, nodata: f
         # special functions
         "ismissing": lambda data: ((data == nodata) | pd.isnull(data)),
         "isflagged": partial(_dslIsFlagged, flagger),
+        # numba backend only
+        FUSED_FUNCTION: partial(evalFused, nodata=nodata),
+        FUSIBLE_FUNCTION: fusible,
+        # common subexpressions of a plan
+        CACHE_NAME: expressionCache(),
         # math
         "abs": np.abs,
         "exp": np.exp,
@@ -62,6 +93,12 @@ def initLocalEnv(data: pd.DataFrame, field: str, flagger: BaseFlagger, nodata: f
         "sum": np.nansum,
         "std": np.nanstd,
         "len": lambda data: np.array(len(data)),
+        # windows
+        "rolling_mean": partial(_dslRolling, "binMean"),
+        "rolling_std": partial(_dslRolling, "binStd"),
+        "rolling_max": partial(_dslRolling, "binMax"),
+        "shift": _dslShift,
+        "diff": _dslDiff,
     }
 
 
@@ -70,32 +107,86 @@ def parseExpression(expr: str) -> ast.AST:
     return tree
 
 
-def compileTree(tree: ast.Expression):
-    return compile(ast.fix_missing_locations(tree), "<ast>", mode="eval")
+def codeFunctions(code) -> dict:
+    """
+    The registered test functions referenced by the compiled `code`
+    """
+    # NOTE:
+    # `eval` bypasses the lookups of the (lazy) FUNC_MAP, so we need to
+    # resolve the functions beforehand
+    names, codes = set(), [code]
+    while codes:
+        c = codes.pop()
+        names.update(c.co_names)
+        codes.extend(const for const in c.co_consts if isinstance(const, CodeType))
+    return {name: FUNC_MAP[name] for name in names if name in FUNC_MAP}
 
 
 def evalCode(code, global_env=None, local_env=None):
     return eval(code, global_env or {}, local_env or {})
 
 
-def compileExpression(expr, data, field, flagger, nodata=np.nan):
-    local_env = initLocalEnv(data, field, flagger, nodata)
+def transformWithEnv(expr, local_env, signature, dsl_backend="pandas") -> ast.Expression:
+    """
+    Check and transform `expr` within an already initialized environment (see `initLocalEnv`)
+
+    :param dsl_backend: String. Default = "pandas". The evaluation backend of generic expressions,
+        "numba" fuses their elementwise operations into compiled kernels.
+    """
+    checkBackend(dsl_backend)
     tree = parseExpression(expr)
-    ConfigChecker(local_env, flagger.signature).visit(tree)
-    transformed_tree = ConfigTransformer(local_env).visit(tree)
-    src = astor.to_source(transformed_tree).strip()
-    logger.debug(f"calling transformed function:\n{src}")
-    return local_env, compileTree(transformed_tree)
+    ConfigChecker(local_env, signature).visit(tree)
+    return ConfigTransformer(local_env, dsl_backend).visit(tree)
 
 
-def evalExpression(expr, data, field, flagger, nodata=np.nan):
+def compileTree(tree: ast.Expression):
+    if logger.isEnabledFor(logging.DEBUG):
+        import astor
+
+        src = astor.to_source(tree).strip()
+        logger.debug(f"calling transformed function:\n{src}")
+    return compile(ast.fix_missing_locations(tree), "<ast>", mode="eval")
+
+
+def compileWithEnv(expr, local_env, signature, dsl_backend="pandas"):
+    """
+    Check and compile `expr` within an already initialized environment (see `transformWithEnv`)
+    """
+    return compileTree(transformWithEnv(expr, local_env, signature, dsl_backend))
+
+
+def compileExpression(expr, data, field, flagger, nodata=np.nan, dsl_backend="pandas"):
+    local_env = initLocalEnv(data, field, flagger, nodata)
+    return local_env, compileWithEnv(expr, local_env, flagger.signature, dsl_backend)
+
+
+def evalCompiled(code, data, field, flagger, nodata=np.nan, variables=None, functions=None):
+    """
+    Evaluate the already compiled test `code` (see `compileWithEnv`)
+
+    :param variables: The variables known to the compilation, default: the flags columns.
+    :param functions: The test functions referenced by `code`, default: the registered functions it calls.
+    """
     # mask the already flagged value to make all the functions
     # called on the way through the evaluator ignore flagged values
     mask = flagger.isFlagged()
     data_in = data.copy()
     data_in[mask] = np.nan
-    local_env, code = compileExpression(expr, data_in, field, flagger, nodata)
-    data_result, flagger_result = evalCode(code, FUNC_MAP, local_env)
+    # NOTE: the results cached on the data of a variable are only valid for the same mask
+    cache = resultCache()
+    cache.mask(flagger, data_in.columns)
+    local_env = initLocalEnv(data_in, field, flagger, nodata, variables)
+    if functions is None:
+        functions = codeFunctions(code)
+    identity = dataIdentity(data_in)
+    data_result, flagger_result = evalCode(code, functions, local_env)
+    # NOTE: the data written by the test, i.e. new column arrays or a new index
+    cache.detectWrites(identity, dataIdentity(data_result))
     # reinject the original values, as we don't want to loose them
     data_result[mask] = data[mask]
     return data_result, flagger_result
+
+
+def evalExpression(expr, data, field, flagger, nodata=np.nan, dsl_backend="pandas"):
+    local_env, code = compileExpression(expr, data, field, flagger, nodata, dsl_backend)
+    return evalCompiled(code, data, field, flagger, nodata, variables=local_env["variables"])
@@ -0,0 +1,284 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+An alternative backend for the generic DSL (`flagGeneric`, `procGeneric`).
+
+The elementwise subset of the DSL (arithmetic, comparisons, bit operations,
+the non-reducing builtins, `ismissing`, `isflagged` and reductions of a variable) is lowered
+into a single numba kernel, looping once over the raw column arrays, instead
+of materializing an intermediate pandas object for every operation.
+Subexpressions outside of this subset (e.g. reductions of expressions) are left
+to the default pandas evaluation.
+"""
+
+import ast
+import sys
+from functools import lru_cache
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+DSL_BACKENDS = ("pandas", "numba")
+
+FUSED_FUNCTION = "__fused__"
+FUSIBLE_FUNCTION = "__fusible__"
+
+BINARY_OPERATORS = {
+    ast.Add: "+",
+    ast.Sub: "-",
+    ast.Mult: "*",
+    ast.Div: "/",
+    ast.Pow: "**",
+    ast.Mod: "%",
+    ast.BitAnd: "&",
+    ast.BitOr: "|",
+}
+
+COMPARATORS = {
+    ast.Eq: "==",
+    ast.NotEq: "!=",
+    ast.Gt: ">",
+    ast.Lt: "<",
+    ast.GtE: ">=",
+    ast.LtE: "<=",
+}
+
+ELEMENTWISE_FUNCTIONS = {
+    "abs": "np.abs",
+    "exp": "np.exp",
+    "log": "np.log",
+    "sqrt": "np.sqrt",
+    "sin": "np.sin",
+    "cos": "np.cos",
+    "tan": "np.tan",
+}
+
+# NOTE: reductions of a variable are computed once per call and enter the kernel as scalars
+REDUCTIONS = {
+    "max": np.nanmax,
+    "min": np.nanmin,
+    "mean": np.nanmean,
+    "sum": np.nansum,
+    "std": np.nanstd,
+    "len": len,
+}
+
+# NOTE: the DSL constants, looked up at call time
+CONSTANTS = {
+    "NAN": lambda flagger, nodata: np.nan,
+    "NODATA": lambda flagger, nodata: nodata,
+    "GOOD": lambda flagger, nodata: flagger.GOOD,
+    "BAD": lambda flagger, nodata: flagger.BAD,
+    "UNFLAGGED": lambda flagger, nodata: flagger.UNFLAGGED,
+}
+
+# input kinds, besides the names of the `REDUCTIONS`
+DATA, FLAGGED, CONSTANT = "data", "isflagged", "constant"
+
+
+def _isScalar(kind: str) -> bool:
+    return kind == CONSTANT or kind in REDUCTIONS
+
+
+class _NotFusible(Exception):
+    pass
+
+
+def _isNumeric(value) -> bool:
+    # NOTE: flags are strings for most of the flaggers
+    return isinstance(value, (int, float, np.number)) and not isinstance(value, (bool, np.bool_))
+
+
+def _number(node: ast.AST):
+    # NOTE: python < 3.8 parses numbers into ast.Num
+    if sys.version_info < (3, 8) and isinstance(node, ast.Num):
+        return node.n
+    return node.value if isinstance(node, ast.Constant) else None
+
+
+class _Lowering:
+    """
+    Translate a DSL tree into an elementwise python expression over the
+    variables `x0, x1, ...`, collecting the according inputs on the way.
+    """
+
+    def __init__(self, environment):
+        self.environment = environment
+        self.inputs = []
+
+    def input(self, kind: str, name: str) -> str:
+        if (kind, name) not in self.inputs:
+            self.inputs.append((kind, name))
+        return f"x{self.inputs.index((kind, name))}"
+
+    def variable(self, node) -> str:
+        if not isinstance(node, ast.Name):
+            raise _NotFusible()
+        name = self.environment["this"] if node.id == "this" else node.id
+        if name not in self.environment["variables"]:
+            raise _NotFusible()
+        return name
+
+    def lower(self, node) -> str:
+        value = _number(node)
+        if type(value) in (int, float):
+            return repr(value)
+
+        if isinstance(node, ast.Name):
+            if node.id in CONSTANTS and _isNumeric(self.environment[node.id]):
+                return self.input(CONSTANT, node.id)
+            return self.input(DATA, self.variable(node))
+
+        if isinstance(node, ast.UnaryOp):
+            operand = self.lower(node.operand)
+            if isinstance(node.op, ast.USub):
+                return f"(-{operand})"
+            if isinstance(node.op, ast.Invert):
+                return f"np.invert({operand})"
+
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+            return f"({self.lower(node.left)} {BINARY_OPERATORS[type(node.op)]} {self.lower(node.right)})"
+
+        # NOTE: chained comparisons are not supported by the pandas evaluation either
+        if isinstance(node, ast.Compare) and len(node.ops) == 1 and type(node.ops[0]) in COMPARATORS:
+            left, right = self.lower(node.left), self.lower(node.comparators[0])
+            return f"({left} {COMPARATORS[type(node.ops[0])]} {right})"
+
+        if isinstance(node, ast.Call) and len(node.args) == 1 and not node.keywords:
+            func, arg = node.func.id, node.args[0]
+            if func in ELEMENTWISE_FUNCTIONS:
+                return f"{ELEMENTWISE_FUNCTIONS[func]}({self.lower(arg)})"
+            if func in REDUCTIONS:
+                return self.input(func, self.variable(arg))
+            if func == "isflagged":
+                return self.input(FLAGGED, self.variable(arg))
+            if func == "ismissing":
+                value, nodata = self.lower(arg), self.input(CONSTANT, "NODATA")
+                return f"(({value} != {value}) | ({value} == {nodata}))"
+
+        raise _NotFusible()
+
+
+class DslFuser(ast.NodeTransformer):
+    """
+    Replace the largest fusible subtrees of a DSL expression by calls
+    to their fused kernels, needs to run before the `DslTransformer`.
+    """
+
+    def __init__(self, environment: Dict):
+        self.environment = environment
+
+    def visit(self, node):
+        lowering = _Lowering(self.environment)
+        try:
+            expr = lowering.lower(node)
+        except _NotFusible:
+            return super().visit(node)
+
+        # NOTE: a single input is already available without any computation
+        if all(_isScalar(kind) for kind, _ in lowering.inputs) or (len(lowering.inputs) == 1 and expr == "x0"):
+            return super().visit(node)
+
+        inputs = tuple(lowering.inputs)
+        fused = ast.Call(
+            func=ast.Name(id=FUSED_FUNCTION, ctx=ast.Load()),
+            args=[
+                ast.Constant(value=expr),
+                ast.Constant(value=inputs),
+                ast.Name(id="data", ctx=ast.Load()),
+                ast.Name(id="flagger", ctx=ast.Load()),
+            ],
+            keywords=[],
+        )
+        # NOTE:
+        # the dtypes of the variables are only known at runtime, the
+        # subtree is left to the pandas evaluation for unsupported ones
+        fusible = ast.Call(
+            func=ast.Name(id=FUSIBLE_FUNCTION, ctx=ast.Load()),
+            args=[ast.Constant(value=inputs), ast.Name(id="data", ctx=ast.Load())],
+            keywords=[],
+        )
+        return ast.IfExp(test=fusible, body=fused, orelse=node)
+
+
+class FusedExpression:
+    """
+    An elementwise expression over the inputs `x0, x1, ...` and its numba kernel.
+    The result dtype is derived by numpy from the input dtypes, the kernel is
+    compiled by numba for every distinct combination of input types.
+    """
+
+    def __init__(self, expr: str, inputs: Tuple[Tuple[str, str], ...]):
+        self.expr = expr
+        self.inputs = inputs
+        self._probe = compile(expr, "<fused>", "eval")
+        self._kernel = None
+
+    @property
+    def kernel(self):
+        if self._kernel is None:
+            arrays = [i for i, (kind, _) in enumerate(self.inputs) if not _isScalar(kind)]
+            args = ", ".join(f"a{i}" if i in arrays else f"x{i}" for i in range(len(self.inputs)))
+            bindings = "".join(f"        x{i} = a{i}[j]\n" for i in arrays)
+            src = f"def kernel(n, out, {args}):\n    for j in range(n):\n{bindings}        out[j] = {self.expr}\n"
+            env = {"np": np}
+            exec(src, env)
+            # NOTE: numba is expensive to import, so we do it only, if the backend is actually used
+            import numba as nb
+
+            self._kernel = nb.njit(error_model="numpy")(env["kernel"])
+        return self._kernel
+
+    def __call__(self, data: pd.DataFrame, flagger, nodata=np.nan) -> pd.Series:
+        values = [self._value(kind, name, data, flagger, nodata) for kind, name in self.inputs]
+        # NOTE: evaluating the expression on empty arrays gives us numpy's type promotion (and type errors)
+        probe = {f"x{i}": v[:0] if isinstance(v, np.ndarray) else v for i, v in enumerate(values)}
+        dtype = np.asarray(eval(self._probe, {"np": np}, probe)).dtype
+        out = np.empty(len(data), dtype=dtype)
+        self.kernel(len(data), out, *values)
+        return pd.Series(out, index=data.index)
+
+    @staticmethod
+    def _value(kind, name, data, flagger, nodata):
+        if kind == CONSTANT:
+            return CONSTANTS[name](flagger, nodata)
+        if kind == FLAGGED:
+            return flagger.isFlagged(name).values
+        values = data[name].values
+        if not _isSupported(values):
+            raise TypeError(f"variable '{name}' of type '{data[name].dtype}' is not supported by the numba backend")
+        if kind in REDUCTIONS:
+            return REDUCTIONS[kind](values)
+        return values
+
+
+# NOTE: the expressions (and their compiled kernels) are shared between all configurations
+@lru_cache(maxsize=256)
+def _fusedExpression(expr: str, inputs: Tuple[Tuple[str, str], ...]) -> FusedExpression:
+    return FusedExpression(expr, inputs)
+
+
+def evalFused(expr: str, inputs: Tuple[Tuple[str, str], ...], data: pd.DataFrame, flagger, nodata=np.nan):
+    return _fusedExpression(expr, inputs)(data, flagger, nodata)
+
+
+def fusible(inputs: Tuple[Tuple[str, str], ...], data: pd.DataFrame) -> bool:
+    """
+    True, if the variables in `inputs` are supported by the numba backend
+    """
+    for kind, name in inputs:
+        if kind not in (CONSTANT, FLAGGED) and not _isSupported(data[name].values):
+            return False
+    return True
+
+
+def _isSupported(values) -> bool:
+    return isinstance(values, np.ndarray) and values.dtype.kind in "biuf"
+
+
+def checkBackend(backend: str):
+    if backend not in DSL_BACKENDS:
+        raise ValueError(f"unknown DSL backend '{backend}', use one of {DSL_BACKENDS}")
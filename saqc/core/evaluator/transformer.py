@@ -7,6 +7,7 @@ from typing import Dict, Any
 from contextlib import contextmanager
 
 from saqc.core.config import Params
+from saqc.core.evaluator.fused import DslFuser
 
 
 class DslTransformer(ast.NodeTransformer):
@@ -63,8 +64,9 @@ class DslTransformer(ast.NodeTransformer):
 
 
 class ConfigTransformer(ast.NodeTransformer):
-    def __init__(self, environment):
+    def __init__(self, environment, dsl_backend="pandas"):
         self.environment = environment
+        self.dsl_backend = dsl_backend
         self.func_name = None
 
     def visit_Call(self, node):
@@ -83,6 +85,8 @@ class ConfigTransformer(ast.NodeTransformer):
         key, value = node.arg, node.value
 
         if self.func_name in (Params.FLAG_GENERIC, Params.PROC_GENERIC) and key == Params.FUNC:
+            if self.dsl_backend == "numba":
+                value = DslFuser(self.environment).visit(value)
             dsl_transformer = DslTransformer(self.environment)
             value = dsl_transformer.visit(value)
             return ast.keyword(arg=key, value=value)
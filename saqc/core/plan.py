@@ -0,0 +1,338 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+A precompiled representation of a configuration, reusable for every dataset
+with the same variables as the one it was compiled for.
+"""
+
+import ast
+import logging
+from collections import Counter
+from typing import NamedTuple, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from saqc.core.reader import readConfig, checkConfig
+from saqc.core.config import Fields
+from saqc.core.evaluator import (
+    compileTree,
+    transformWithEnv,
+    evalCompiled,
+    initLocalEnv,
+    parseExpression,
+    eliminateCommonSubexpressions,
+)
+from saqc.core.evaluator.fused import checkBackend
+from saqc.funcs.register import FUNC_MAP
+from saqc.lib.plotting import plotHook, plotAllHook
+from saqc.lib.scope import runScope
+from saqc.lib.cache import resultCache
+from saqc.flagger import BaseFlagger, CategoricalFlagger, SimpleFlagger, DmpFlagger, FlagHistory
+
+
+logger = logging.getLogger("SaQC")
+
+
+class PlanStep(NamedTuple):
+    varname: str
+    test: str
+    line: int
+    plot: bool
+    functions: Tuple[str, ...]
+
+
+def _collectVariables(meta, data):
+    """
+    find every relevant variable
+    """
+    # NOTE: get to know every variable from meta
+    variables = list(data.columns)
+    for idx, configrow in meta.iterrows():
+        varname = configrow[Fields.VARNAME]
+        # assign = configrow[Fields.ASSIGN]
+        if varname in variables:
+            continue
+        # if (varname in data):  # or (varname not in variables and assign is True):
+        variables.append(varname)
+    return variables
+
+
+def _checkFlagger(flagger):
+    if not isinstance(flagger, BaseFlagger):
+        flaggerlist = [CategoricalFlagger, SimpleFlagger, DmpFlagger]
+        raise TypeError(f"flagger must be of type {flaggerlist} or any inherit class from {BaseFlagger}")
+
+
+def _checkInput(data, flags, flagger):
+    if not isinstance(data, pd.DataFrame):
+        raise TypeError("data must be of type pd.DataFrame")
+
+    if isinstance(data.index, pd.MultiIndex):
+        raise TypeError("the index of data is not allowed to be a multiindex")
+
+    if isinstance(data.columns, pd.MultiIndex):
+        raise TypeError("the columns of data is not allowed to be a multiindex")
+
+    _checkFlagger(flagger)
+
+    if flags is None:
+        return
+
+    if not isinstance(flags, pd.DataFrame):
+        raise TypeError("flags must be of type pd.DataFrame")
+
+    if isinstance(data.index, pd.MultiIndex):
+        raise TypeError("the index of data is not allowed to be a multiindex")
+
+    if len(data) != len(flags):
+        raise ValueError("the index of flags and data has not the same length")
+
+    # NOTE: do not test columns as they not necessarily must be the same
+
+
+def _handleErrors(exc, configrow, test, policy):
+    line = configrow[Fields.LINENUMBER]
+    msg = f"config, line {line}, test: '{test}' failed with:\n{type(exc).__name__}: {exc}"
+    if policy == "ignore":
+        logger.debug(msg)
+    elif policy == "warn":
+        logger.warning(msg)
+    else:
+        raise Exception(msg)
+
+
+def _functionNames(test: str) -> Tuple[str, ...]:
+    # NOTE: the registered test functions called by `test`
+    names = (n.func.id for n in ast.walk(parseExpression(test)) if isinstance(n, ast.Call))
+    return tuple(sorted(set(n for n in names if n in FUNC_MAP)))
+
+
+class Plan:
+    """
+    The ordered test steps of a configuration, checked and compiled for a fixed set of variables.
+
+    A plan is immutable and can be executed on any number of datasets with the
+    variables it was compiled for. It is picklable, the compiled code is not
+    part of the pickle, but rebuild on unpickling.
+    """
+
+    def __init__(
+        self,
+        steps: Sequence[PlanStep],
+        columns: Sequence[str],
+        variables: Sequence[str],
+        flagger,
+        nodata=np.nan,
+        dsl_backend="pandas",
+    ):
+        self._steps = tuple(steps)
+        self._columns = tuple(columns)
+        self._variables = tuple(variables)
+        self._flagger = flagger
+        self._nodata = nodata
+        self._dsl_backend = dsl_backend
+        self._compile()
+
+    @property
+    def steps(self) -> Tuple[PlanStep, ...]:
+        return self._steps
+
+    @property
+    def columns(self) -> Tuple[str, ...]:
+        """
+        The data columns the plan was compiled for
+        """
+        return self._columns
+
+    @property
+    def variables(self) -> Tuple[str, ...]:
+        """
+        The flags columns, i.e. the data columns and the variables only known to the configuration
+        """
+        return self._variables
+
+    @property
+    def flagger(self) -> BaseFlagger:
+        return self._flagger
+
+    @property
+    def nodata(self):
+        return self._nodata
+
+    def __len__(self):
+        return len(self._steps)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # NOTE: neither code objects nor the registered functions can be pickled
+        del state["_codes"], state["_functions"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._compile()
+
+    def _compile(self):
+        env = initLocalEnv(pd.DataFrame(columns=self._columns), None, self._flagger, self._nodata, self._variables)
+        trees, counts = {}, Counter()
+        for step in self._steps:
+            key = (step.test, step.varname)
+            if key not in trees:
+                step_env = {**env, "field": step.varname, "this": step.varname}
+                trees[key] = transformWithEnv(step.test, step_env, self._flagger.signature, self._dsl_backend)
+            counts[key] += 1
+
+        # NOTE: subexpressions shared by several tests are evaluated only once per data and flags version
+        eliminateCommonSubexpressions(list(trees.values()), [counts[k] for k in trees])
+        codes = {key: compileTree(tree) for key, tree in trees.items()}
+        self._codes = tuple(codes[step.test, step.varname] for step in self._steps)
+        self._functions = tuple({name: FUNC_MAP[name] for name in step.functions} for step in self._steps)
+
+    def execute(
+        self,
+        data: pd.DataFrame,
+        flags: pd.DataFrame = None,
+        error_policy: str = "raise",
+        history: FlagHistory = None,
+        spill_dir: str = None,
+        spill_threshold: int = None,
+    ) -> (pd.DataFrame, BaseFlagger):
+        """
+        Run the plan on `data`
+
+        :param data: pandas.DataFrame. The data to test, its columns need to be known to the plan.
+        :param flags: pandas.DataFrame. Default = None. Initial flags.
+        :param error_policy: String. Default = "raise". One of "raise", "warn" or "ignore".
+        :param history: FlagHistory. Default = None. If given, the flag changes of every test are recorded into it.
+        :param spill_dir: String. Default = None. Directory to write large harmonization backtracking data to,
+            a temporary directory by default.
+        :param spill_threshold: Integer. Default = None. Size in bytes, above which the harmonization backtracking
+            data of a variable is written to `spill_dir`. Nothing is written by default.
+        :return: The processed data and the resulting flagger.
+        """
+        _checkInput(data, flags, self._flagger)
+
+        unknown = data.columns.difference(self._columns)
+        if len(unknown):
+            raise ValueError(f"the plan was not compiled for the variables: {unknown.tolist()}")
+
+        # prepapre the flags
+        flagger = self._flagger.initFlags(data=pd.DataFrame(index=data.index, columns=self._variables))
+        if flags is not None:
+            flagger = flagger.setFlagger(flagger.initFlags(flags=flags))
+
+        # NOTE:
+        # state shared between the tests of a single run (e.g. harmonization
+        # backtracking information) lives as long as the scope
+        with runScope(harmonization={"spill_dir": spill_dir, "spill_threshold": spill_threshold}):
+            # NOTE: an outer scope might have seen other data
+            resultCache().touch()
+            for step, code, functions in zip(self._steps, self._codes, self._functions):
+                varname = step.varname
+
+                if varname not in data and varname not in flagger.getFlags():
+                    continue
+
+                # NOTE:
+                # time slicing support is currently disabled
+                # prepare the data for the tests
+                # data_chunk = data.loc[start_date:end_date]
+                data_chunk = data
+                if data_chunk.empty:
+                    continue
+                if history is not None:
+                    # NOTE: only the rows written by the tests are compared by the history
+                    flagger = history.track(flagger)
+                flagger_chunk = flagger.getFlagger(loc=data_chunk.index)
+
+                try:
+                    # actually run the tests
+                    data_chunk_result, flagger_chunk_result = evalCompiled(
+                        code,
+                        data=data_chunk,
+                        field=varname,
+                        flagger=flagger_chunk,
+                        nodata=self._nodata,
+                        variables=self._variables,
+                        functions=functions,
+                    )
+                except Exception as e:
+                    _handleErrors(e, {Fields.LINENUMBER: step.line}, step.test, error_policy)
+                    continue
+
+                # NOTE: if a history is given, the flag changes of every test are recorded into it
+                if history is not None:
+                    history.record(step.test, flagger, flagger_chunk_result)
+
+                if step.plot:
+                    plotHook(
+                        data_chunk_result, flagger_chunk, flagger_chunk_result, varname, step.test,
+                    )
+
+                # NOTE:
+                # time slicing support is currently disabled
+                # flagger = flagger.setFlagger(flagger_chunk_result)
+                # data = combineDataFrames(data, data_chunk_result)
+                flagger = flagger_chunk_result
+                data = data_chunk_result
+
+        plotAllHook(data, flagger)
+
+        return data, flagger
+
+
+def compilePlan(
+    config_file,
+    columns: Sequence[str],
+    flagger: BaseFlagger,
+    nodata: float = np.nan,
+    flag_columns: Sequence[str] = (),
+    dsl_backend: str = "pandas",
+) -> Plan:
+    """
+    Read, check and compile the configuration for datasets with the given columns
+
+    :param config_file: The configuration file (name or file object).
+    :param columns: The data columns, variable wildcards of the configuration are expanded against them.
+    :param flagger: The (uninitialized) flagger to use.
+    :param nodata: Float. Default = NaN. The missing value indicator of the data.
+    :param flag_columns: Additional variables only present in the initial flags.
+    :param dsl_backend: String. Default = "pandas". The evaluation backend of the generic expressions,
+        "numba" fuses their elementwise operations into compiled kernels.
+    :return: Plan
+    """
+    _checkFlagger(flagger)
+    checkBackend(dsl_backend)
+
+    data = pd.DataFrame(columns=list(columns))
+    config = readConfig(config_file, data)
+
+    # split config into the test and some 'meta' data
+    tests = config.filter(regex=Fields.TESTS)
+    meta = config[config.columns.difference(tests.columns)]
+
+    variables = _collectVariables(meta, data)
+    variables += [c for c in flag_columns if c not in variables]
+
+    # NOTE:
+    # the compilation of user-tests needs fully prepared flags
+    checkConfig(config, data, flagger.initFlags(data=pd.DataFrame(columns=variables)), nodata)
+
+    # NOTE:
+    # the outer loop runs over the flag tests, the inner one over the
+    # variables. Switching the loop order would complicate the
+    # reference to flags from other variables within the dataset
+    varnames = meta[Fields.VARNAME].values
+    lines = meta[Fields.LINENUMBER].values
+    plots = meta[Fields.PLOT].values
+
+    steps = []
+    for _, testcol in tests.items():
+        for varname, test, line, plot in zip(varnames, testcol.values, lines, plots):
+            if pd.isnull(test):
+                continue
+            steps.append(PlanStep(varname, test, int(line), bool(plot), _functionNames(test)))
+
+    return Plan(steps, columns, variables, flagger, nodata, dsl_backend)
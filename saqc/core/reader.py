@@ -5,14 +5,17 @@
 import re
 import logging
 from csv import reader
-from typing import Dict, List, Any, Union, Iterable, Iterator, Tuple
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Any, Union, Iterable, Iterator, Tuple, Optional, Callable, Pattern
 from contextlib import contextmanager
 from io import StringIO, TextIOWrapper
 
+import numpy as np
 import pandas as pd
 
 from saqc.core.config import Fields as F
-from saqc.core.evaluator import compileExpression
+from saqc.core.evaluator import compileWithEnv, initLocalEnv
 from saqc.flagger import BaseFlagger
 
 
@@ -24,23 +27,27 @@ Config = Iterable[Dict[str, Any]]
 Filename = Union[StringIO, str]
 
 
+# NOTE:
+# the casts are applied to whole columns (pandas.Series) of the config at once
 CONFIG_TYPES = {
-    F.VARNAME: str,
+    F.VARNAME: lambda s: s.astype(str),
     F.START: pd.to_datetime,
     F.END: pd.to_datetime,
-    F.TESTS: str,
-    F.PLOT: lambda v: str(v).lower() == "true",
-    F.LINENUMBER: int,
+    F.TESTS: lambda s: s.astype(str),
+    F.PLOT: lambda s: s.astype(str).str.lower() == "true",
+    F.LINENUMBER: lambda s: s.astype(int),
 }
 
 
-def _raise(config_row, exc, msg, field=None):
-    line_number = config_row[F.LINENUMBER]
+def _configError(line_number, msg, field=None) -> str:
     base_msg = f"configuration error in line {line_number}"
     if field:
         base_msg += f", column '{field}'"
-    msg = base_msg + ":\n" + msg
-    raise exc(msg)
+    return base_msg + ":\n" + msg
+
+
+def _raise(config_row, exc, msg, field=None):
+    raise exc(_configError(config_row[F.LINENUMBER], msg, field))
 
 
 @contextmanager
@@ -53,41 +60,64 @@ def _open(fname: Filename) -> Union[StringIO, TextIOWrapper]:
         f.close()
 
 
-def _matchKey(keys: Iterable[str], fuzzy_key: str) -> str:
-    for key in keys:
+def _castFunction(key: str) -> Optional[Callable]:
+    # NOTE: the last matching type wins, keys without a type are ignored
+    func = None
+    for fuzzy_key, f in CONFIG_TYPES.items():
         if re.match(fuzzy_key, key):
-            return key
-
-
-def _castRow(row: Dict[str, Any]):
-    out = {}
-    for row_key, row_value in row.items():
-        for fuzzy_key, func in CONFIG_TYPES.items():
-            if re.match(fuzzy_key, row_key):
-                try:
-                    out[row_key] = func(row_value)
-                except ValueError:
-                    _raise(row, ValueError, f"invalid value: '{row_value}'")
-    return out
+            func = f
+    return func
+
+
+def _castColumn(key: str, values: pd.Series, lines: pd.Series, default: Any = np.nan) -> pd.Series:
+    """
+    Cast the given cells of column `key`, missing cells (None) are replaced by `default`
+    """
+    func = _castFunction(key)
+    present = values.notna()
+    try:
+        out = func(values[present])
+    except ValueError:
+        # NOTE: find the offending cell, only done in the error case
+        for idx in values[present].index:
+            try:
+                func(values[[idx]])
+            except ValueError:
+                _raise({F.LINENUMBER: lines[idx]}, ValueError, f"invalid value: '{values[idx]}'")
+        raise
+    return out.reindex(values.index, fill_value=default)
 
 
-def _expandVarnameWildcards(config: Config, data: pd.DataFrame) -> Config:
-    def isQuoted(string):
-        return bool(re.search(r"'.*'|\".*\"", string))
-
-    new = []
-    for row in config:
-        varname = row[F.VARNAME]
-        if varname and isQuoted(varname):
-            pattern = varname[1:-1]
-            expansion = data.columns[data.columns.str.match(pattern)]
-            if not len(expansion):
-                logger.warning(f"no match for regular expression '{pattern}'")
-            for var in expansion:
-                new.append({**row, F.VARNAME: var})
-        else:
-            new.append(row)
-    return new
+@lru_cache(maxsize=None)
+def _compileWildcard(pattern: str) -> Pattern:
+    return re.compile(pattern)
+
+
+def _isQuoted(string: str) -> bool:
+    return bool(_compileWildcard(r"'.*'|\".*\"").search(string))
+
+
+def _expandVarname(varname: str, columns: pd.Index) -> List[str]:
+    if not (varname and _isQuoted(varname)):
+        return [varname]
+    pattern = varname[1:-1]
+    regex = _compileWildcard(pattern)
+    expansion = [c for c in columns if regex.match(c)]
+    if not expansion:
+        logger.warning(f"no match for regular expression '{pattern}'")
+    return expansion
+
+
+def _expandVarnameWildcards(config: pd.DataFrame, data: pd.DataFrame) -> pd.DataFrame:
+    varnames = config[F.VARNAME]
+    # NOTE: every distinct variable name is expanded only once
+    expansions = {v: _expandVarname(v, data.columns) for v in varnames.unique()}
+    names = [expansions[v] for v in varnames]
+
+    rows = np.repeat(np.arange(len(config)), [len(n) for n in names])
+    out = config.iloc[rows].reset_index(drop=True)
+    out[F.VARNAME] = [n for ns in names for n in ns]
+    return out
 
 
 def _clearRows(rows: Iterable[List[str]], comment: str = "#") -> Iterator[Tuple[str, List[Any]]]:
@@ -107,39 +137,81 @@ def readConfig(fname: Filename, data: pd.DataFrame, sep: str = ";", comment: str
         rows = _clearRows(rdr)
         _, header = next(rows)
 
-        config = []
+        lines, cells = [], []
         for n, row in rows:
-            row = dict(zip(header, row))
-            row = _castRow({**defaults, **row, F.LINENUMBER: n + 1})
-            config.append(row)
+            lines.append(n + 1)
+            # NOTE: missing cells are filled with None, surplus cells are ignored
+            cells.append(row[: len(header)] + [None] * (len(header) - len(row)))
+
+    # NOTE: a repeated column name refers to its last occurrence
+    positions = {key: i for i, key in enumerate(header)}
+    columns = list(OrderedDict.fromkeys([*defaults, *header]))
+    lines = pd.Series(lines, dtype=int)
+
+    config = OrderedDict()
+    for key in columns:
+        if _castFunction(key) is None:
+            continue
+        if key in positions:
+            values = pd.Series([row[positions[key]] for row in cells], dtype=object)
+        else:
+            values = pd.Series([None] * len(cells), dtype=object)
+        config[key] = _castColumn(key, values, lines, defaults.get(key, np.nan))
+    config[F.LINENUMBER] = lines
 
-    expanded = _expandVarnameWildcards(config, data)
-    return pd.DataFrame(expanded)
+    return _expandVarnameWildcards(pd.DataFrame(config), data)
 
 
 def checkConfig(config_df: pd.DataFrame, data: pd.DataFrame, flagger: BaseFlagger, nodata: float) -> pd.DataFrame:
-
-    for _, config_row in config_df.iterrows():
-
-        var_name = config_row[F.VARNAME]
-        if pd.isnull(config_row[F.VARNAME]) or not var_name:
-            _raise(
-                config_row, SyntaxError, f"non-optional column '{F.VARNAME}' is missing or empty",
-            )
-
-        test_fields = config_row.filter(regex=F.TESTS).dropna()
-        if test_fields.empty:
-            _raise(
-                config_row, SyntaxError, f"at least one test needs to be given for variable",
-            )
-
-        for col, expr in test_fields.iteritems():
-            if not expr:
-                _raise(config_row, SyntaxError, f"field '{col}' may not be empty")
+    """
+    Validate all rows of `config_df` and raise all found errors at once.
+    The raised exception is of the type of the first error.
+
+    NOTE:
+    The evaluation environment is build once and every distinct test expression is
+    only checked once, as the checks do not depend on the variable.
+    """
+    env = initLocalEnv(data, None, flagger, nodata)
+    checked = {}
+    errors = OrderedDict()
+
+    def addError(exc, line, msg, field=None):
+        # NOTE: rows expanded from the same wildcard share their line
+        errors.setdefault(_configError(line, msg, field), exc)
+
+    def checkExpression(expr, var_name):
+        if expr not in checked:
             try:
-                compileExpression(expr, data, var_name, flagger, nodata)
+                compileWithEnv(expr, {**env, "field": var_name, "this": var_name}, flagger.signature)
+                checked[expr] = None
             except (TypeError, NameError, SyntaxError) as exc:
-                _raise(
-                    config_row, type(exc), exc.args[0] + f" (failing statement: '{expr}')", col,
-                )
+                checked[expr] = exc
+        return checked[expr]
+
+    varnames = config_df[F.VARNAME]
+    lines = config_df[F.LINENUMBER].values
+    tests = config_df.filter(regex=F.TESTS)
+    missing_var = (varnames.isnull() | (varnames == "")).values
+    missing_tests = tests.isnull().all(axis=1).values
+
+    for i, (var_name, line) in enumerate(zip(varnames.values, lines)):
+        if missing_var[i]:
+            addError(SyntaxError, line, f"non-optional column '{F.VARNAME}' is missing or empty")
+        if missing_tests[i]:
+            addError(SyntaxError, line, f"at least one test needs to be given for variable")
+            continue
+
+        for col, expr in zip(tests.columns, tests.values[i]):
+            if pd.isnull(expr):
+                continue
+            if not expr:
+                addError(SyntaxError, line, f"field '{col}' may not be empty")
+                continue
+            exc = checkExpression(expr, var_name)
+            if exc is not None:
+                addError(type(exc), line, exc.args[0] + f" (failing statement: '{expr}')", col)
+
+    if errors:
+        messages = list(errors)
+        raise errors[messages[0]]("\n".join(messages))
     return config_df
@@ -6,3 +6,6 @@ from saqc.flagger.categoricalflagger import CategoricalFlagger
 from saqc.flagger.simpleflagger import SimpleFlagger
 from saqc.flagger.dmpflagger import DmpFlagger
 from saqc.flagger.continuousflagger import ContinuousFlagger
+from saqc.flagger.matrixflagger import MatrixFlagger
+from saqc.flagger.sparseflagger import SparseFlagger
+from saqc.flagger.history import FlagHistory
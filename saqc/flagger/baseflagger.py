@@ -2,15 +2,16 @@
 # -*- coding: utf-8 -*-
 
 import operator as op
+from itertools import count
 from copy import deepcopy
 from collections import OrderedDict
 from abc import ABC, abstractmethod
-from typing import TypeVar, Union, Any
+from typing import TypeVar, Union, Any, Sequence, Dict, Tuple
 
 import numpy as np
 import pandas as pd
 
-from saqc.lib.tools import toSequence, assertScalar, assertDataFrame
+from saqc.lib.tools import toSequence, assertScalar, assertDataFrame, combineDataFrames, frameFromColumns
 
 
 COMPARATOR_MAP = {
@@ -30,6 +31,10 @@ LocT = Any
 IlocT = Any
 FlagT = Any
 
+# NOTE: the versions of the flags columns are unique within a process, so they
+#       can be compared between the different copies of a flagger
+_VERSIONS = count()
+
 
 class BaseFlagger(ABC):
     @abstractmethod
@@ -40,6 +45,11 @@ class BaseFlagger(ABC):
         #       the configuration functions
         self.signature = ("flag",)
         self._flags: pd.DataFrame
+        # NOTE: the versions of the flags columns and the `isFlagged` masks computed for them
+        self._versions = {}
+        self._masks = {}
+        # NOTE: the rows written by `setFlagsBatch`, only journaled if tracked (see `FlagHistory.track`)
+        self._writes = None
 
     def initFlags(self, data: pd.DataFrame = None, flags: pd.DataFrame = None) -> BaseFlaggerT:
         """
@@ -62,18 +72,7 @@ class BaseFlagger(ABC):
         if not isinstance(other, self.__class__):
             raise TypeError(f"flagger of type '{self.__class__}' needed")
 
-        this = self._flags
-        other = other._flags
-
-        flags = this.reindex(
-            index=this.index.union(other.index),
-            columns=this.columns.union(other.columns, sort=False),
-            fill_value=self.UNFLAGGED,
-        )
-
-        for key, values in other.iteritems():
-            flags.loc[other.index, key] = values
-
+        flags = combineDataFrames(self._flags, other._flags, fill_value=self.UNFLAGGED)
         return self._copy(self._assureDtype(flags))
 
     def getFlagger(self, field: str = None, loc: LocT = None, iloc: IlocT = None) -> BaseFlaggerT:
@@ -81,38 +80,38 @@ class BaseFlagger(ABC):
         return a potentially trimmed down copy of self
         """
         assertScalar("field", field, optional=True)
-        mask = self._locatorMask(field=slice(None), loc=loc, iloc=iloc)
-        flags = self._flags.loc[mask, field or slice(None)]
-        if isinstance(flags, pd.Series):
-            flags = flags.to_frame()
-        return self._copy(flags)
+        flags = self._flags if field is None else self._flags[[field]]
+        rows = self._rowLocator(loc, iloc)
+        out = self._copy(flags.iloc[rows])
+        if field is None and _allRows(rows):
+            self._shareVersions(out)
+        return out
 
     def getFlags(self, field: str = None, loc: LocT = None, iloc: IlocT = None) -> PandasT:
         """
         return a copy of a potentially trimmed down 'self._flags' DataFrame
         """
         assertScalar("field", field, optional=True)
-        field = field or slice(None)
-        flags = self._flags.copy()
-        mask = self._locatorMask(field, loc, iloc)
-        return flags.loc[mask, field]
+        return self._flagsView(field, loc, iloc).copy()
 
     def setFlags(
         self, field: str, loc: LocT = None, iloc: IlocT = None, flag: FlagT = None, force: bool = False, **kwargs,
     ) -> BaseFlaggerT:
-        assertScalar("field", field, optional=False)
-
-        flag = self.BAD if flag is None else self._checkFlag(flag)
+        return self.setFlagsBatch([dict(field=field, loc=loc, iloc=iloc, flag=flag, force=force, **kwargs)])
 
-        this = self.getFlags(field=field)
-        other = self._broadcastFlags(field=field, flag=flag)
-
-        mask = self._locatorMask(field, loc, iloc)
-        if not force:
-            mask &= (this < other).values
+    def setFlagsBatch(self, updates: Sequence[Dict[str, Any]]) -> BaseFlaggerT:
+        """
+        apply multiple updates at once, the flags are copied only once
 
-        out = deepcopy(self)
-        out._flags.loc[mask, field] = other[mask]
+        :param updates: Sequence of dictionaries, each holding the arguments of a `setFlags` call.
+            The updates are applied in the given order.
+        """
+        out = self._copy()
+        for update in updates:
+            base = out._version(update["field"])
+            out._setFlags(**update)
+            out._touch(update["field"])
+            out._journal(update, base)
         return out
 
     def clearFlags(self, field: str, loc: LocT = None, iloc: IlocT = None, **kwargs) -> BaseFlaggerT:
@@ -126,33 +125,148 @@ class BaseFlagger(ABC):
         assertScalar("flag", flag, optional=True)
         self._checkFlag(flag)
         flag = self.GOOD if flag is None else flag
-        flags = self.getFlags(field, loc, iloc, **kwargs)
-        cp = COMPARATOR_MAP[comparator]
-        flagged = pd.notna(flags) & cp(flags, flag)
-        return flagged
+
+        index, columns = self._axes()
+        rows = self._rowLocator(loc, iloc)
+
+        def select(mask):
+            # NOTE: the cached masks must never be handed out
+            return mask.copy() if isinstance(rows, slice) else mask[rows]
+
+        if field is not None:
+            return pd.Series(select(self._cachedFlagged(field, flag, comparator)), index=index[rows], name=field)
+        tmp = OrderedDict((c, select(self._cachedFlagged(c, flag, comparator))) for c in columns)
+        return frameFromColumns(tmp, index[rows], columns)
+
+    def _cachedFlagged(self, field: str, flag: FlagT, comparator: str) -> np.ndarray:
+        """
+        return the (read-only) `isFlagged` mask of all rows of `field`, it is
+        only computed, if the flags of `field` changed since the last call
+        """
+        key = (field, flag, comparator)
+        version = self._version(field)
+        cached = self._masks.get(key)
+        if cached is None or cached[0] != version:
+            mask = self._flagged(field, flag, comparator)
+            mask.flags.writeable = False
+            cached = self._masks[key] = (version, mask)
+        return cached[1]
+
+    def _flagged(self, field: str, flag: FlagT, comparator: str) -> np.ndarray:
+        """
+        return the `isFlagged` mask of all rows of `field`
+        """
+        flags = self._flagsView(field)
+        return np.asarray(pd.notna(flags) & COMPARATOR_MAP[comparator](flags, flag), dtype=bool)
+
+    def _version(self, field: str) -> int:
+        """
+        return the version of the flags of `field`, it changes whenever the flags do
+        """
+        version = self._versions.get(field)
+        if version is None:
+            version = self._versions[field] = next(_VERSIONS)
+        return version
+
+    def _touch(self, field: str = None):
+        """
+        mark the flags of `field` (all flags if None) as modified
+        """
+        if field is None:
+            self._versions, self._masks = {}, {}
+        else:
+            self._versions[field] = next(_VERSIONS)
+
+    def _journal(self, update: Dict[str, Any], base: int):
+        """
+        journal the rows of `update["field"]` written by a `setFlags` call, that
+        turned the version `base` of its flags into the current one
+
+        NOTE:
+        Every journal entry is a tuple of the version the journaling started from, the version
+        after the last write and the written row positions. The journal is replaced, never
+        modified in place, so copies of the flagger can share it.
+        """
+        if self._writes is None:
+            return
+        field = update["field"]
+        positions = np.flatnonzero(self._locatorArray(update.get("loc"), update.get("iloc")))
+        entry = self._writes.get(field)
+        if entry is not None and entry[1] == base:
+            base, positions = entry[0], np.union1d(entry[2], positions)
+        self._writes = {**self._writes, field: (base, self._version(field), positions)}
+
+    def _shareVersions(self, other: BaseFlaggerT):
+        """
+        pass the versions (and cached masks) on to `other`, holding the same flags as self
+        """
+        other._versions, other._masks = dict(self._versions), dict(self._masks)
+
+    def _setFlags(
+        self, field: str, loc: LocT = None, iloc: IlocT = None, flag: FlagT = None, force: bool = False, **kwargs,
+    ):
+        # NOTE: works in place, so only call it on a copy of the flagger
+        assertScalar("field", field, optional=False)
+
+        flag = self.BAD if flag is None else self._checkFlag(flag)
+
+        this = self._flagsView(field=field)
+        other = self._broadcastFlags(field=field, flag=flag)
+
+        mask = self._locatorArray(loc, iloc)
+        if not force:
+            mask &= (this < other).values
+
+        # NOTE: replacing the column is cheaper than assigning into it
+        self._flags[field] = other.where(mask, this)
 
     def _copy(self, flags: pd.DataFrame = None) -> BaseFlaggerT:
-        out = deepcopy(self)
+        # NOTE: there is no need to deepcopy the flags, we replace anyways
+        # NOTE: the cached masks are read-only, so the copies can share them
+        memo = {id(self._versions): dict(self._versions), id(self._masks): dict(self._masks)}
+        if self._writes is not None:
+            memo[id(self._writes)] = self._writes
+        if flags is not None and getattr(self, "_flags", None) is not None:
+            memo[id(self._flags)] = flags
+        out = deepcopy(self, memo)
         if flags is not None:
             out._flags = flags
+            out._touch()
         return out
 
-    def _locatorMask(self, field: str = None, loc: LocT = None, iloc: IlocT = None) -> PandasT:
-        field = field or slice(None)
-        locator = [l for l in (loc, iloc, slice(None)) if l is not None][0]
-        index = self._flags.index
-        mask = pd.Series(data=np.zeros(len(index), dtype=bool), index=index)
-        mask[locator] = True
-        return mask
+    def _axes(self) -> Tuple[pd.Index, pd.Index]:
+        """
+        return the row index and the variables of the flags
+        """
+        return self._flags.index, self._flags.columns
 
-    def _broadcastFlags(self, field: str, flag: FlagT) -> pd.Series:
+    def _flagsView(self, field: str = None, loc: LocT = None, iloc: IlocT = None) -> PandasT:
+        """
+        return the (potentially trimmed down) flags without copying them, if possible
 
-        this = self.getFlags(field)
+        NOTE:
+        The returned object might share its memory with `self._flags`, so it must not
+        be modified. Use `getFlags` to retrieve flags, that are safe to work with.
+        """
+        flags = self._flags if field is None else self._flags[field]
+        return flags.iloc[self._rowLocator(loc, iloc)]
+
+    def _locatorArray(self, loc: LocT = None, iloc: IlocT = None) -> np.ndarray:
+        """
+        return a positional boolean array of the rows selected by `loc` or `iloc`
+        """
+        return locatorArray(self._axes()[0], loc, iloc)
 
-        if np.isscalar(flag):
-            flag = np.full_like(this, flag)
+    def _rowLocator(self, loc: LocT = None, iloc: IlocT = None) -> Union[slice, np.ndarray]:
+        """
+        return a positional row indexer for `loc` or `iloc`, no mask is build, if all rows are selected
+        """
+        if loc is None and iloc is None:
+            return slice(None)
+        return self._locatorArray(loc, iloc)
 
-        return pd.Series(data=flag, index=this.index, name=field, dtype=self.dtype)
+    def _broadcastFlags(self, field: str, flag: FlagT) -> pd.Series:
+        return pd.Series(data=flag, index=self._axes()[0], name=field, dtype=self.dtype)
 
     def _checkFlag(self, flag):
         if flag is not None and not self._isDtype(flag):
@@ -196,3 +310,38 @@ class BaseFlagger(ABC):
         """ Return bool that indicates if the given flag is valid, but neither
         UNFLAGGED, BAD, nor GOOD."""
         pass
+
+
+def _allRows(rows: Union[slice, np.ndarray]) -> bool:
+    # NOTE: `rows` as returned by `_rowLocator`
+    return isinstance(rows, slice) or bool(rows.all())
+
+
+def locatorArray(index: pd.Index, loc: LocT = None, iloc: IlocT = None) -> np.ndarray:
+    """
+    Translate the label based `loc` or the positional `iloc` into a
+    boolean array of the same length as `index`.
+
+    :param index: pandas.Index. The index to locate on.
+    :param loc: Label based locator, i.e. everything `pandas.Series.loc` understands.
+    :param iloc: Positional locator, i.e. everything `numpy.ndarray.__getitem__` understands.
+    :return: numpy.ndarray of dtype bool, never a view of the given locators.
+    """
+    if loc is None and iloc is None:
+        return np.ones(len(index), dtype=bool)
+
+    if loc is None:
+        mask = np.zeros(len(index), dtype=bool)
+        mask[iloc] = True
+        return mask
+
+    # NOTE: fast paths for the common cases of a mask generated from the data
+    #       itself and of the (unchanged) index of the data
+    if isinstance(loc, pd.Series) and loc.dtype == bool and loc.index.equals(index):
+        return loc.to_numpy(copy=True)
+    if isinstance(loc, pd.Index) and loc.equals(index):
+        return np.ones(len(index), dtype=bool)
+
+    mask = pd.Series(data=np.zeros(len(index), dtype=bool), index=index)
+    mask[loc] = True
+    return mask.values
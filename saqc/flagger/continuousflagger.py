@@ -3,33 +3,65 @@
 
 import pandas as pd
 import numpy as np
-import intervals
 
 from saqc.flagger.baseflagger import BaseFlagger
+from saqc.lib.tools import assertScalar
 
 
 class ContinuousFlagger(BaseFlagger):
+    """
+    Flags are floats within the closed interval [min_, max_],
+    missing flags are represented by the (negative) `unflagged` value.
+    """
+
     def __init__(self, min_=0.0, max_=1.0, unflagged=-1.0):
         assert unflagged < 0 <= min_ < max_
         super().__init__(dtype=np.float64)
-        self._interval = intervals.closed(min_, max_)
-        self._unflagged_flag = unflagged
+        self._lower = float(min_)
+        self._upper = float(max_)
+        self._unflagged_flag = float(unflagged)
         self.signature = ("flag", "factor", "modify")
 
-    def setFlags(self, field, loc=None, iloc=None, flag=None, force=False, factor=1, modify=False, **kwargs):
-        # NOTE: incomplete, as the option to
-        #       update flags is temporarily gone
-        return super().setFlags(field=field, loc=loc, iloc=iloc, flag=self._checkFlag(flag), force=force, **kwargs)
+    def _setFlags(self, field, loc=None, iloc=None, flag=None, force=False, factor=1, modify=False, **kwargs):
+        """
+        :param factor: Float. Default = 1. The flag to set is multiplied by `factor`.
+        :param modify: Boolean. Default = False. If True, the already set flags are multiplied by `factor`
+            too and combined with the new flag, i.e. the larger one of both is kept.
+        """
+        assertScalar("field", field, optional=False)
+
+        flag = self.BAD if flag is None else self._checkFlag(flag)
+
+        this = self._flagsView(field=field).values
+        other = self._clip(self._broadcastFlags(field=field, flag=flag).values * factor)
+        if modify:
+            scaled = np.where(this >= self.GOOD, self._clip(this * factor), self.UNFLAGGED)
+            other = np.maximum(other, scaled)
+
+        mask = self._locatorArray(loc, iloc)
+        if not force:
+            mask &= this < other
 
-    # NOTE:
-    # we should probably override _assureDtype here
+        self._flags[field] = np.where(mask, other, this)
+
+    def _clip(self, flags: np.ndarray) -> np.ndarray:
+        # NOTE: keep the flags within the interval, but leave the unflagged value untouched
+        return np.where(flags == self.UNFLAGGED, flags, np.clip(flags, self._lower, self._upper))
+
+    def _assureDtype(self, flags):
+        # NOTE: all columns share the same dtype, so we convert them at once
+        return flags.astype(self.dtype)
 
     def _isDtype(self, flag):
         if isinstance(flag, pd.Series):
-            # NOTE: it should be made sure, that all
-            #       values fall into the interval
-            return flag.dtype == self.dtype
-        return flag in self._interval or flag == self.UNFLAGGED
+            # NOTE: missing flags are allowed within series
+            if flag.dtype != self.dtype:
+                return False
+            flag = flag.values[~np.isnan(flag.values)]
+        return bool(np.all(self._isValid(np.asarray(flag))))
+
+    def _isValid(self, flag):
+        return ((flag >= self._lower) & (flag <= self._upper)) | (flag == self.UNFLAGGED)
 
     @property
     def UNFLAGGED(self):
@@ -37,11 +69,11 @@ class ContinuousFlagger(BaseFlagger):
 
     @property
     def GOOD(self):
-        return self._interval.lower
+        return self._lower
 
     @property
     def BAD(self):
-        return self._interval.upper
+        return self._upper
 
     def isSUSPICIOUS(self, flag):
-        return flag in intervals.open(self.GOOD, self.BAD)
+        return (flag > self._lower) & (flag < self._upper)
@@ -1,15 +1,18 @@
 #! /usr/bin/env python
 # -*- coding: utf-8 -*-
+import os
 import subprocess
 import json
-from copy import deepcopy
 from collections import OrderedDict
+from functools import lru_cache
 from typing import Union, Sequence
 
+import numpy as np
 import pandas as pd
 
+import saqc
 from saqc.flagger.categoricalflagger import CategoricalFlagger
-from saqc.lib.tools import assertDataFrame, toSequence, assertScalar
+from saqc.lib.tools import assertDataFrame, toSequence, assertScalar, combineDataFrames, frameFromColumns
 
 
 class Keywords:
@@ -31,16 +34,29 @@ FLAGS = ["NIL", "OK", "DOUBTFUL", "BAD"]
 
 
 class DmpFlagger(CategoricalFlagger):
-    def __init__(self):
+    def __init__(self, project_version: str = None):
+        """
+        :param project_version: String. Default = None. The version written into the flag comments.
+            If None, the version is resolved (once per process) from git and falls back to `saqc.__version__`.
+        """
         super().__init__(FLAGS)
         self.flags_fields = [FlagFields.FLAG, FlagFields.CAUSE, FlagFields.COMMENT]
-        version = subprocess.run(
-            "git describe --tags --always --dirty", shell=True, check=False, stdout=subprocess.PIPE,
-        ).stdout
-        self.project_version = version.decode().strip()
+        self._project_version = project_version
         self.signature = ("flag", "comment", "cause", "force")
         self._flags = None
 
+    @property
+    def project_version(self) -> str:
+        # NOTE: resolved lazily, constructing a flagger should not spawn any processes
+        if self._project_version is None:
+            self._project_version = projectVersion()
+        return self._project_version
+
+    @project_version.setter
+    def project_version(self, value: str):
+        # NOTE: the cached comments are keyed by the version, so there is nothing to invalidate
+        self._project_version = value
+
     def initFlags(self, data: pd.DataFrame = None, flags: pd.DataFrame = None):
         """
         initialize a flagger based on the given 'data' or 'flags'
@@ -49,8 +65,14 @@ class DmpFlagger(CategoricalFlagger):
         """
 
         if data is not None:
-            flags = pd.DataFrame(data="", columns=self._getColumnIndex(data.columns), index=data.index,)
-            flags.loc[:, self._getColumnIndex(data.columns, [FlagFields.FLAG])] = self.UNFLAGGED
+            tmp = OrderedDict()
+            codes = np.zeros(len(data.index), dtype=np.int8)
+            for col in self._getColumnIndex(data.columns):
+                if col[1] == FlagFields.FLAG:
+                    tmp[col] = pd.Categorical.from_codes(codes, dtype=self.dtype)
+                else:
+                    tmp[col] = pd.Categorical.from_codes(codes, categories=[""])
+            flags = frameFromColumns(tmp, data.index, self._getColumnIndex(data.columns))
         elif flags is not None:
             if not isinstance(flags.columns, pd.MultiIndex):
                 cols = flags.columns
@@ -73,27 +95,42 @@ class DmpFlagger(CategoricalFlagger):
 
     def getFlags(self, field=None, loc=None, iloc=None):
         assertScalar("field", field, optional=True)
-        field = field or slice(None)
-        mask = self._locatorMask(field, loc, iloc)
-        flags = self._flags.xs(FlagFields.FLAG, level=ColumnLevels.FLAGS, axis=1).copy()
-        return super()._assureDtype(flags.loc[mask, field])
+        return super()._assureDtype(self._flagsView(field, loc, iloc))
 
-    def setFlags(self, field, loc=None, iloc=None, flag=None, force=False, comment="", cause="", **kwargs):
-        assertScalar("field", field, optional=True)
+    def _setFlags(self, field, loc=None, iloc=None, flag=None, force=False, comment="", cause="", **kwargs):
+        assertScalar("field", field, optional=False)
 
         flag = self.BAD if flag is None else self._checkFlag(flag)
 
-        comment = json.dumps({"comment": comment, "commit": self.project_version, "test": kwargs.get("func_name", ""),})
+        comment = _dumpComment(comment, self.project_version, kwargs.get("func_name", ""))
 
         this = self.getFlags(field=field)
         other = self._broadcastFlags(field=field, flag=flag)
-        mask = self._locatorMask(field, loc, iloc)
+        mask = self._locatorArray(loc, iloc)
         if not force:
             mask &= (this < other).values
 
-        out = deepcopy(self)
-        out._flags.loc[mask, field] = other[mask], cause, comment
-        return out
+        self._flags.loc[mask, (field, FlagFields.FLAG)] = other[mask]
+        for flag_field, value in ((FlagFields.CAUSE, cause), (FlagFields.COMMENT, comment)):
+            self._flags[(field, flag_field)] = _setCategory(self._flags[(field, flag_field)], mask, value)
+
+    def setFlagger(self, other):
+        if not isinstance(other, self.__class__):
+            raise TypeError(f"flagger of type '{self.__class__}' needed")
+        # NOTE: categoricals are merged by their codes, if they share their categories
+        this, other = _unifyCategories(self._flags, other._flags, self.UNFLAGGED)
+        flags = combineDataFrames(this, other, fill_value=self.UNFLAGGED)
+        return self._copy(self._assureDtype(flags))
+
+    def _flagsView(self, field=None, loc=None, iloc=None):
+        if field is None:
+            flags = self._flags.xs(FlagFields.FLAG, level=ColumnLevels.FLAGS, axis=1)
+        else:
+            flags = self._flags[(field, FlagFields.FLAG)].rename(field, copy=False)
+        return flags.iloc[self._rowLocator(loc, iloc)]
+
+    def _axes(self):
+        return self._flags.index, self._flags.columns.get_level_values(ColumnLevels.VARIABLES).drop_duplicates()
 
     def _getColumnIndex(
         self, cols: Union[str, Sequence[str]], fields: Union[str, Sequence[str]] = None
@@ -110,7 +147,73 @@ class DmpFlagger(CategoricalFlagger):
             col_data = flags[(var, flag_field)]
             if flag_field == FlagFields.FLAG:
                 col_data = col_data.astype(self.dtype)
-            else:
-                col_data = col_data.astype(str)
+            elif not _isStrCategorical(col_data):
+                # NOTE: cause and comment are mostly repeated over long blocks
+                #       of flags, so we store them as (unordered) categoricals
+                col_data = col_data.astype(str).astype("category")
             tmp[(var, flag_field)] = col_data
-        return pd.DataFrame(tmp, columns=flags.columns, index=flags.index)
+        return frameFromColumns(tmp, flags.index, flags.columns)
+
+
+@lru_cache(maxsize=None)
+def projectVersion() -> str:
+    """
+    The `git describe` of the saqc source tree, `saqc.__version__` if that is not available
+    (e.g. installed packages or no git executable).
+    """
+    try:
+        version = subprocess.run(
+            ["git", "describe", "--tags", "--always", "--dirty"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        ).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        version = ""
+    return version or saqc.__version__
+
+
+@lru_cache(maxsize=256)
+def _dumpComment(comment, version, test):
+    # NOTE: the comment is the same for all flags set by a test invocation
+    return json.dumps({"comment": comment, "commit": version, "test": test})
+
+
+def _unifyCategories(left, right, fill_value):
+    # give the cause and comment columns of both frames the same categories
+    categories = {}
+    for flags in (left, right):
+        for col in flags.columns:
+            if col[1] != FlagFields.FLAG:
+                categories[col] = categories.get(col, pd.Index([fill_value])).union(flags[col].cat.categories)
+
+    def _setCategories(flags):
+        tmp = OrderedDict()
+        for col in flags.columns:
+            values = flags[col]
+            if col in categories:
+                values = values.cat.set_categories(categories[col])
+            tmp[col] = values
+        return frameFromColumns(tmp, flags.index, flags.columns)
+
+    return _setCategories(left), _setCategories(right)
+
+
+def _isStrCategorical(values):
+    return (
+        isinstance(values.dtype, pd.CategoricalDtype)
+        and not values.dtype.ordered
+        and not values.isna().any()
+        and all(isinstance(c, str) for c in values.cat.categories)
+    )
+
+
+def _setCategory(values, mask, value):
+    # set `value` at `mask`, growing the categories if necessary
+    categories = values.cat.categories
+    if value not in categories:
+        categories = categories.append(pd.Index([value]))
+    codes = values.cat.codes.values.copy()
+    codes[mask] = categories.get_loc(value)
+    return pd.Series(pd.Categorical.from_codes(codes, categories=categories), index=values.index, name=values.name)
@@ -0,0 +1,219 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from copy import copy
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from saqc.flagger.baseflagger import BaseFlagger
+from saqc.lib.tools import frameFromColumns
+
+
+class Reshape(NamedTuple):
+    """
+    The flags before a step, that changed their shape (e.g. a harmonization)
+    """
+
+    index: pd.Index
+    columns: pd.Index
+    # NOTE: the positions of the rows of `index` in the index after the step (-1 if dropped)
+    mapping: np.ndarray
+    # NOTE: variable -> (positions, flags), the flags differing from the ones after the step
+    changed: Dict[str, Tuple[np.ndarray, np.ndarray]]
+
+
+class FlagHistory:
+    """
+    Append-only record of the flag changes of a saqc run.
+
+    Every recorded step (usually one test) stores only the changed flags, as the
+    sorted row positions within each changed variable, together with the
+    previous and the new flag values (category codes for categorical flaggers).
+    The deltas are kept as columns, i.e. one list entry per changed variable:
+
+        steps:     the step the delta belongs to
+        fields:    the variable
+        positions: the changed row positions
+        old/new:   the flags before/after the step
+
+    Only the rows written by `setFlagsBatch` of a tracked flagger (see `track`) are
+    compared, untouched variables are skipped by their versions.
+
+    Steps, that change the shape of the flags (e.g. harmonizations), keep the
+    positions of the previous rows in the new index and the previous flags
+    differing from the new ones (see `Reshape`), as positions are meaningless
+    across indices.
+    """
+
+    def __init__(self):
+        self.tests = []
+        self._reshapes = {}
+        self._steps = []
+        self._fields = []
+        self._positions = []
+        self._old = []
+        self._new = []
+
+    def __len__(self):
+        return len(self.tests)
+
+    def track(self, flagger: BaseFlagger) -> BaseFlagger:
+        """
+        Return `flagger`, journaling the rows written by its `setFlagsBatch` calls from now on,
+        so the next `record` of it (or of a flagger derived from it) only compares these rows.
+        """
+        # NOTE: the versions are assigned lazily, they need to be known to both flaggers
+        for field in flagger._axes()[1]:
+            flagger._version(field)
+        out = copy(flagger)
+        flagger._shareVersions(out)
+        out._writes = {}
+        return out
+
+    def record(self, test: str, flagger_old: BaseFlagger, flagger_new: BaseFlagger) -> int:
+        """
+        Record the changes between the two flaggers as a new step
+
+        :param test: String. A label of the step (e.g. the test expression).
+        :param flagger_old: The flagger before the step.
+        :param flagger_new: The flagger after the step.
+        :return: Integer. The number of the recorded step.
+        """
+        step = len(self.tests)
+        self.tests.append(test)
+
+        (old_index, old_columns), (new_index, new_columns) = flagger_old._axes(), flagger_new._axes()
+        if not (old_index.equals(new_index) and old_columns.equals(new_columns)):
+            self._reshapes[step] = _reshape(flagger_old, flagger_new)
+            return step
+
+        writes = flagger_new._writes or {}
+        for field in new_columns:
+            version = flagger_old._version(field)
+            if version == flagger_new._version(field):
+                continue
+            entry = writes.get(field)
+            if entry is not None and entry[0] == version and entry[1] == flagger_new._version(field):
+                # NOTE: only the journaled rows might have changed
+                rows = entry[2]
+                old_values = _encode(flagger_old._flagsView(field, iloc=rows))
+                new_values = _encode(flagger_new._flagsView(field, iloc=rows))
+            else:
+                rows = None
+                old_values = _encode(flagger_old._flagsView(field))
+                new_values = _encode(flagger_new._flagsView(field))
+            changed = _differs(old_values, new_values)
+            positions = np.flatnonzero(changed) if rows is None else rows[changed]
+            if len(positions):
+                self._steps.append(step)
+                self._fields.append(field)
+                self._positions.append(positions)
+                self._old.append(old_values[changed])
+                self._new.append(new_values[changed])
+        return step
+
+    def flaggedBy(self, field: str, position: int, step: int = None) -> Optional[str]:
+        """
+        Return the label of the last step (up to `step`), that changed the
+        flag of `field` at the (row) `position`, None if it was never changed.
+        """
+        step = len(self.tests) - 1 if step is None else step
+        # NOTE: the positions of the steps before a shape change refer to another index
+        stop = max((s for s in self._reshapes if s <= step), default=-1)
+        for i in reversed(range(bisect_left(self._steps, stop), bisect_right(self._steps, step))):
+            if self._fields[i] != field:
+                continue
+            positions = self._positions[i]
+            j = np.searchsorted(positions, position)
+            if j < len(positions) and positions[j] == position:
+                return self.tests[self._steps[i]]
+        return None
+
+    def changes(self, step: int) -> pd.DataFrame:
+        """
+        Return the changes of `step` as a DataFrame with the columns `field`, `position`, `old` and `new`
+        """
+        columns = ["field", "position", "old", "new"]
+        chunks = [
+            pd.DataFrame(dict(zip(columns, (self._fields[i], self._positions[i], self._old[i], self._new[i]))))
+            for i in range(bisect_left(self._steps, step), bisect_right(self._steps, step))
+        ]
+        if not chunks:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(chunks, ignore_index=True)
+
+    def undo(self, flagger: BaseFlagger, step: int) -> BaseFlagger:
+        """
+        Revert the given (final) flagger to its state after `step`,
+        i.e. roll back all changes of the later steps.
+        """
+        updates, index = [], None
+        i = len(self._steps)
+        for s in reversed(range(step + 1, len(self.tests))):
+            if s in self._reshapes:
+                # NOTE: the later changes refer to the index after the step
+                flagger = _restore(self._reshapes[s], flagger.setFlagsBatch(updates))
+                updates, index = [], None
+                continue
+            while i > 0 and self._steps[i - 1] == s:
+                i -= 1
+                positions = self._positions[i]
+                if index is None:
+                    index = flagger.getFlags(self._fields[i]).index
+                flags = pd.Series(_decode(self._old[i], flagger.dtype), index=index[positions], dtype=flagger.dtype)
+                updates.append(dict(field=self._fields[i], iloc=positions, flag=flags, force=True))
+        return flagger.setFlagsBatch(updates)
+
+
+def _encode(flags: pd.Series) -> np.ndarray:
+    if isinstance(flags.dtype, pd.CategoricalDtype):
+        return flags.cat.codes.values
+    return flags.values
+
+
+def _decode(values: np.ndarray, dtype) -> np.ndarray:
+    if isinstance(dtype, pd.CategoricalDtype):
+        return pd.Categorical.from_codes(values, dtype=dtype)
+    return values
+
+
+def _differs(old: np.ndarray, new: np.ndarray) -> np.ndarray:
+    changed = old != new
+    if old.dtype.kind == "f":
+        changed &= ~(np.isnan(old) & np.isnan(new))
+    return changed
+
+
+def _reshape(flagger_old: BaseFlagger, flagger_new: BaseFlagger) -> Reshape:
+    (old_index, old_columns), (new_index, new_columns) = flagger_old._axes(), flagger_new._axes()
+    mapping = new_index.get_indexer(old_index)
+    mapped = mapping >= 0
+    changed = {}
+    for field in old_columns:
+        old_values = _encode(flagger_old._flagsView(field))
+        differs = np.ones(len(old_index), dtype=bool)
+        if field in new_columns:
+            new_values = _encode(flagger_new._flagsView(field))
+            differs[mapped] = _differs(old_values[mapped], new_values[mapping[mapped]])
+        positions = np.flatnonzero(differs)
+        changed[field] = positions, old_values[positions]
+    return Reshape(old_index, old_columns, mapping, changed)
+
+
+def _restore(reshape: Reshape, flagger: BaseFlagger) -> BaseFlagger:
+    # the flagger before the step of `reshape`, given the one after it
+    mapped = reshape.mapping >= 0
+    columns = flagger._axes()[1]
+    tmp = OrderedDict()
+    for field in reshape.columns:
+        positions, old_values = reshape.changed[field]
+        values = np.empty(len(reshape.index), dtype=old_values.dtype)
+        if field in columns:
+            values[mapped] = _encode(flagger._flagsView(field))[reshape.mapping[mapped]]
+        values[positions] = old_values
+        tmp[field] = _decode(values, flagger.dtype)
+    return flagger.initFlags(flags=frameFromColumns(tmp, reshape.index, reshape.columns))
@@ -0,0 +1,164 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from copy import copy
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from saqc.flagger.baseflagger import COMPARATOR_MAP, locatorArray, _allRows
+from saqc.flagger.categoricalflagger import CategoricalFlagger
+from saqc.lib.tools import assertScalar, toSequence, frameFromColumns
+
+
+class MatrixFlagger(CategoricalFlagger):
+    """
+    A `CategoricalFlagger`, holding its flags as one contiguous int8 matrix
+    (rows x variables) of category codes instead of a DataFrame of categoricals.
+    Missing flags are encoded as -1.
+
+    The DataFrame representation (`_flags`) is only build on demand.
+    """
+
+    def __init__(self, flags):
+        # NOTE: -1 is reserved for missing flags
+        if len(flags) > np.iinfo(np.int8).max:
+            raise ValueError(f"{self.__class__.__name__} supports at most {np.iinfo(np.int8).max} flags")
+        super().__init__(flags)
+        self._codes = np.empty((0, 0), dtype=np.int8)
+        self._index = pd.Index([])
+        self._columns = pd.Index([])
+
+    @property
+    def _flags(self) -> pd.DataFrame:
+        return self._toFrame(self._codes, self._index, self._columns)
+
+    @_flags.setter
+    def _flags(self, flags: pd.DataFrame):
+        self._codes, self._index, self._columns = self._encode(flags), flags.index, flags.columns
+
+    def initFlags(self, data: pd.DataFrame = None, flags: pd.DataFrame = None):
+        if data is None and flags is None:
+            raise TypeError("either 'data' or 'flags' are required")
+        if data is not None:
+            codes = np.full(data.shape, self._code(self.UNFLAGGED), dtype=np.int8)
+            return self._newCodes(codes, data.index, data.columns)
+        return self._newCodes(self._encode(flags), flags.index, flags.columns)
+
+    def setFlagger(self, other):
+        if not isinstance(other, self.__class__):
+            raise TypeError(f"flagger of type '{self.__class__}' needed")
+
+        index = self._index.union(other._index)
+        columns = self._columns.union(other._columns, sort=False)
+
+        if index.equals(self._index) and columns.equals(self._columns):
+            codes = self._codes.copy()
+        else:
+            codes = np.full((len(index), len(columns)), self._code(self.UNFLAGGED), dtype=np.int8)
+            rows, cols = index.get_indexer(self._index), columns.get_indexer(self._columns)
+            codes[np.ix_(rows, cols)] = self._codes
+
+        rows, cols = index.get_indexer(other._index), columns.get_indexer(other._columns)
+        codes[np.ix_(rows, cols)] = other._codes
+        return self._newCodes(codes, index, columns)
+
+    def getFlagger(self, field=None, loc=None, iloc=None):
+        assertScalar("field", field, optional=True)
+        rows = self._rowLocator(loc, iloc)
+        cols = self._columnPositions(field)
+        if field is None and _allRows(rows):
+            return self._copyCodes(self._codes[rows], self._index[rows], self._columns)
+        return self._newCodes(self._codes[rows][:, cols], self._index[rows], self._columns[cols])
+
+    def getFlags(self, field=None, loc=None, iloc=None):
+        assertScalar("field", field, optional=True)
+        rows = self._rowLocator(loc, iloc)
+        codes = self._codes[rows][:, self._columnPositions(field)]
+        flags = self._toFrame(codes, self._index[rows], toSequence(field, self._columns))
+        if field is not None:
+            return flags[field]
+        return flags
+
+    def _setFlags(self, field, loc=None, iloc=None, flag=None, force=False, **kwargs):
+        assertScalar("field", field, optional=False)
+
+        flag = self.BAD if flag is None else self._checkFlag(flag)
+
+        col = self._columns.get_loc(field)
+        this = self._codes[:, col]
+        other = self._broadcastCodes(flag)
+
+        mask = self._locatorArray(loc, iloc)
+        if not force:
+            # NOTE: missing flags do not compare smaller than any other flag
+            mask &= (this < other) & (this >= 0)
+
+        self._codes[mask, col] = other[mask]
+
+    def setFlagsBatch(self, updates):
+        out = self._copyCodes(self._codes.copy(), self._index, self._columns)
+        for update in updates:
+            base = out._version(update["field"])
+            out._setFlags(**update)
+            out._touch(update["field"])
+            out._journal(update, base)
+        return out
+
+    def _flagged(self, field, flag, comparator):
+        codes = self._codes[:, self._columns.get_loc(field)]
+        return (codes >= 0) & COMPARATOR_MAP[comparator](codes, self._code(flag))
+
+    def _copy(self, flags: pd.DataFrame = None):
+        if flags is None:
+            return self._copyCodes(self._codes, self._index, self._columns)
+        return self._newCodes(self._encode(flags), flags.index, flags.columns)
+
+    def _copyCodes(self, codes, index, columns):
+        # NOTE: flags are never modified in place, so we can share all the other attributes
+        out = copy(self)
+        out._codes, out._index, out._columns = codes, index, columns
+        self._shareVersions(out)
+        return out
+
+    def _newCodes(self, codes, index, columns):
+        out = self._copyCodes(codes, index, columns)
+        out._touch()
+        return out
+
+    def _axes(self):
+        return self._index, self._columns
+
+    def _flagsView(self, field=None, loc=None, iloc=None):
+        return self.getFlags(field, loc, iloc)
+
+    def _locatorArray(self, loc=None, iloc=None) -> np.ndarray:
+        return locatorArray(self._index, loc, iloc)
+
+    def _columnPositions(self, field=None):
+        if field is None:
+            return np.arange(len(self._columns))
+        return np.array([self._columns.get_loc(field)])
+
+    def _code(self, flag) -> int:
+        return self._categories.get_loc(flag)
+
+    def _broadcastCodes(self, flag) -> np.ndarray:
+        if np.isscalar(flag):
+            return np.full(len(self._index), self._code(flag), dtype=np.int8)
+        if isinstance(flag, pd.Series):
+            flag = flag.reindex(self._index)
+        return pd.Categorical(flag, dtype=self.dtype).codes.astype(np.int8)
+
+    def _encode(self, flags: pd.DataFrame) -> np.ndarray:
+        codes = np.empty(flags.shape, dtype=np.int8)
+        for i, (_, col) in enumerate(flags.items()):
+            codes[:, i] = pd.Categorical(col, dtype=self.dtype).codes
+        return codes
+
+    def _toFrame(self, codes, index, columns) -> pd.DataFrame:
+        tmp = OrderedDict()
+        for i, c in enumerate(columns):
+            tmp[c] = pd.Categorical.from_codes(codes[:, i], dtype=self.dtype)
+        return frameFromColumns(tmp, index, columns)
@@ -0,0 +1,210 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from copy import copy
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from saqc.flagger.baseflagger import COMPARATOR_MAP, locatorArray, _allRows
+from saqc.flagger.categoricalflagger import CategoricalFlagger
+from saqc.lib.tools import assertScalar, toSequence, frameFromColumns
+
+
+class SparseFlagger(CategoricalFlagger):
+    """
+    A `CategoricalFlagger`, only storing the flags differing from `UNFLAGGED`.
+    Every variable holds the sorted row positions of its flags and the according
+    category codes (missing flags are encoded as -1), so the memory scales with
+    the number of flags, not with the number of rows.
+
+    The dense DataFrame representation (`_flags`) is only build on demand.
+    """
+
+    def __init__(self, flags):
+        if len(flags) > np.iinfo(np.int8).max:
+            raise ValueError(f"{self.__class__.__name__} supports at most {np.iinfo(np.int8).max} flags")
+        super().__init__(flags)
+        self._index = pd.Index([])
+        self._columns = pd.Index([])
+        # NOTE: variable -> (positions, codes)
+        self._sparse = {}
+
+    @property
+    def _flags(self) -> pd.DataFrame:
+        tmp = OrderedDict((c, self._dense(c)) for c in self._columns)
+        return frameFromColumns(tmp, self._index, self._columns)
+
+    @_flags.setter
+    def _flags(self, flags: pd.DataFrame):
+        self._index, self._columns = flags.index, flags.columns
+        self._sparse = {c: self._sparsify(self._encode(flags[c])) for c in flags.columns}
+
+    def initFlags(self, data: pd.DataFrame = None, flags: pd.DataFrame = None):
+        if data is None and flags is None:
+            raise TypeError("either 'data' or 'flags' are required")
+        if data is not None:
+            return self._newSparse({}, data.index, data.columns)
+        return self._copy(flags)
+
+    def setFlagger(self, other):
+        if not isinstance(other, self.__class__):
+            raise TypeError(f"flagger of type '{self.__class__}' needed")
+
+        index = self._index.union(other._index)
+        columns = self._columns.union(other._columns, sort=False)
+
+        this_rows = index.get_indexer(self._index)
+        other_rows = index.get_indexer(other._index)
+
+        sparse = {}
+        for c in columns:
+            codes = np.zeros(len(index), dtype=np.int8)
+            if c in self._sparse:
+                positions, values = self._sparse[c]
+                codes[this_rows[positions]] = values
+            if c in other._columns:
+                # NOTE: the flags of other win, also the unflagged ones
+                codes[other_rows] = other._dense(c).codes
+            sparse[c] = self._sparsify(codes)
+        return self._newSparse(sparse, index, columns)
+
+    def getFlagger(self, field=None, loc=None, iloc=None):
+        assertScalar("field", field, optional=True)
+        columns = self._columns if field is None else pd.Index([field])
+        rows = self._rowLocator(loc, iloc)
+        if field is None and _allRows(rows):
+            return self._copySparse(self._sparse, self._index, self._columns)
+        if isinstance(rows, slice):
+            return self._newSparse({c: self._sparse[c] for c in columns if c in self._sparse}, self._index, columns)
+
+        # NOTE: translate the positions into the positions within the selected rows
+        new_positions = np.cumsum(rows) - 1
+        sparse = {}
+        for c in columns:
+            if c in self._sparse:
+                positions, values = self._sparse[c]
+                keep = rows[positions]
+                sparse[c] = new_positions[positions[keep]], values[keep]
+        return self._newSparse(sparse, self._index[rows], columns)
+
+    def getFlags(self, field=None, loc=None, iloc=None):
+        assertScalar("field", field, optional=True)
+        rows = self._rowLocator(loc, iloc)
+        index = self._index[rows]
+        if field is not None:
+            return pd.Series(self._dense(field)[rows], index=index, name=field)
+        tmp = OrderedDict((c, self._dense(c)[rows]) for c in self._columns)
+        return frameFromColumns(tmp, index, self._columns)
+
+    def setFlagsBatch(self, updates):
+        out = self._copySparse(dict(self._sparse), self._index, self._columns)
+        for update in updates:
+            base = out._version(update["field"])
+            out._setFlags(**update)
+            out._touch(update["field"])
+            out._journal(update, base)
+        return out
+
+    def _setFlags(self, field, loc=None, iloc=None, flag=None, force=False, **kwargs):
+        assertScalar("field", field, optional=False)
+
+        flag = self.BAD if flag is None else self._checkFlag(flag)
+        if field not in self._columns:
+            raise KeyError(field)
+
+        # NOTE: only the selected rows are looked at, the column is never densified
+        rows = np.flatnonzero(self._locatorArray(loc, iloc))
+        if np.isscalar(flag):
+            other = np.full(len(rows), self._code(flag), dtype=np.int8)
+        else:
+            other = self._broadcastCodes(flag)[rows]
+
+        positions, values = self._sparse.get(field, (np.array([], dtype=np.intp), np.array([], dtype=np.int8)))
+        if not force:
+            # NOTE: missing flags do not compare smaller than any other flag
+            this = self._codesAt(positions, values, rows)
+            keep = (this < other) & (this >= 0)
+            rows, other = rows[keep], other[keep]
+
+        # merge the sorted positions, the new codes win
+        old = ~np.isin(positions, rows, assume_unique=True)
+        positions = np.concatenate([positions[old], rows])
+        values = np.concatenate([values[old], other])
+        order = np.argsort(positions, kind="mergesort")
+        positions, values = positions[order], values[order]
+        flagged = values != self._code(self.UNFLAGGED)
+        self._sparse[field] = positions[flagged], values[flagged]
+
+    def _flagsView(self, field=None, loc=None, iloc=None):
+        return self.getFlags(field, loc, iloc)
+
+    def _flagged(self, field, flag, comparator):
+        cp = COMPARATOR_MAP[comparator]
+        code = self._code(flag)
+        if field not in self._columns:
+            raise KeyError(field)
+        flagged = np.full(len(self._index), bool(cp(self._code(self.UNFLAGGED), code)))
+        if field in self._sparse:
+            positions, values = self._sparse[field]
+            flagged[positions] = (values >= 0) & cp(values, code)
+        return flagged
+
+    def _copy(self, flags: pd.DataFrame = None):
+        out = self._copySparse(self._sparse, self._index, self._columns)
+        if flags is not None:
+            out._flags = flags
+            out._touch()
+        return out
+
+    def _copySparse(self, sparse, index, columns):
+        # NOTE: the position and code arrays are never modified in place, so we can share them
+        out = copy(self)
+        out._sparse, out._index, out._columns = sparse, index, columns
+        self._shareVersions(out)
+        return out
+
+    def _newSparse(self, sparse, index, columns):
+        out = self._copySparse(sparse, index, columns)
+        out._touch()
+        return out
+
+    def _axes(self):
+        return self._index, self._columns
+
+    def _locatorArray(self, loc=None, iloc=None) -> np.ndarray:
+        return locatorArray(self._index, loc, iloc)
+
+    def _dense(self, field) -> pd.Categorical:
+        codes = np.zeros(len(self._index), dtype=np.int8)
+        if field in self._sparse:
+            positions, values = self._sparse[field]
+            codes[positions] = values
+        return pd.Categorical.from_codes(codes, dtype=self.dtype)
+
+    def _codesAt(self, positions, values, rows) -> np.ndarray:
+        # the codes of the given (sorted) `rows`, looked up in the sparse `positions` and `values`
+        codes = np.full(len(rows), self._code(self.UNFLAGGED), dtype=np.int8)
+        idx = np.searchsorted(positions, rows)
+        found = idx < len(positions)
+        found[found] = positions[idx[found]] == rows[found]
+        codes[found] = values[idx[found]]
+        return codes
+
+    def _sparsify(self, codes: np.ndarray):
+        positions = np.flatnonzero(codes != self._code(self.UNFLAGGED))
+        return positions, codes[positions].astype(np.int8)
+
+    def _code(self, flag) -> int:
+        return self._categories.get_loc(flag)
+
+    def _broadcastCodes(self, flag) -> np.ndarray:
+        if np.isscalar(flag):
+            return np.full(len(self._index), self._code(flag), dtype=np.int8)
+        if isinstance(flag, pd.Series):
+            flag = flag.reindex(self._index)
+        return pd.Categorical(flag, dtype=self.dtype).codes.astype(np.int8)
+
+    def _encode(self, flags: pd.Series) -> np.ndarray:
+        return pd.Categorical(flags, dtype=self.dtype).codes
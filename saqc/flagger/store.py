@@ -0,0 +1,117 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+A binary on-disk store for flags.
+
+A store is a directory holding:
+- `flags.npy`: the flags as one (variables x rows) matrix, category codes (int8, -1
+  for missing flags) for categorical flaggers, the flags themselves otherwise
+- `index.npy`: the row index
+- `meta.json`: the variables, the flag categories and the index properties
+
+All arrays are plain numpy files, so they can be memory-mapped and shared
+(read-only) between processes, without parsing them.
+"""
+
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+from saqc.flagger.baseflagger import BaseFlagger
+from saqc.lib.tools import frameFromColumns
+
+FORMAT_VERSION = 1
+
+FLAGS_FILE = "flags.npy"
+INDEX_FILE = "index.npy"
+META_FILE = "meta.json"
+
+
+def writeFlags(path: str, flagger: BaseFlagger):
+    """
+    Write the flags of `flagger` into the store at `path`
+
+    :param path: String. The store directory, created if it does not exist.
+    :param flagger: The flagger to persist. Only the flags are written (no comments and causes of the `DmpFlagger`).
+    """
+    flags = flagger.getFlags()
+    categories = _categories(flagger)
+    index = flags.index
+
+    if not isinstance(index, (pd.DatetimeIndex, pd.RangeIndex)) and not pd.api.types.is_numeric_dtype(index):
+        raise TypeError(f"flags with an index of type '{type(index).__name__}' can not be stored")
+
+    os.makedirs(path, exist_ok=True)
+    dtype = np.int8 if categories is not None else np.dtype(flagger.dtype)
+    out = np.lib.format.open_memmap(os.path.join(path, FLAGS_FILE), mode="w+", dtype=dtype, shape=flags.shape[::-1])
+    for i, (_, values) in enumerate(flags.items()):
+        out[i] = values.cat.codes.values if categories is not None else values.values
+    out.flush()
+    del out
+
+    tz = getattr(index, "tz", None)
+    values = index.tz_convert(None).values if tz is not None else np.asarray(index)
+    np.save(os.path.join(path, INDEX_FILE), values)
+
+    meta = {
+        "format": FORMAT_VERSION,
+        "columns": [str(c) for c in flags.columns],
+        "categories": categories,
+        "index": {"name": index.name, "tz": str(tz) if tz is not None else None},
+    }
+    with open(os.path.join(path, META_FILE), "w") as f:
+        json.dump(meta, f)
+
+
+def readFlags(path: str, flagger: BaseFlagger, index: pd.Index = None) -> pd.DataFrame:
+    """
+    Read the flags from the store at `path`
+
+    :param path: String. The store directory.
+    :param flagger: The flagger the flags are read for, it needs to use the same flag categories as the writing one.
+    :param index: pandas.Index. Default = None. If given, the flags are aligned to `index`, rows missing
+        in the store are `flagger.UNFLAGGED`. Otherwise the stored index is used.
+    :return: pandas.DataFrame. The flags, e.g. to be passed to `run` as initial flags.
+    """
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    if meta["format"] != FORMAT_VERSION:
+        raise ValueError(f"unsupported flag store format: {meta['format']}")
+
+    categories = _categories(flagger)
+    if meta["categories"] != categories:
+        raise ValueError(f"the stored flags ({meta['categories']}) do not match the flagger ({categories})")
+
+    flags = np.load(os.path.join(path, FLAGS_FILE), mmap_mode="r")
+    stored_index = pd.Index(np.load(os.path.join(path, INDEX_FILE)), name=meta["index"]["name"])
+    if meta["index"]["tz"] is not None:
+        stored_index = stored_index.tz_localize("UTC").tz_convert(meta["index"]["tz"])
+
+    rows = None
+    if index is not None and not index.equals(stored_index):
+        rows = stored_index.get_indexer(index)
+    else:
+        index = stored_index
+
+    unflagged = flagger.dtype.categories.get_loc(flagger.UNFLAGGED) if categories is not None else flagger.UNFLAGGED
+
+    tmp = {}
+    for i, col in enumerate(meta["columns"]):
+        values = flags[i]
+        if rows is not None:
+            # NOTE: only the needed rows are read from the memory map
+            values = np.where(rows >= 0, values[rows], unflagged).astype(values.dtype)
+        if categories is not None:
+            values = pd.Categorical.from_codes(values, dtype=flagger.dtype)
+        tmp[col] = values
+    return frameFromColumns(tmp, index, pd.Index(meta["columns"]))
+
+
+def _categories(flagger):
+    # the flag categories as JSON-serializable list, None for non-categorical flaggers
+    if not isinstance(flagger.dtype, pd.CategoricalDtype):
+        return None
+    return [c.item() if isinstance(c, np.generic) else c for c in flagger.dtype.categories]
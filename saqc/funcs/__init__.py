@@ -1,11 +1,20 @@
 #! /usr/bin/env python
 # -*- coding: utf-8 -*-
 
-# imports needed to make the functions register themself
-from .register import register
-from .functions import *
-from .breaks_detection import *
-from .constants_detection import *
-from .soil_moisture_tests import *
-from .spikes_detection import *
-from .harm_functions import *
+from importlib import import_module
+
+# NOTE:
+# the modules of the built-in functions are imported on first use,
+# i.e. when a function is looked up in the FUNC_MAP or accessed here
+from .register import register, FUNC_MAP, funcIndex
+from saqc.lib.tools import lazyAttributes
+
+
+def _resolveFunction(name):
+    info = funcIndex().get(name)
+    if info is None:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    return getattr(import_module(info.module), name)
+
+
+lazyAttributes(__name__, _resolveFunction)
@@ -4,8 +4,6 @@
 import numpy as np
 import pandas as pd
 
-from scipy.signal import savgol_filter
-
 from saqc.funcs.register import register
 from saqc.lib.tools import retrieveTrustworthyOriginal
 
@@ -79,6 +77,7 @@ def breaks_flagSpektrumBased(
        :param scnd_der_ratio_margin_1      Float in [0,1]. See (4) of function descritpion above to learn more.
        :param scnd_der_ratio_margin_2      Float in [0,1]. See (5) of function descritpion above to learn more.
     """
+    from scipy.signal import savgol_filter
 
     # retrieve data series input at its original sampling rate
     dataseries, data_rate = retrieveTrustworthyOriginal(data, field, flagger)
@@ -94,7 +93,7 @@ def breaks_flagSpektrumBased(
     breaks = breaks[breaks == True]
 
     # First derivative criterion
-    smoothing_periods = int(np.ceil((smooth_window.seconds / data_rate.n)))
+    smoothing_periods = int(np.ceil(smooth_window / pd.Timedelta(data_rate)))
     if smoothing_periods % 2 == 0:
         smoothing_periods += 1
 
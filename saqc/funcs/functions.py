@@ -5,6 +5,7 @@ import numpy as np
 import pandas as pd
 
 from saqc.lib.tools import sesonalMask, flagWindow, groupConsecutives
+from saqc.lib.cache import resultCache
 
 from saqc.funcs.register import register
 
@@ -14,6 +15,8 @@ def procGeneric(data, field, flagger, func, **kwargs):
     # TODO:
     # - add new fields to te flagger
     data[field] = func.squeeze()
+    # NOTE: older pandas versions write into the existing column array, which is not detected by the evaluation
+    resultCache().touch(field)
     return data, flagger
 
 
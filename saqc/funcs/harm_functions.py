@@ -1,25 +1,169 @@
 #! /usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
 import pandas as pd
 import numpy as np
 import logging
 
 from saqc.funcs.functions import flagMissing
 from saqc.funcs.register import register
-from saqc.lib.tools import toSequence, getFuncFromInput
+from saqc.lib.scope import currentScope
+from saqc.lib.tools import toSequence, getFuncFromInput, frameFromColumns
+import saqc.lib.ts_operators as ts_ops
 
 
 logger = logging.getLogger("SaQC")
 
 
 class Heap:
-    INDEX = "initial_ts"
     DATA = "original_data"
     FLAGGER = "original_flagger"
     FREQ = "freq"
     METHOD = "reshape_method"
     DROP = "drop_flags"
+    PROJECTION = "projection"
+
+
+class HarmonizationHeap:
+    """
+    Backtracking store of the harmonization, holding the pre-harmonization data and flags
+    of every harmonized variable until its deharmonization.
+
+    If a `spill_threshold` (in bytes) is given, entries exceeding it are written to
+    `spill_dir` (a temporary directory by default) and loaded back memory mapped
+    on deharmonization, so long running jobs on large time series keep a bounded
+    memory footprint.
+    """
+
+    def __init__(self, spill_dir=None, spill_threshold=None):
+        self.spill_dir = spill_dir
+        self.spill_threshold = spill_threshold
+        self.index = None
+        self._entries = {}
+        self._tmpdir = None
+
+    def __contains__(self, field):
+        return field in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def push(self, field, data, flagger, freq, method, drop_flags):
+        entry = {
+            Heap.DATA: data,
+            Heap.FLAGGER: flagger,
+            Heap.FREQ: freq,
+            Heap.METHOD: method,
+            Heap.DROP: drop_flags,
+        }
+        if self._exceedsThreshold(data, flagger):
+            entry = self._spill(field, entry)
+        self._entries[field] = entry
+
+        # furthermore we need to memorize the initial timestamp to ensure output format will equal input format.
+        if self.index is None:
+            self.index = data.index
+
+    def setProjection(self, field, projection):
+        self._entries[field][Heap.PROJECTION] = projection
+
+    def pop(self, field):
+        entry = self._entries.pop(field)
+        if "spilled" in entry:
+            entry = self._load(entry)
+        if not self._entries:
+            self.index = None
+        return entry
+
+    def close(self):
+        self._entries.clear()
+        self.index = None
+        if self._tmpdir is not None:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
+
+    def _exceedsThreshold(self, data, flagger):
+        if self.spill_threshold is None or data.dtype == object:
+            return False
+        nbytes = data.memory_usage(index=True) + flagger.getFlags().memory_usage(index=True).sum()
+        return nbytes > self.spill_threshold
+
+    def _spillDir(self):
+        if self.spill_dir is not None:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            return self.spill_dir
+        if self._tmpdir is None:
+            self._tmpdir = tempfile.mkdtemp(prefix="saqc_harm_")
+        return self._tmpdir
+
+    def _spill(self, field, entry):
+        # NOTE:
+        # the data and the flags are written as plain arrays, categorical flags as their codes,
+        # the (small) categories and an empty copy of the flagger stay in memory to rebuild it
+        base = os.path.join(self._spillDir(), f"{len(self._entries)}_{os.getpid()}_{id(entry)}")
+        data, flagger = entry[Heap.DATA], entry[Heap.FLAGGER]
+        flags = flagger._flags
+        files = [base + "_values.npy", base + "_index.npy"]
+        np.save(files[0], data.values)
+        np.save(files[1], data.index.values)
+        if not flags.index.equals(data.index):
+            files.append(base + "_flags_index.npy")
+            np.save(files[-1], flags.index.values)
+        dtypes = []
+        for i, (_, col) in enumerate(flags.items()):
+            files.append(f"{base}_flags_{i}.npy")
+            if isinstance(col.dtype, pd.CategoricalDtype):
+                np.save(files[-1], col.cat.codes.values)
+            else:
+                np.save(files[-1], col.values)
+            dtypes.append(col.dtype)
+        entry = {k: v for k, v in entry.items() if k not in (Heap.DATA, Heap.FLAGGER)}
+        entry["spilled"] = {
+            "files": files,
+            "name": data.name,
+            "index_name": data.index.name,
+            "flags_index_name": flags.index.name,
+            "columns": flags.columns,
+            "dtypes": dtypes,
+            "flagger": flagger.getFlagger(iloc=slice(0, 0)),
+        }
+        return entry
+
+    def _load(self, entry):
+        spilled = entry.pop("spilled")
+        files = iter(spilled["files"])
+        values = np.load(next(files), mmap_mode="r")
+        index = pd.Index(np.load(next(files)), name=spilled["index_name"])
+        flags_index = index
+        if len(spilled["files"]) > len(spilled["dtypes"]) + 2:
+            flags_index = pd.Index(np.load(next(files)), name=spilled["flags_index_name"])
+        flags = {}
+        for i, (path, dtype) in enumerate(zip(files, spilled["dtypes"])):
+            col = np.load(path, mmap_mode="r")
+            if isinstance(dtype, pd.CategoricalDtype):
+                col = pd.Categorical.from_codes(col, dtype=dtype)
+            flags[i] = pd.Series(col, index=flags_index, copy=False)
+        flags = pd.DataFrame(flags, index=flags_index)
+        flags.columns = spilled["columns"]
+        entry[Heap.FLAGGER] = spilled["flagger"].initFlags(flags=flags)
+        entry[Heap.DATA] = pd.Series(values, index=index, name=spilled["name"], copy=False)
+        for path in spilled["files"]:
+            os.remove(path)
+        return entry
+
+
+def _currentHeap():
+    scope = currentScope()
+    if scope is None:
+        raise RuntimeError(
+            "the harmonization needs a run scope (see `saqc.lib.scope.runScope`) or an explicit heap "
+            "(see `harmWrapper`) to store its backtracking information"
+        )
+    return scope.get("harmonization", HarmonizationHeap)
 
 
 HARM_2_DEHARM = {
@@ -35,10 +179,15 @@ HARM_2_DEHARM = {
 }
 
 
-def harmWrapper(heap={}):
+def harmWrapper(heap=None):
     # NOTE:
     # (1) - harmonization will ALWAYS flag flagger.BAD all the np.nan values and afterwards DROP ALL
     #       flagger.BAD flagged values from flags frame for further flagging!!!!!!!!!!!!!!!!!!!!!
+    # (2) - if no `heap` is given, the backtracking information is stored in the
+    #       `HarmonizationHeap` of the currently active run scope
+    def getHeap():
+        return heap if heap is not None else _currentHeap()
+
     def harmonize(
         data,
         field,
@@ -57,124 +206,160 @@ def harmWrapper(heap={}):
         **kwargs,
     ):
 
+        # NOTE:
+        # `field` might also be a sequence of variables, sharing the grid and merged back at once
+        fields = toSequence(field)
+
         # get funcs from strings:
         inter_agg = getFuncFromInput(inter_agg)
         reshape_agg = getFuncFromInput(reshape_agg)
 
         # for some tingle tangle reasons, resolving the harmonization will not be sound, if not all missing/np.nan
         # values get flagged initially:
-        data, flagger = flagMissing(data, field, flagger, nodata=data_missing_value, **kwargs)
+        for var in fields:
+            data, flagger = flagMissing(data, var, flagger, nodata=data_missing_value, **kwargs)
         # and dropped for harmonization:
         if drop_flags is not None:
             if flagger.BAD not in drop_flags:
                 drop_flags.append(flagger.BAD)
 
-        # before sending the current flags and data frame to the future (for backtracking reasons), we clear it
-        # from merge-nans that just resulted from harmonization of other variables!
-        dat_col, flagger_merged = _fromMerged(data, flagger, field)
-
-        # now we send the flags frame in its current shape to the future:
-        heap[field] = {
-            Heap.DATA: dat_col,
-            Heap.FLAGGER: flagger_merged,
-            Heap.FREQ: freq,
-            Heap.METHOD: reshape_method,
-            Heap.DROP: drop_flags,
-        }
-
-        # furthermore we need to memorize the initial timestamp to ensure output format will equal input format.
-        if Heap.INDEX not in heap.keys():
-            heap.update({Heap.INDEX: dat_col.index})
-
-        # now we can manipulate it without loosing information gathered before harmonization
-        dat_col, flagger_merged_clean = _outsortCrap(dat_col, field, flagger_merged, drop_flags=drop_flags,)
-
-        # interpolation! (yeah)
-        dat_col, chunk_bounds = _interpolateGrid(
-            dat_col,
-            freq,
-            method=inter_method,
-            order=inter_order,
-            agg_method=inter_agg,
-            total_range=(heap[Heap.INDEX][0], heap[Heap.INDEX][-1]),
-            downcast_interpolation=inter_downcast,
-        )
+        heap = getHeap()
+        dat_cols, flaggers = [], []
+        for var in fields:
+            # before sending the current flags and data frame to the future (for backtracking reasons), we clear it
+            # from merge-nans that just resulted from harmonization of other variables!
+            dat_col, flagger_merged = _fromMerged(data, flagger, var)
+
+            # now we send the flags frame in its current shape to the future:
+            heap.push(var, dat_col, flagger_merged, freq, reshape_method, drop_flags)
+
+            # now we can manipulate it without loosing information gathered before harmonization
+            dat_col, flagger_merged_clean = _outsortCrap(dat_col, var, flagger_merged, drop_flags=drop_flags,)
+
+            # interpolation! (yeah)
+            dat_col, chunk_bounds = _interpolateGrid(
+                dat_col,
+                freq,
+                method=inter_method,
+                order=inter_order,
+                agg_method=inter_agg,
+                total_range=(heap.index[0], heap.index[-1]),
+                downcast_interpolation=inter_downcast,
+            )
 
-        # flags now have to be carefully adjusted according to the changes/shifts we did to data
-        flagger_merged_clean_reshaped = _reshapeFlags(
-            flagger_merged_clean,
-            field,
-            ref_index=dat_col.index,
-            method=reshape_method,
-            agg_method=reshape_agg,
-            missing_flag=reshape_missing_flag,
-            set_shift_comment=reshape_shift_comment,
-            block_flags=chunk_bounds,
-            **kwargs,
-        )
+            # memorize the positional mapping between the original timestamps and the grid for the deharmonization
+            if HARM_2_DEHARM[reshape_method] != "regain":
+                projection = Projection(
+                    flagger_merged_clean._axes()[0], dat_col.index, freq, HARM_2_DEHARM[reshape_method]
+                )
+                heap.setProjection(var, projection)
+
+            # flags now have to be carefully adjusted according to the changes/shifts we did to data
+            flagger_merged_clean_reshaped = _reshapeFlags(
+                flagger_merged_clean,
+                var,
+                ref_index=dat_col.index,
+                method=reshape_method,
+                agg_method=reshape_agg,
+                missing_flag=reshape_missing_flag,
+                set_shift_comment=reshape_shift_comment,
+                block_flags=chunk_bounds,
+                **kwargs,
+            )
+            dat_cols.append(dat_col)
+            flaggers.append(flagger_merged_clean_reshaped)
 
         # finally we happily blow up the data and flags frame again,
         # to release them on their ongoing journey through saqc.
         data, flagger_out = _toMerged(
-            data, flagger, field, data_to_insert=dat_col, flagger_to_insert=flagger_merged_clean_reshaped, **kwargs
+            data,
+            flagger,
+            fields,
+            data_to_insert=_concatData(dat_cols, fields),
+            flagger_to_insert=_concatFlaggers(flagger, flaggers),
+            **kwargs,
         )
 
         return data, flagger_out
 
     def deharmonize(data, field, flagger, co_flagging=False, **kwargs):
 
-        # Check if there is backtracking information available for actual harmonization resolving
-        if field not in heap:
-            logger.warning(
-                'No backtracking data for resolving harmonization of "{}". Reverse projection of flags gets'
-                " skipped!".format(field)
-            )
+        # NOTE:
+        # `field` might also be a sequence of variables, merged back at once
+        fields = []
+        heap = getHeap()
+        for var in toSequence(field):
+            # Check if there is backtracking information available for actual harmonization resolving
+            if var in heap:
+                fields.append(var)
+            else:
+                logger.warning(
+                    'No backtracking data for resolving harmonization of "{}". Reverse projection of flags gets'
+                    " skipped!".format(var)
+                )
+        if not fields:
             return data, flagger
 
-        # get some deharm configuration infos from the heap:
-        harm_info = heap.pop(field)
-        resolve_method = HARM_2_DEHARM[harm_info[Heap.METHOD]]
+        target_index = heap.index
+        dat_cols, flags_cols = [], []
+        for var in fields:
+            # get some deharm configuration infos from the heap:
+            harm_info = heap.pop(var)
+            resolve_method = HARM_2_DEHARM[harm_info[Heap.METHOD]]
 
-        # retrieve data and flags from the merged saqc-conform data frame (and by that get rid of blow-up entries).
-        dat_col, flagger_merged = _fromMerged(data, flagger, field)
+            # retrieve data and flags from the merged saqc-conform data frame (and by that get rid of blow-up entries).
+            dat_col, flagger_merged = _fromMerged(data, flagger, var)
 
-        # reconstruct the drops that were performed before harmonization
-        drops, flagger_original_clean = _outsortCrap(
-            dat_col, field, harm_info[Heap.FLAGGER], drop_flags=harm_info[Heap.DROP], return_drops=True,
-        )
+            # reconstruct the drops that were performed before harmonization (on the original timestamps)
+            drops, flagger_original_clean = _outsortCrap(
+                harm_info[Heap.DATA], var, harm_info[Heap.FLAGGER], drop_flags=harm_info[Heap.DROP], return_drops=True,
+            )
+
+            # with reconstructed pre-harmonization flags-frame -> perform the projection of the flags calculated for
+            # the harmonized timeseries, onto the original timestamps
+            flagger_back = _backtrackFlags(
+                flagger_merged,
+                flagger_original_clean,
+                harm_info[Heap.FREQ],
+                track_method=resolve_method,
+                co_flagging=co_flagging,
+                projection=harm_info.get(Heap.PROJECTION),
+            )
+            flags_back = flagger_back.getFlags()
+
+            # now: re-insert the pre-harmonization-drops
+            flags_col = flags_back.reindex(flags_back.index.join(drops.index, how="outer"))
+            # due to assignment reluctants with 1-d-dataframes we are squeezing:
+            flags_col = flags_col.squeeze(axis=1)
+            drops = drops.squeeze(axis=1)
+            flags_col.loc[drops.index] = drops
+
+            dat_col = harm_info[Heap.DATA].reindex(flags_col.index, fill_value=np.nan)
+            dat_col.name = var
+            dat_cols.append(dat_col)
+            flags_cols.append(flags_col)
+
+        # the variables might differ in their original timestamps - as usual, timestamps
+        # not belonging to a variable get nan flags
+        index = dat_cols[0].index
+        for dat_col in dat_cols[1:]:
+            index = index.union(dat_col.index)
+        dat_cols = [dat_col.reindex(index) for dat_col in dat_cols]
+        flags_cols = [flags_col.reindex(index) for flags_col in flags_cols]
+
+        # but to stick with the policy of always having flags as pd.DataFrames we blow up the flags cols again:
+        flagger_back_full = flagger.initFlags(flags=_concatData(flags_cols, fields))
 
-        # with reconstructed pre-harmonization flags-frame -> perform the projection of the flags calculated for
-        # the harmonized timeseries, onto the original timestamps
-        flagger_back = _backtrackFlags(
-            flagger_merged,
-            flagger_original_clean,
-            harm_info[Heap.FREQ],
-            track_method=resolve_method,
-            co_flagging=co_flagging,
-        )
-        flags_back = flagger_back.getFlags()
-
-        # now: re-insert the pre-harmonization-drops
-        flags_col = flags_back.reindex(flags_back.index.join(drops.index, how="outer"))
-        # due to assignment reluctants with 1-d-dataframes we are squeezing:
-        flags_col = flags_col.squeeze(axis=1)
-        drops = drops.squeeze(axis=1)
-        flags_col.loc[drops.index] = drops
-
-        # but to stick with the policy of always having flags as pd.DataFrames we blow up the flags col again:
-        if isinstance(flags_col, pd.Series):
-            flags_col = flags_col.to_frame()
-        flagger_back_full = flagger.initFlags(flags=flags_col)
-
-        dat_col = harm_info[Heap.DATA].reindex(flags_col.index, fill_value=np.nan)
-        dat_col.name = field
         # transform the result into the form, data travels through saqc:
         data, flagger_out = _toMerged(
-            data, flagger, field, dat_col, flagger_back_full, target_index=heap[Heap.INDEX], **kwargs
+            data,
+            flagger,
+            fields,
+            _concatData(dat_cols, fields),
+            flagger_back_full,
+            target_index=target_index,
+            **kwargs,
         )
-        # clear heap if nessecary:
-        if len(heap) == 1 and Heap.INDEX in heap:
-            del heap[Heap.INDEX]
 
         # bye bye data
         return data, flagger_out
@@ -187,6 +372,45 @@ register()(harm_harmonize)
 register()(harm_deharmonize)
 
 
+@register()
+def harm_harmonizeFields(data, field, flagger, freq, inter_method, reshape_method, fields=None, **kwargs):
+    """
+    Harmonize several variables onto one grid at once.
+
+    :param fields:  Sequence of variable names or regular expression, matching the variables to harmonize.
+                    If None (default), just `field` gets harmonized.
+    """
+    fields = _expandFields(data, field, fields)
+    if not fields:
+        return data, flagger
+    return harm_harmonize(data, fields, flagger, freq, inter_method, reshape_method, **kwargs)
+
+
+@register()
+def harm_deharmonizeFields(data, field, flagger, fields=None, co_flagging=False, **kwargs):
+    """
+    Deharmonize several variables at once.
+
+    :param fields:  Sequence of variable names or regular expression, matching the variables to deharmonize.
+                    If None (default), just `field` gets deharmonized.
+    """
+    fields = _expandFields(data, field, fields)
+    if not fields:
+        return data, flagger
+    return harm_deharmonize(data, fields, flagger, co_flagging=co_flagging, **kwargs)
+
+
+def _expandFields(data, field, fields):
+    if fields is None:
+        return [field]
+    if isinstance(fields, str):
+        expansion = list(data.columns[data.columns.str.match(fields)])
+        if not expansion:
+            logger.warning(f"no match for regular expression '{fields}'")
+        return expansion
+    return list(fields)
+
+
 # (de-)harmonize helper
 def _outsortCrap(
     data, field, flagger, drop_flags=None, return_drops=False,
@@ -345,7 +569,11 @@ def _interpolateGrid(
 
         elif method == "bagg":
             # all values in a sampling interval get aggregated with agg_method and assigned to the last grid point
-            data = data.resample(freq).apply(agg_method)
+            reduce_bins = getattr(agg_method, "reduceBins", None)
+            if reduce_bins is not None:
+                data = reduce_bins(data, freq)
+            else:
+                data = data.resample(freq).apply(agg_method)
         # if method is fagg
         else:
             # all values in a sampling interval get aggregated with agg_method and assigned to the next grid point
@@ -422,7 +650,7 @@ def _interpolate(data, method, order=2, inter_limit=2, downcast_interpolation=Fa
     :return:
     """
 
-    gap_mask = (data.rolling(inter_limit, min_periods=0).apply(lambda x: np.sum(np.isnan(x)), raw=True)) != inter_limit
+    gap_mask = data.isna().astype(float).rolling(inter_limit, min_periods=0).sum() != inter_limit
 
     if inter_limit == 2:
         gap_mask = gap_mask & gap_mask.shift(-1, fill_value=True)
@@ -632,74 +860,122 @@ def _reshapeFlags(
     return flagger_new
 
 
-def _backtrackFlags(flagger_post, flagger_pre, freq, track_method="invert_fshift", co_flagging=False):
+def _backtrackFlags(
+    flagger_post, flagger_pre, freq, track_method="invert_fshift", co_flagging=False, projection=None,
+):
 
     # in the case of "real" up/downsampling - evaluating the harm flags against the original flags makes no sence!
     if track_method in ["regain"]:
         return flagger_pre
 
-    # NOTE: PROBLEM flager_pre carries one value ib exces (index: -3)
     flags_post = flagger_post.getFlags()
     flags_pre = flagger_pre.getFlags()
-    flags_header = flags_post.columns
-    if track_method in ["invert_fshift", "invert_bshift", "invert_nearest"] and co_flagging is True:
-        if track_method == "invert_fshift":
-            method = "bfill"
-            tolerance = pd.Timedelta(freq)
-        elif track_method == "invert_bshift":
-            method = "ffill"
-            tolerance = pd.Timedelta(freq)
-        # var set for "invert nearest"
+
+    # NOTE:
+    # the projection is usually recorded by the harmonization, we only need
+    # to recalculate it, if the flags were reshaped in the meanwhile
+    if projection is None or not projection.fits(flags_pre.index, flags_post.index):
+        projection = Projection(flags_pre.index, flags_post.index, freq, track_method)
+
+    flags_col = flags_pre.iloc[:, 0]
+    pre_keys = _flagKeys(flags_col)
+    post_keys = _flagKeys(flags_post.iloc[:, 0])
+
+    if co_flagging is True:
+        # every original timestamp gets the flag of the grid point it was projected onto
+        keys = np.full(len(pre_keys), -np.inf)
+        valid = projection.pre2grid >= 0
+        keys[valid] = post_keys[projection.pre2grid[valid]]
+    else:
+        # every original timestamp gets the worst flag of the grid points projected onto it
+        keys = np.full(len(pre_keys), -np.inf)
+        valid = (projection.grid2pre >= 0) & ~np.isnan(post_keys)
+        np.maximum.at(keys, projection.grid2pre[valid], post_keys[valid])
+
+    replacement_mask = keys > pre_keys
+    if replacement_mask.any():
+        values = flags_col.values.copy()
+        if isinstance(values, pd.Categorical):
+            codes = values.codes.copy()
+            codes[replacement_mask] = keys[replacement_mask]
+            values = pd.Categorical.from_codes(codes, dtype=values.dtype)
         else:
-            # NOTE: co_flagging bug path
-            method = "nearest"
-            tolerance = pd.Timedelta(freq) / 2
+            values[replacement_mask] = keys[replacement_mask]
+        flags_pre = pd.DataFrame({flags_pre.columns[0]: values}, index=flags_pre.index)
+
+    return flagger_pre.initFlags(flags=flags_pre)
+
 
-        flags_post = flags_post.reindex(flags_pre.index, method=method, tolerance=tolerance)
-        replacement_mask = flags_post.squeeze() > flags_pre.squeeze()
-        # there is a mysterious problem when assigning 1-d-dataframes - so we squeeze:
-        flags_pre = flags_pre.squeeze(axis=1)
-        flags_post = flags_post.squeeze(axis=1)
-        flags_pre.loc[replacement_mask] = flags_post.loc[replacement_mask]
+def _flagKeys(flags):
+    # flags as floats, that compare like the flags themselves (nan for missing flags)
+    if isinstance(flags.dtype, pd.CategoricalDtype):
+        keys = flags.cat.codes.values.astype(np.float64)
+        keys[keys < 0] = np.nan
+        return keys
+    return flags.values.astype(np.float64)
 
-    if track_method in ["invert_fshift", "invert_bshift", "invert_nearest"] and co_flagging is False:
+
+class Projection:
+    """
+    Positional mapping between the original timestamps and the grid of a harmonization.
+
+    `pre2grid` holds for every original timestamp the position of the grid point it got projected onto,
+    `grid2pre` holds for every grid point the position of the original timestamp projected onto it
+    (-1 if there is none in both cases).
+    """
+
+    def __init__(self, pre_index, grid_index, freq, track_method):
+        self.pre_index = pre_index
+        self.grid_index = grid_index
+
+        tolerance = pd.Timedelta(freq)
         if track_method == "invert_fshift":
-            method = "backward"
-            tolerance = pd.Timedelta(freq)
+            pre_direction, grid_direction = "forward", "backward"
         elif track_method == "invert_bshift":
-            method = "forward"
-            tolerance = pd.Timedelta(freq)
-        # var set for 'invert nearest'
+            pre_direction, grid_direction = "backward", "forward"
         else:
-            method = "nearest"
-            tolerance = pd.Timedelta(freq) / 2
+            pre_direction, grid_direction = "nearest", "nearest"
+            tolerance = tolerance / 2
 
-        flags_post = pd.merge_asof(
-            flags_post,
-            pd.DataFrame(flags_pre.index.values, index=flags_pre.index, columns=["pre_index"]),
-            left_index=True,
-            right_index=True,
-            tolerance=tolerance,
-            direction=method,
-        )
+        # NOTE: on ties, the original timestamps are projected onto the later grid point,
+        #       and the grid points onto the earlier original timestamp
+        self.pre2grid = _nearestPositions(pre_index, grid_index, pre_direction, tolerance, tie="forward")
+        self.grid2pre = _nearestPositions(grid_index, pre_index, grid_direction, tolerance, tie="backward")
 
-        flags_post.dropna(subset=["pre_index"], inplace=True)
-        flags_post.set_index(["pre_index"], inplace=True)
+    def fits(self, pre_index, grid_index):
+        return self.pre_index.equals(pre_index) and self.grid_index.equals(grid_index)
 
-        # restore flag shape
-        flags_post.columns = flags_header
 
-        replacement_mask = flags_post.squeeze() > flags_pre.loc[flags_post.index, :].squeeze()
-        # there is a mysterious problem when assigning 1-d-dataframes - so we squeeze:
-        flags_pre = flags_pre.squeeze(axis=1)
-        flags_post = flags_post.squeeze(axis=1)
-        flags_pre.loc[replacement_mask[replacement_mask].index] = flags_post.loc[replacement_mask]
+def _nearestPositions(source, target, direction, tolerance, tie="forward"):
+    """
+    For every timestamp in `source`, get the position of the nearest timestamp in `target`, lying in `direction`
+    (one of "backward", "forward" and "nearest") within `tolerance`. Positions of unmatched timestamps are -1.
+    The `tie` direction decides between equidistant timestamps in the "nearest" case.
+    """
+    src = source.values.astype("datetime64[ns]").view(np.int64)
+    tgt = target.values.astype("datetime64[ns]").view(np.int64)
+    tolerance = pd.Timedelta(tolerance).value
 
-    # sticking to the nomenklatura of always-DF for flags:
-    if isinstance(flags_pre, pd.Series):
-        flags_pre = flags_pre.to_frame()
+    if len(tgt) == 0:
+        return np.full(len(src), -1, dtype=np.int32)
 
-    return flagger_pre.initFlags(flags=flags_pre)
+    # position of the last target timestamp <= source timestamp
+    bwd = np.searchsorted(tgt, src, side="right") - 1
+    # position of the first target timestamp >= source timestamp
+    fwd = np.searchsorted(tgt, src, side="left")
+
+    bwd_dist = np.where(bwd >= 0, src - tgt[np.maximum(bwd, 0)], np.iinfo(np.int64).max)
+    fwd_dist = np.where(fwd < len(tgt), tgt[np.minimum(fwd, len(tgt) - 1)] - src, np.iinfo(np.int64).max)
+
+    if direction == "backward":
+        pos, dist = bwd, bwd_dist
+    elif direction == "forward":
+        pos, dist = fwd, fwd_dist
+    else:
+        take_bwd = (bwd_dist <= fwd_dist) if tie == "backward" else (bwd_dist < fwd_dist)
+        pos, dist = np.where(take_bwd, bwd, fwd), np.where(take_bwd, bwd_dist, fwd_dist)
+
+    return np.where(dist <= tolerance, pos, -1).astype(np.int32)
 
 
 def _fromMerged(data, flagger, fieldname):
@@ -710,54 +986,182 @@ def _fromMerged(data, flagger, fieldname):
 
 def _toMerged(data, flagger, fieldname, data_to_insert, flagger_to_insert, target_index=None, **kwargs):
 
-    data = data.copy()
-    flags = flagger._flags
-    flags_to_insert = flagger_to_insert._flags
-
     if isinstance(data, pd.Series):
         data = data.to_frame()
 
-    data.drop(fieldname, axis="columns", errors="ignore", inplace=True)
-    flags.drop(fieldname, axis="columns", errors="ignore", inplace=True)
+    fields = toSequence(fieldname)
+    if isinstance(data_to_insert, pd.Series):
+        data_to_insert = data_to_insert.to_frame(name=fields[0])
+
+    # NOTE:
+    # we neither copy, nor merge the (potentially wide) frames, but drop
+    # the fields without touching the passed frames and reindex, only if
+    # the index changes. The field columns are finally concatenated at once.
+    # NOTE:
+    # the complete flags (incl. e.g. the additional fields of the `DmpFlagger`) are
+    # needed here, flaggers not holding a DataFrame build it once per flagger
+    data = data.drop(fields, axis="columns", errors="ignore")
+    flags = flagger._flags.drop(fields, axis="columns", errors="ignore")
+    flags_to_insert = flagger_to_insert._flags
 
     # first case: there is no data, the data-to-insert would have
     # to be merged with, and also are we not deharmonizing:
     if (data.empty) and (target_index is None):
-        return data_to_insert.to_frame(name=fieldname), flagger_to_insert
-
-    # if thats not the case: generate the drop mask for the remaining data:
-    mask = data.isna().all(axis=1)
-    # we only want to drop lines, that do not have to be re-inserted in the merge:
-    drops = mask[mask].index.difference(data_to_insert.index)
-    # clear mask, but keep index
-    mask[:] = True
-    # final mask:
-    mask[drops] = False
-
-    # if we are not "de-harmonizing":
+        return data_to_insert, flagger_to_insert
+
+    # trivial case: there is only one variable ("reindexing to make sure shape matches pre-harm shape"):
+    if data.empty:
+        data = data_to_insert.reindex(target_index)
+        flags = _withCategory(flags_to_insert, flagger.UNFLAGGED).reindex(target_index, fill_value=flagger.UNFLAGGED)
+        return data, flagger.initFlags(flags=flags)
+
+    # if thats not the case: erase the nan rows, that became redundant because of harmonization,
+    # but keep those, that have to be (re-)inserted
+    keep = data.notna().values.any(axis=1) | data.index.isin(data_to_insert.index)
+    index = data.index if keep.all() else data.index[keep]
+
+    if target_index is None:
+        data, flags = _reindex(data, flags, index.union(data_to_insert.index))
+    else:
+        # keep/regain those rows, that were initially present in the data - newly
+        # introduced rows are unflagged, rows only present in the data-to-insert stay nan:
+        data, flags = _reindex(data, flags, index.union(target_index), fill_value=flagger.UNFLAGGED)
+        data, flags = _reindex(data, flags, data.index.union(data_to_insert.index))
+
+    data = pd.concat([data, data_to_insert.reindex(data.index)], axis=1)
+    flags = pd.concat([flags, flags_to_insert.reindex(flags.index)], axis=1)
+
     if target_index is None:
-        # erase nan rows in the data, that became redundant because of harmonization and merge with data-to-insert:
-        data = pd.merge(data[mask], data_to_insert, how="outer", left_index=True, right_index=True)
-        flags = pd.merge(flags[mask], flags_to_insert, how="outer", left_index=True, right_index=True)
         return data, flagger.initFlags(flags=flags)
 
+    # internally harmonization memorizes its own manipulation by inserting nan flags -
+    # those we will now assign the flagger.bad flag by the "missingTest":
+    flagger = flagger.initFlags(flags=flags)
+    for field in fields:
+        data, flagger = flagMissing(data, field, flagger, nodata=np.nan, **kwargs)
+    return data, flagger
+
+
+def _reindex(data, flags, index, fill_value=np.nan):
+    if index.equals(data.index):
+        return data, flags
+    return data.reindex(index), _withCategory(flags, fill_value).reindex(index, fill_value=fill_value)
+
+
+def _withCategory(flags, value):
+    # categorical columns only accept known categories as fill values
+    if pd.isna(value):
+        return flags
+    tmp = OrderedDict()
+    for col, values in flags.items():
+        if isinstance(values.dtype, pd.CategoricalDtype) and value not in values.cat.categories:
+            values = values.cat.add_categories([value])
+        tmp[col] = values
+    return frameFromColumns(tmp, flags.index, flags.columns)
+
+
+def _concatData(cols, fields):
+    # the columns of multiple fields, aligned to their common index
+    if len(cols) == 1:
+        return cols[0].to_frame(name=fields[0])
+    return pd.concat(cols, axis=1, keys=fields)
+
+
+def _concatFlaggers(flagger, flaggers):
+    if len(flaggers) == 1:
+        return flaggers[0]
+    return flagger.initFlags(flags=pd.concat([f._flags for f in flaggers], axis=1))
+
+
+# functions, harm_downsample is able to reduce natively, without nested resampling
+_BIN_FUNCS = {
+    np.sum: "sum",
+    np.mean: "mean",
+    np.min: "min",
+    np.max: "max",
+    np.median: "median",
+    ts_ops.count: "count",
+}
+
+
+def _binBounds(bin_ids, bins):
+    # bin_ids needs to be sorted
+    return np.searchsorted(bin_ids, bins, side="left"), np.searchsorted(bin_ids, bins, side="right")
+
+
+def _isTick(freq):
+    try:
+        return isinstance(pd.tseries.frequencies.to_offset(freq), pd.tseries.offsets.Tick)
+    except ValueError:
+        return False
+
+
+def _dayFloor(stamps):
+    day = pd.Timedelta("1D").value
+    return stamps - stamps % day
+
+
+def _downsampleBins(data, agg_freq, sample_freq, sample_func, agg_func, max_invalid):
+    """
+    The function is a two-level bin reduction, equivalent to:
+
+        data.resample(agg_freq).apply(lambda x: agg_func(x.resample(sample_freq).sample_func()))
+
+    but without nesting one resampling per output bin. Inner (sample_freq) and outer
+    (agg_freq) bin ids get calculated once from the int64 timestamps, the reduction is
+    than done by the numba kernels in 'saqc.lib.tools.BIN_REDUCERS'.
+
+    :param data:        pd.Series. The data series to downsample, needs to have a (sorted) DatetimeIndex.
+    :param agg_freq:    Offset String. The frequency of the output grid.
+    :param sample_freq: Offset String. The frequency of the intermediate grid.
+    :param sample_func: String or None. Key of BIN_REDUCERS, that is used to aggregate to 'sample_freq'. If None,
+                        'agg_func' directly aggregates the data.
+    :param agg_func:    String. Key of BIN_REDUCERS, used to aggregate from 'sample_freq' to 'agg_freq'.
+    :param max_invalid: Number. Number of invalid (nan) values, from which on an aggregation results in nan.
+    :return:            pd.Series. Labeled like the left closed/left labeled bins of 'data.resample(agg_freq)'.
+    """
+    from saqc.lib.kernels import BIN_REDUCERS
+
+    stamps = data.index.values.astype(np.int64)
+    values = data.values.astype(np.float64)
+    agg_ns = pd.Timedelta(agg_freq).value
+
+    # pandas defaults to bins starting at midnight of the first day (origin="start_day")
+    outer_ids = (stamps - _dayFloor(stamps[0])) // agg_ns
+    outer_bins = np.arange(outer_ids[0], outer_ids[-1] + 1)
+    starts, ends = _binBounds(outer_ids, outer_bins)
+
+    if sample_func is None:
+        reduced = values
+    else:
+        sample_ns = pd.Timedelta(sample_freq).value
+        filled = ends > starts
+        first, last = starts[filled], ends[filled] - 1
+        # every nested resampling starts at midnight of its first value...
+        origins = np.repeat(_dayFloor(stamps[first]), ends[filled] - starts[filled])
+        inner_ids = (stamps - origins) // sample_ns
+        # ...and spans all the inner bins between its first and its last value
+        spans = inner_ids[last] - inner_ids[first] + 1
+        offsets = np.concatenate([[0], np.cumsum(spans)[:-1]])
+        positions = inner_ids - np.repeat(inner_ids[first] - offsets, ends[filled] - starts[filled])
+        reduced = BIN_REDUCERS[sample_func](values, *_binBounds(positions, np.arange(spans.sum())))
+        starts = np.zeros_like(starts)
+        ends = np.zeros_like(ends)
+        starts[filled] = offsets
+        ends[filled] = offsets + spans
+
+    if agg_func == "median":
+        # np.median does not skip nan values
+        out = BIN_REDUCERS[agg_func](reduced, starts, ends, False)
     else:
-        # trivial case: there is only one variable ("reindexing to make sure shape matches pre-harm shape"):
-        if data.empty:
-            data = data_to_insert.reindex(target_index).to_frame(name=fieldname)
-            flags = flags_to_insert.reindex(target_index, fill_value=flagger.UNFLAGGED)
-            return data, flagger.initFlags(flags=flags)
-        # annoying case: more than one variables:
-        # erase nan rows resulting from harmonization but keep/regain those, that were initially present in the data:
-        new_index = data[mask].index.join(target_index, how="outer")
-        data = data.reindex(new_index)
-        flags = flags.reindex(new_index, fill_value=flagger.UNFLAGGED)
-        data = pd.merge(data, data_to_insert, how="outer", left_index=True, right_index=True)
-        flags = pd.merge(flags, flags_to_insert, how="outer", left_index=True, right_index=True)
-
-        # internally harmonization memorizes its own manipulation by inserting nan flags -
-        # those we will now assign the flagger.bad flag by the "missingTest":
-        return flagMissing(data, fieldname, flagger.initFlags(flags=flags), nodata=np.nan, **kwargs)
+        out = BIN_REDUCERS[agg_func](reduced, starts, ends)
+
+    if max_invalid < np.inf:
+        invalid = (ends - starts) - BIN_REDUCERS["count"](reduced, starts, ends)
+        out[invalid >= max_invalid] = np.nan
+
+    index = pd.DatetimeIndex(_dayFloor(stamps[0]) + outer_bins * agg_ns, name=data.index.name)
+    return pd.Series(out, index=index, name=data.name)
 
 
 @register()
@@ -890,6 +1294,25 @@ def harm_downsample(
                 def aggregator(x):
                     return agg_func(x.resample(sample_freq).apply(sample_func))
 
+    # the functions we know, get reduced natively within a single pass over the data
+    freqs = [agg_freq] if sample_func is None else [agg_freq, sample_freq]
+    funcs = [agg_func] if sample_func is None else [agg_func, sample_func]
+    if all(_isTick(f) for f in freqs) and all(f in _BIN_FUNCS for f in funcs):
+
+        def reduceBins(x, freq):
+            if x.index.tz is not None:
+                return x.resample(freq).apply(aggregator)
+            return _downsampleBins(
+                x,
+                freq,
+                sample_freq,
+                sample_func=_BIN_FUNCS.get(sample_func),
+                agg_func=_BIN_FUNCS[agg_func],
+                max_invalid=max_invalid,
+            )
+
+        aggregator.reduceBins = reduceBins
+
     return harm_harmonize(
         data,
         field,
@@ -1,7 +1,11 @@
 #!/usr/bin/env python
 
-from functools import partial
+import ast
+from functools import partial, lru_cache
+from importlib import import_module
+from importlib.util import find_spec
 from inspect import signature, _VAR_KEYWORD
+from typing import Dict, NamedTuple, Optional, Tuple
 
 
 class Partial(partial):
@@ -17,8 +21,65 @@ class Partial(partial):
         return tuple(out)
 
 
+# NOTE:
+# the modules of the built-in test functions, they are only imported,
+# when one of their functions is looked up in the FUNC_MAP
+FUNC_MODULES = (
+    "saqc.funcs.functions",
+    "saqc.funcs.breaks_detection",
+    "saqc.funcs.constants_detection",
+    "saqc.funcs.soil_moisture_tests",
+    "saqc.funcs.spikes_detection",
+    "saqc.funcs.harm_functions",
+)
+
+
+class FuncInfo(NamedTuple):
+    module: str
+    # NOTE: the parameters like `Partial.signature`
+    signature: Tuple[str, ...]
+
+
+class FuncMap(dict):
+    """
+    The registered test functions by name.
+
+    Functions register themselves, when their module is imported (see `register`).
+    The modules of the built-in functions (`FUNC_MODULES`) are imported on the first
+    lookup of one of their functions, their names and signatures are known without
+    importing them, as long as they register their functions by decoration (see `funcIndex`).
+    """
+
+    def __missing__(self, name):
+        info = funcIndex().get(name)
+        if info is None:
+            raise KeyError(name)
+        import_module(info.module)
+        func = dict.get(self, name)
+        if func is None:
+            raise KeyError(name)
+        return func
+
+    def __contains__(self, name):
+        return dict.__contains__(self, name) or name in funcIndex()
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def signature(self, name: str) -> Tuple[str, ...]:
+        """
+        The parameters of the function `name`, its module is not imported
+        """
+        if dict.__contains__(self, name):
+            return dict.__getitem__(self, name).signature
+        return funcIndex()[name].signature
+
+
 # NOTE: will be filled by calls to register
-FUNC_MAP = {}
+FUNC_MAP = FuncMap()
 
 
 def register():
@@ -33,3 +94,54 @@ def register():
         return inner
 
     return outer
+
+
+@lru_cache(maxsize=None)
+def funcIndex() -> Dict[str, FuncInfo]:
+    """
+    The functions registered by the `FUNC_MODULES`, read from their sources
+    """
+    out = {}
+    for module in FUNC_MODULES:
+        out.update(_moduleIndex(module))
+    return out
+
+
+def _moduleIndex(module: str) -> Dict[str, FuncInfo]:
+    tree = _moduleTree(module)
+    if tree is None or any(_isRegisterCall(node) for node in tree.body):
+        # NOTE:
+        # without sources or with registrations by plain calls (e.g. `register()(func)`),
+        # the registered names are only known after importing the module
+        import_module(module)
+        functions = dict.items(FUNC_MAP)
+        return {name: FuncInfo(module, f.signature) for name, f in functions if f.func.__module__ == module}
+
+    out = {}
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and any(_isRegister(d) for d in node.decorator_list):
+            args = node.args
+            # NOTE: positional only parameters need python >= 3.8
+            params = [a.arg for a in getattr(args, "posonlyargs", []) + args.args]
+            if args.vararg is not None:
+                params.append(args.vararg.arg)
+            params.extend(a.arg for a in args.kwonlyargs)
+            out[node.name] = FuncInfo(module, tuple(params))
+    return out
+
+
+def _moduleTree(module: str) -> Optional[ast.Module]:
+    origin = find_spec(module).origin
+    if not origin or not origin.endswith(".py"):
+        return None
+    with open(origin, encoding="utf-8") as f:
+        return ast.parse(f.read())
+
+
+def _isRegister(node: ast.AST) -> bool:
+    return isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == register.__name__
+
+
+def _isRegisterCall(node: ast.AST) -> bool:
+    # NOTE: a statement like `register()(func)`
+    return isinstance(node, ast.Expr) and isinstance(node.value, ast.Call) and _isRegister(node.value.func)
@@ -3,8 +3,6 @@
 
 import numpy as np
 import pandas as pd
-import joblib
-from scipy.signal import savgol_filter
 
 from saqc.funcs.breaks_detection import breaks_flagSpektrumBased
 from saqc.funcs.spikes_detection import spikes_flagSpektrumBased
@@ -275,6 +273,7 @@ def sm_flagConstants(
     :param field:                       Fieldname of the Soil moisture measurements field in data.
     :param flagger:                     A flagger - object. (saqc.flagger.X)
     """
+    from scipy.signal import savgol_filter
 
     # get plateaus:
     _, comp_flagger = constants_flagVarianceBased(
@@ -322,8 +321,7 @@ def sm_flagConstants(
         smooth_window = 3 * pd.Timedelta(moist_rate)
     else:
         smooth_window = pd.Timedelta(smooth_window)
-    filter_window_seconds = smooth_window.seconds
-    smoothing_periods = int(np.ceil((filter_window_seconds / moist_rate.n)))
+    smoothing_periods = int(np.ceil(smooth_window / pd.Timedelta(moist_rate)))
     first_derivate = savgol_filter(dataseries, window_length=smoothing_periods, polyorder=smooth_poly_deg, deriv=1,)
     first_derivate = pd.Series(data=first_derivate, index=dataseries.index, name=dataseries.name)
     # cumsumming to seperate continous plateau groups from each other:
@@ -355,6 +353,7 @@ def sm_flagRandomForest(data, field, flagger, references, window_values: int, wi
     :param window_flags:                An integer, denoting the window size that is used to count the surrounding automatic flags that have been set before
     :param path:                        A string giving the path to the respective model object, i.e. its name and the respective value of the grouping variable. e.g. "models/model_0.2.pkl"
     """
+    import joblib
 
     def _refCalc(reference, window_values):
         # Helper function for calculation of moving window values
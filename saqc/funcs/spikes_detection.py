@@ -5,14 +5,10 @@
 import numpy as np
 import pandas as pd
 
-from scipy.signal import savgol_filter
-from scipy.stats import zscore
-from scipy.optimize import curve_fit
 from saqc.funcs.register import register
 import numpy.polynomial.polynomial as poly
-import numba
 import saqc.lib.ts_operators as ts_ops
-from saqc.lib.tools import retrieveTrustworthyOriginal, offset2seconds, slidingWindowIndices, findIndex, composeFunction
+from saqc.lib.tools import retrieveTrustworthyOriginal, offset2seconds, slidingWindowIndices, composeFunction
 
 
 @register()
@@ -30,6 +26,8 @@ def spikes_flagOddWater(
     lambda_estimator="gap_average",
     **kwargs,
 ):
+    from scipy.optimize import curve_fit
+    from saqc.lib.kernels import findIndex
 
     trafo = composeFunction(trafo.split(","))
     # data fransformation/extraction
@@ -128,8 +126,7 @@ def spikes_flagOddWater(
 
     # flag them!
     to_flag_index = val_frame.index[sorted_i[iter_index:]]
-    for var in fields:
-        flagger = flagger.setFlags(var, to_flag_index, **kwargs)
+    flagger = flagger.setFlagsBatch([dict(field=var, loc=to_flag_index, **kwargs) for var in fields])
 
     return data, flagger
 
@@ -150,6 +147,8 @@ def spikes_flagRaise(
     **kwargs,
 ):
 
+    import numba
+
     # NOTE1: this implementation accounts for the case of "pseudo" spikes that result from checking against outliers
     # NOTE2: the test is designed to work on raw data as well as on regularized
     #
@@ -265,6 +264,7 @@ def spikes_flagSlidingZscore(
     [1] https://www.itl.nist.gov/div898/handbook/eda/section3/eda35h.htm
     [2] https://pandas.pydata.org/pandas-docs/stable/user_guide/timeseries.html#dateoffset-objects
     """
+    from scipy.stats import zscore
 
     use_offset = False
     dx_s = offset
@@ -562,6 +562,7 @@ def spikes_flagSpektrumBased(
                                     'CoVar' -> "Coefficient of variation"
                                     'rVar'  -> "relative Variance"
     """
+    from scipy.signal import savgol_filter
 
     dataseries, data_rate = retrieveTrustworthyOriginal(data, field, flagger)
     noise_func_map = {"covar": pd.Series.var, "rvar": pd.Series.std}
@@ -582,8 +583,7 @@ def spikes_flagSpektrumBased(
 
     # calculate some values, repeatedly needed in the course of the loop:
 
-    filter_window_seconds = smooth_window.seconds
-    smoothing_periods = int(np.ceil((filter_window_seconds / data_rate.n)))
+    smoothing_periods = int(np.ceil(smooth_window / pd.Timedelta(data_rate)))
     lower_dev_bound = 1 - deriv_factor
     upper_dev_bound = 1 + deriv_factor
 
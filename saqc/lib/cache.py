@@ -0,0 +1,155 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+A cache for results derived from the data and the flags of a run.
+
+Every cached result records the variables (their data and/or their flags) it
+was computed from. The `ResultCache` lives as long as a run (`saqc.lib.scope.runScope`)
+and tracks a version of every referenced variable, so a cached result is only
+reused as long as none of its inputs has changed.
+"""
+
+from itertools import count
+from typing import Callable, Dict, Hashable, Tuple
+
+import numpy as np
+import pandas as pd
+
+from saqc.lib.scope import currentScope
+
+
+# reference kinds
+INDEX, DATA, FLAGS = "index", "data", "flags"
+
+RefT = Tuple[str, str]
+
+DataIdT = Tuple[Hashable, Dict[str, Hashable]]
+
+_VERSIONS = count()
+
+
+class ResultCache:
+    """
+    The cached results of a run.
+
+    The inputs of the results are versioned per variable: the flags by the flagger (see
+    `BaseFlagger._version`), the data by the cache itself. As the data is not written through
+    a common interface, the evaluation of every test compares the identities of the column
+    arrays and the index before and after the test (see `dataIdentity`, `detectWrites`).
+    Entries store the versions of their inputs and are valid, as long as these versions do not change.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._versions = {}
+        self._masks = {}
+        self._pending = {}
+
+    def touch(self, field: str = None):
+        """
+        Invalidate the results computed from the data of `field`, from all the data (and the index) if None
+        """
+        if field is None:
+            self._versions, self._masks = {}, {}
+        else:
+            self._versions[DATA, field] = next(_VERSIONS)
+
+    def mask(self, flagger, fields):
+        """
+        Announce the data of `fields` to be masked by the flags of `flagger` (see `evalCompiled`)
+        """
+        for field in fields:
+            token = flagger._version(field)
+            if self._masks.get(field) != token:
+                self._masks[field] = token
+                self.touch(field)
+
+    def detectWrites(self, before: "DataIdT", after: "DataIdT"):
+        """
+        Invalidate the results computed from the data, that changed between the identities `before` and `after`
+        """
+        (index_before, columns_before), (index_after, columns_after) = before, after
+        if index_before != index_after:
+            self.touch()
+            return
+        for field in set(columns_before) | set(columns_after):
+            if columns_before.get(field) != columns_after.get(field):
+                self.touch(field)
+
+    def valid(self, key: Hashable, refs: Tuple[RefT, ...], data: pd.DataFrame, flagger) -> bool:
+        versions = tuple(self._version(ref, data, flagger) for ref in refs)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == versions:
+            return True
+        self._pending[key] = versions
+        return False
+
+    def lookup(self, key: Hashable):
+        return _copy(self._entries[key][1])
+
+    def store(self, key: Hashable, value):
+        self._entries[key] = (self._pending.pop(key), _copy(value))
+        return value
+
+    def _version(self, ref: RefT, data: pd.DataFrame, flagger):
+        if ref[0] == FLAGS:
+            return flagger._version(ref[1])
+        version = self._versions.get(ref)
+        if version is None:
+            version = self._versions[ref] = next(_VERSIONS)
+        # NOTE: a cheap guard against other indices, changes within a run are detected by `detectWrites`
+        return (version, _arrayId(data.index)) if ref[0] == INDEX else version
+
+
+def resultCache() -> ResultCache:
+    """
+    The cache of the current run, a new (empty) cache outside of a run
+    """
+    scope = currentScope()
+    if scope is None:
+        return ResultCache()
+    return scope.get("results", ResultCache)
+
+
+def cached(key: Hashable, refs: Tuple[RefT, ...], data: pd.DataFrame, flagger, func: Callable[[], object]):
+    """
+    Return the result of `func` cached under `key` within the current run.
+
+    :param key: The key of the result, needs to identify `func` (and its parameters).
+    :param refs: The inputs of `func`, pairs of a reference kind (`INDEX`, `DATA`, `FLAGS`) and a variable.
+    :param data: The data `func` is computed on.
+    :param flagger: The flagger `func` is computed on.
+    :param func: The computation, called without arguments.
+    """
+    cache = resultCache()
+    if cache.valid(key, refs, data, flagger):
+        return cache.lookup(key)
+    return cache.store(key, func())
+
+
+def dataIdentity(data: pd.DataFrame) -> DataIdT:
+    """
+    The identities of the index and the column arrays of `data`, see `ResultCache.detectWrites`
+    """
+    return _arrayId(data.index), {field: _arrayId(data[field]) for field in data.columns}
+
+
+def _arrayId(values) -> Hashable:
+    if isinstance(values, pd.RangeIndex):
+        # NOTE: the values are materialized on every access
+        return values.start, values.stop, values.step
+    values = values.values
+    if isinstance(values, np.ndarray):
+        # NOTE: the views of the same memory (e.g. the columns of a copied frame) share their identity
+        return values.__array_interface__["data"][0], values.shape, values.strides
+    return id(values)
+
+
+def _copy(value):
+    # NOTE: the results might be modified by the callers (e.g. `procGeneric`)
+    if isinstance(value, tuple):
+        values = [_copy(v) for v in value]
+        # NOTE: named tuples are constructed from their fields
+        return type(value)(*values) if hasattr(value, "_fields") else tuple(values)
+    return value.copy() if isinstance(value, (pd.Series, pd.DataFrame, np.ndarray)) else value
@@ -0,0 +1,157 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+The numba kernels of saqc.
+
+They live in their own module, so numba is only imported, when one of them is needed.
+"""
+
+import numpy as np
+import numba as nb
+
+
+@nb.jit(nopython=True, cache=True)
+def findIndex(iterable, value, start):
+    i = start
+    while i < len(iterable):
+        v = iterable[i]
+        if v >= value:
+            return i
+        i = i + 1
+    return -1
+
+
+@nb.jit(nopython=True, cache=True)
+def valueRange(iterable):
+    minval = iterable[0]
+    maxval = minval
+    for v in iterable:
+        if v < minval:
+            minval = v
+        elif v > maxval:
+            maxval = v
+    return maxval - minval
+
+
+@nb.jit(nopython=True, cache=True)
+def binSum(values, starts, ends):
+    """
+    nan-ignoring sum over the bins values[starts[i]:ends[i]],
+    empty bins sum up to 0
+    """
+    out = np.zeros(len(starts))
+    for i in range(len(starts)):
+        for j in range(starts[i], ends[i]):
+            if not np.isnan(values[j]):
+                out[i] += values[j]
+    return out
+
+
+@nb.jit(nopython=True, cache=True)
+def binCount(values, starts, ends):
+    """
+    number of valid (non-nan) values within the bins values[starts[i]:ends[i]]
+    """
+    out = np.zeros(len(starts))
+    for i in range(len(starts)):
+        for j in range(starts[i], ends[i]):
+            if not np.isnan(values[j]):
+                out[i] += 1
+    return out
+
+
+@nb.jit(nopython=True, cache=True)
+def binMean(values, starts, ends):
+    """
+    nan-ignoring mean over the bins values[starts[i]:ends[i]],
+    empty bins are set to nan
+    """
+    return binSum(values, starts, ends) / binCount(values, starts, ends)
+
+
+@nb.jit(nopython=True, cache=True)
+def binMin(values, starts, ends):
+    """
+    nan-ignoring minimum over the bins values[starts[i]:ends[i]],
+    empty bins are set to nan
+    """
+    out = np.full(len(starts), np.nan)
+    for i in range(len(starts)):
+        for j in range(starts[i], ends[i]):
+            if values[j] < out[i] or np.isnan(out[i]):
+                out[i] = values[j]
+    return out
+
+
+@nb.jit(nopython=True, cache=True)
+def binMax(values, starts, ends):
+    """
+    nan-ignoring maximum over the bins values[starts[i]:ends[i]],
+    empty bins are set to nan
+    """
+    out = np.full(len(starts), np.nan)
+    for i in range(len(starts)):
+        for j in range(starts[i], ends[i]):
+            if values[j] > out[i] or np.isnan(out[i]):
+                out[i] = values[j]
+    return out
+
+
+@nb.jit(nopython=True, cache=True)
+def binMedian(values, starts, ends, skipna=True):
+    """
+    median over the bins values[starts[i]:ends[i]], empty bins are set to nan.
+    If 'skipna' is False, bins containing nan values evaluate to nan (like np.median)
+    """
+    out = np.full(len(starts), np.nan)
+    for i in range(len(starts)):
+        chunk = values[starts[i] : ends[i]]
+        valid = chunk[~np.isnan(chunk)]
+        if len(valid) and (skipna or len(valid) == len(chunk)):
+            out[i] = np.median(valid)
+    return out
+
+
+@nb.jit(nopython=True, cache=True)
+def binStd(values, starts, ends, ddof=1):
+    """
+    nan-ignoring standard deviation over the bins values[starts[i]:ends[i]],
+    bins with not more than 'ddof' valid values are set to nan
+    """
+    out = np.full(len(starts), np.nan)
+    for i in range(len(starts)):
+        n, mean, m2 = 0, 0.0, 0.0
+        for j in range(starts[i], ends[i]):
+            v = values[j]
+            if not np.isnan(v):
+                n += 1
+                delta = v - mean
+                mean += delta / n
+                m2 += delta * (v - mean)
+        if n > ddof:
+            out[i] = np.sqrt(m2 / (n - ddof))
+    return out
+
+
+@nb.jit(nopython=True, cache=True)
+def otherIndex(values: np.ndarray, start: int = 0) -> int:
+    """
+    returns the index of the first non value not equal to values[0]
+    -> values[start:i] are all identical
+    """
+    val = values[start]
+    for i in range(start, len(values)):
+        if values[i] != val:
+            return i
+    return -1
+
+
+BIN_REDUCERS = {
+    "sum": binSum,
+    "count": binCount,
+    "mean": binMean,
+    "min": binMin,
+    "max": binMax,
+    "median": binMedian,
+}
@@ -67,7 +67,8 @@ def plotHook(
             # harmonization, nothing to see here
             return
 
-        mask = flags_old != flags_new
+        # NOTE: additional rows might be categoricals with differing categories
+        mask = flags_old.astype(object) != flags_new.astype(object)
         if isinstance(mask, pd.DataFrame):
             mask = mask.any(axis=1)
 
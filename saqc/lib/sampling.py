@@ -0,0 +1,78 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Inference of the sampling rate of (potentially irregular) time series.
+
+The rate is the dominant, i.e. the most frequent, interval between consecutive
+timestamps. Unlike `pd.infer_freq` the estimate neither fails on gaps nor on
+single irregular timestamps, and it is exact for sub-second and multi-day rates.
+"""
+
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from saqc.lib.cache import cached, INDEX, DATA
+
+
+class SamplingRate(NamedTuple):
+    # the dominant interval, `pd.NaT` for less than two timestamps
+    rate: pd.Timedelta
+    # the number of occurrences of every interval, sorted by the interval
+    intervals: pd.Series
+
+    @property
+    def offset(self) -> Optional[pd.DateOffset]:
+        """
+        the rate as a pandas offset, None if there is no rate
+        """
+        if pd.isnull(self.rate):
+            return None
+        return pd.tseries.frequencies.to_offset(self.rate)
+
+    @property
+    def regular(self) -> bool:
+        """
+        True, if all timestamps are separated by the same interval
+        """
+        return len(self.intervals) == 1
+
+    @property
+    def share(self) -> float:
+        """
+        the fraction of the intervals matching the rate
+        """
+        total = self.intervals.sum()
+        return self.intervals.get(self.rate, 0) / total if total else np.nan
+
+
+def estimateSamplingRate(index: pd.DatetimeIndex) -> SamplingRate:
+    """
+    Estimate the sampling rate of the timestamps in `index`
+
+    :param index: pandas.DatetimeIndex. The timestamps, expected to be sorted.
+    :return: SamplingRate. The dominant interval (the smallest one, if several are equally frequent)
+        and the histogram of all intervals.
+    """
+    diffs = np.diff(np.asarray(index.asi8))
+    # NOTE: duplicated (or unsorted) timestamps do not define an interval
+    values, counts = np.unique(diffs[diffs > 0], return_counts=True)
+    intervals = pd.Series(counts, index=pd.to_timedelta(values, unit="ns"), name="count")
+    rate = intervals.index[np.argmax(counts)] if len(counts) else pd.NaT
+    return SamplingRate(rate, intervals)
+
+
+def samplingRate(data: pd.DataFrame, field: str) -> SamplingRate:
+    """
+    Estimate the sampling rate of the non-missing values of `data[field]`.
+    The estimate is computed once per run, as long as the values of `field` do not change.
+
+    :param data: pandas.DataFrame. The data holding `field`.
+    :param field: String. The variable to estimate the sampling rate of.
+    """
+    key = ("samplingRate", field)
+    return cached(
+        key, ((INDEX, ""), (DATA, field)), data, None, lambda: estimateSamplingRate(data[field].dropna().index)
+    )
@@ -0,0 +1,62 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Optional
+
+
+class RunScope:
+    """
+    Container for state, that should live exactly as long as a single
+    saqc run (e.g. the harmonization backtracking information).
+
+    Every slot is created lazily by the given factory on first access
+    and released by `close` (if the stored object has a `close` method)
+    at the end of the scope.
+    """
+
+    def __init__(self, **options):
+        # NOTE: options are passed by the slot name to the slot factory
+        self.options = options
+        self._slots = {}
+
+    def get(self, key: str, factory: Callable[..., Any]) -> Any:
+        if key not in self._slots:
+            self._slots[key] = factory(**self.options.get(key, {}))
+        return self._slots[key]
+
+    def close(self):
+        for slot in self._slots.values():
+            close = getattr(slot, "close", None)
+            if callable(close):
+                close()
+        self._slots.clear()
+
+
+_SCOPE = ContextVar("saqc_scope", default=None)
+
+
+def currentScope() -> Optional[RunScope]:
+    return _SCOPE.get()
+
+
+@contextmanager
+def runScope(**options):
+    """
+    Open a new scope, valid for the current thread/context only, so
+    concurrent runs within the same process do not share their state.
+    If a scope is already active, it is reused.
+    """
+    scope = currentScope()
+    if scope is not None:
+        yield scope
+        return
+
+    scope = RunScope(**options)
+    token = _SCOPE.set(scope)
+    try:
+        yield scope
+    finally:
+        _SCOPE.reset(token)
+        scope.close()
@@ -1,15 +1,19 @@
 #! /usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from typing import Sequence, Union, Any, Iterator
+import sys
+from types import ModuleType
+from typing import Sequence, Union, Any, Iterator, Tuple, Callable
 
 import numpy as np
 import pandas as pd
-import numba as nb
 import saqc.lib.ts_operators as ts_ops
-import scipy
+from importlib import import_module
 from functools import reduce, partial
+from collections import OrderedDict
 from saqc.lib.types import T, PandasLike
+from saqc.lib.cache import cached, INDEX, DATA, FLAGS
+from saqc.lib.sampling import estimateSamplingRate, samplingRate
 
 SAQC_OPERATORS = {
     "exp": np.exp,
@@ -21,6 +25,7 @@ SAQC_OPERATORS = {
     "median": np.median,
     "min": np.min,
     "max": np.max,
+    "count": ts_ops.count,
     "first": pd.Series(np.nan, index=pd.DatetimeIndex([])).resample("0min").first,
     "last": pd.Series(np.nan, index=pd.DatetimeIndex([])).resample("0min").last,
     "delta_t": ts_ops.deltaT,
@@ -34,7 +39,59 @@ SAQC_OPERATORS = {
 }
 
 
-OP_MODULES = {"pd": pd, "np": np, "scipy": scipy}
+# NOTE: the modules are imported on first use, scipy is expensive to import
+OP_MODULES = {"pd": "pandas", "np": "numpy", "scipy": "scipy"}
+
+# NOTE: the numba kernels moved into `saqc.lib.kernels`, which is only imported on demand
+KERNELS = (
+    "findIndex",
+    "valueRange",
+    "binSum",
+    "binCount",
+    "binMean",
+    "binMin",
+    "binMax",
+    "binMedian",
+    "binStd",
+    "otherIndex",
+    "BIN_REDUCERS",
+)
+
+
+class LazyModule(ModuleType):
+    """
+    A module resolving its missing attributes on first access (see `lazyAttributes`).
+    """
+
+    def __getattr__(self, name):
+        # NOTE: only called for attributes not found otherwise
+        if name.startswith("__"):
+            raise AttributeError(f"module '{self.__name__}' has no attribute '{name}'")
+        value = self.__dict__["__resolve__"](name)
+        setattr(self, name, value)
+        return value
+
+
+def lazyAttributes(module: str, resolve: Callable[[str], Any]):
+    """
+    Resolve the missing attributes of the (imported) module `module` on first access.
+
+    :param module: String. The name of the module, usually `__name__`.
+    :param resolve: Callable. Called with the attribute name, returns the attribute or raises an AttributeError.
+    """
+    # NOTE: a module level `__getattr__` (PEP 562) needs python >= 3.7
+    module = sys.modules[module]
+    module.__resolve__ = resolve
+    module.__class__ = LazyModule
+
+
+def _resolveKernel(name):
+    if name in KERNELS:
+        return getattr(import_module("saqc.lib.kernels"), name)
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+
+lazyAttributes(__name__, _resolveKernel)
 
 
 def evalFuncString(func_string):
@@ -45,9 +102,9 @@ def evalFuncString(func_string):
     if rest:
         module = func_string[:module_dot]
         try:
-            return reduce(lambda m, f: getattr(m, f), rest, OP_MODULES[first])
+            return reduce(lambda m, f: getattr(m, f), rest, import_module(OP_MODULES[first]))
         except KeyError:
-            availability_list = [f"'{k}' (= {s.__name__})" for k, s in OP_MODULES.items()]
+            availability_list = [f"'{k}' (= {s})" for k, s in OP_MODULES.items()]
             availability_list = " \n".join(availability_list)
             raise ValueError(
                 f'The external-module alias "{module}" is not known to the internal operators dispatcher. '
@@ -93,27 +150,30 @@ def toSequence(value: Union[T, Sequence[T]], default: Union[T, Sequence[T]] = No
     return value
 
 
-@nb.jit(nopython=True, cache=True)
-def findIndex(iterable, value, start):
-    i = start
-    while i < len(iterable):
-        v = iterable[i]
-        if v >= value:
-            return i
-        i = i + 1
-    return -1
-
+def rollingWindows(index: pd.Index, window: Union[int, str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Bounds of the trailing windows ending at (and including) every row of `index`,
+    suitable for the `bin*` kernels.
+
+    :param index: pandas.Index. A monotonic DatetimeIndex for offset windows.
+    :param window: Integer or offset string. The number of rows or the time span covered by a window,
+        time spans are left open, i.e. a window of "1h" covers (t - 1h, t]. The first windows
+        cover less rows, as there are no rows before the start of the index.
+    :return: The (inclusive) start and (exclusive) end position of every window.
+    """
+    ends = np.arange(1, len(index) + 1)
+    if isinstance(window, (int, np.integer)) and not isinstance(window, bool):
+        if window < 1:
+            raise ValueError(f"window needs to be positive, got {window}")
+        return np.maximum(ends - window, 0), ends
 
-@nb.jit(nopython=True, cache=True)
-def valueRange(iterable):
-    minval = iterable[0]
-    maxval = minval
-    for v in iterable:
-        if v < minval:
-            minval = v
-        elif v > maxval:
-            maxval = v
-    return maxval - minval
+    if not isinstance(index, pd.DatetimeIndex) or not index.is_monotonic_increasing:
+        raise TypeError("offset windows need a monotonic DatetimeIndex")
+    delta = pd.to_timedelta(window).to_timedelta64()
+    if delta <= np.timedelta64(0):
+        raise ValueError(f"window needs to be positive, got '{window}'")
+    stamps = index.values
+    return np.searchsorted(stamps, stamps - delta, side="right"), ends
 
 
 def slidingWindowIndices(dates, window_size, iter_delta=None):
@@ -134,6 +194,8 @@ def slidingWindowIndices(dates, window_size, iter_delta=None):
       relying on the size of the window (sum, mean, median)
     """
 
+    from saqc.lib.kernels import findIndex
+
     # lets work on numpy data structures for performance reasons
     if isinstance(dates, (pd.DataFrame, pd.Series)):
         dates = dates.index
@@ -168,7 +230,24 @@ def slidingWindowIndices(dates, window_size, iter_delta=None):
 
 
 def inferFrequency(data: PandasLike) -> pd.DateOffset:
-    return pd.tseries.frequencies.to_offset(pd.infer_freq(data.index))
+    # NOTE: the dominant interval, irregular timestamps and gaps are tolerated
+    return estimateSamplingRate(data.index).offset
+
+
+def frameFromColumns(columns: dict, index: pd.Index, labels: pd.Index = None) -> pd.DataFrame:
+    """
+    Build a DataFrame from the mapping 'columns' of column labels to
+    column values, with the given 'index' and the column 'labels'
+    (the keys of 'columns' by default).
+    """
+    # NOTE:
+    # passing the column labels to the constructor, lets pandas box all
+    # values into a temporary object array, which is orders of magnitude
+    # slower than setting the labels afterwards
+    out = pd.DataFrame(columns, index=index)
+    if labels is not None:
+        out.columns = labels
+    return out
 
 
 def combineDataFrames(left: pd.DataFrame, right: pd.DataFrame, fill_value: float = np.nan) -> pd.DataFrame:
@@ -177,16 +256,38 @@ def combineDataFrames(left: pd.DataFrame, right: pd.DataFrame, fill_value: float
     output is union of the indices and the columns of both. In case
     of duplicated values, 'left' is overwritten by 'right'
     """
-    combined = left.reindex(
-        index=left.index.union(right.index),
-        columns=left.columns.union(right.columns, sort=False),
-        fill_value=fill_value,
-    )
+    # NOTE:
+    # the alignment is computed once, the columns of 'right' are then
+    # written positionally. Label based writes per column are slow.
+    index = left.index if left.index.equals(right.index) else left.index.union(right.index)
+    columns = left.columns.union(right.columns, sort=False)
+    rows = None if index.equals(right.index) else index.get_indexer(right.index)
+
+    tmp = OrderedDict()
+    for key in columns:
+        if key not in right.columns:
+            tmp[key] = _reindex(left[key], index, fill_value)
+        elif key not in left.columns or rows is None:
+            tmp[key] = _reindex(right[key], index, fill_value)
+        else:
+            tmp[key] = _writePositional(_reindex(left[key], index, fill_value), rows, right[key])
+    return frameFromColumns(tmp, index, columns)
 
-    for key, values in right.iteritems():
-        combined.loc[right.index, key] = values
 
-    return combined
+def _reindex(values: pd.Series, index: pd.Index, fill_value) -> pd.Series:
+    if values.index.equals(index):
+        return values.copy()
+    return values.reindex(index, fill_value=fill_value)
+
+
+def _writePositional(target: pd.Series, rows: np.ndarray, values: pd.Series) -> pd.Series:
+    # write 'values' into the (already copied) 'target' at the positions 'rows'
+    if isinstance(target.dtype, pd.CategoricalDtype) and target.dtype == values.dtype:
+        codes = target.cat.codes.values.copy()
+        codes[rows] = values.cat.codes.values
+        return pd.Series(pd.Categorical.from_codes(codes, dtype=target.dtype), index=target.index, name=target.name)
+    target.iloc[rows] = values.values
+    return target
 
 
 def retrieveTrustworthyOriginal(data: pd.DataFrame, field: str, flagger=None, level: Any = None) -> pd.DataFrame:
@@ -216,7 +317,17 @@ def retrieveTrustworthyOriginal(data: pd.DataFrame, field: str, flagger=None, le
     :param flagger:     None or a flagger object.
     :param level:       Lower bound of flags that are excepted for data. Must be a flag the flagger can handle.
 
+    The result is cached within a run, as long as neither the data nor the flags of 'field' change.
     """
+    refs = ((INDEX, ""), (DATA, field))
+    if flagger is not None:
+        refs += ((FLAGS, field),)
+    # NOTE: the tests on the same variable share the computation
+    key = ("retrieveTrustworthyOriginal", field, level, flagger is None)
+    return cached(key, refs, data, flagger, partial(_retrieveTrustworthyOriginal, data, field, flagger, level))
+
+
+def _retrieveTrustworthyOriginal(data: pd.DataFrame, field: str, flagger, level: Any):
     dataseries = data[field]
 
     if flagger is not None:
@@ -227,13 +338,13 @@ def retrieveTrustworthyOriginal(data: pd.DataFrame, field: str, flagger=None, le
     # drop the nan values that may result from any preceeding upsampling of the measurements:
     dataseries = dataseries.dropna()
 
-    if dataseries.empty:
-        return dataseries, np.nan
-
     # estimate original data sampling frequencie
-    # (the original series sampling rate may not match data-input sample rate):
-    seconds_rate = dataseries.index.to_series().diff().min().seconds
-    data_rate = pd.tseries.frequencies.to_offset(str(seconds_rate) + "s")
+    # (the original series sampling rate may not match data-input sample rate),
+    # NOTE: the rate is a property of the variable, it does not depend on the flags
+    data_rate = samplingRate(data, field).offset
+
+    if dataseries.empty or data_rate is None:
+        return dataseries, np.nan
 
     return dataseries.asfreq(data_rate), data_rate
 
@@ -395,24 +506,13 @@ def getFuncFromInput(func):
         return evalFuncString(func)
 
 
-@nb.jit(nopython=True, cache=True)
-def otherIndex(values: np.ndarray, start: int = 0) -> int:
-    """
-    returns the index of the first non value not equal to values[0]
-    -> values[start:i] are all identical
-    """
-    val = values[start]
-    for i in range(start, len(values)):
-        if values[i] != val:
-            return i
-    return -1
-
-
 def groupConsecutives(series: pd.Series) -> Iterator[pd.Series]:
 
     """
     group consecutive values into distinct pd.Series
     """
+    from saqc.lib.kernels import otherIndex
+
     index = series.index
     values = series.values
     target = values[0]
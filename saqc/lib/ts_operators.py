@@ -3,7 +3,6 @@
 
 import pandas as pd
 import numpy as np
-from sklearn.neighbors import NearestNeighbors
 
 
 def _isValid(data, max_nan_total, max_nan_consec):
@@ -28,6 +27,10 @@ def identity(ts):
     return ts
 
 
+def count(ts):
+    return ts.count()
+
+
 def difference(ts):
     return pd.Series.diff(ts)
 
@@ -80,6 +83,9 @@ def nBallClustering(in_arr, ball_radius=None):
 
 
 def kNN(in_arr, n_neighbors, algorithm="ball_tree"):
+    # NOTE: scikit-learn is expensive to import
+    from sklearn.neighbors import NearestNeighbors
+
     nbrs = NearestNeighbors(n_neighbors=n_neighbors, algorithm=algorithm).fit(in_arr)
     return nbrs.kneighbors()
 
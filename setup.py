@@ -23,8 +23,8 @@ setup(
         "matplotlib",
         "click",
         "pyarrow",
-        "python-intervals",
         "astor",
+        'contextvars; python_version < "3.7"',
     ],
     license="GPLv3",
     entry_points={"console_scripts": ["saqc=saqc.__main__:main"],},
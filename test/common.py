@@ -13,6 +13,8 @@ from saqc.flagger import (
     CategoricalFlagger,
     SimpleFlagger,
     DmpFlagger,
+    MatrixFlagger,
+    SparseFlagger,
 )
 
 
@@ -24,6 +26,8 @@ TESTFLAGGER = (
     SimpleFlagger(),
     DmpFlagger(),
     ContinuousFlagger(),
+    MatrixFlagger(["NIL", "GOOD", "BAD"]),
+    SparseFlagger(["NIL", "GOOD", "BAD"]),
 )
 
 
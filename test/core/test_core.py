@@ -1,14 +1,19 @@
 #! /usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
+import sys
 import logging
+import subprocess
 
 import pytest
 import numpy as np
 import pandas as pd
 
 from saqc.funcs import register, flagRange
+from saqc.funcs.register import FUNC_MAP, funcIndex
 from saqc.core.core import run
+from saqc.flagger import FlagHistory
 from saqc.core.config import Fields as F
 from saqc.lib.plotting import _plot
 from test.common import initData, initMetaDict, TESTFLAGGER
@@ -206,3 +211,133 @@ def test_plotting(data, flagger):
     _, flagger_range = flagRange(data, field, flagger_range, min=40, max=60, flag=flagger.GOOD)
     mask = flagger.getFlags(field) != flagger_range.getFlags(field)
     _plot(data, mask, field, flagger, interactive_backend=False)
+
+
+@pytest.mark.parametrize("flagger", TESTFLAGGER)
+def test_flagHistory(data, flagger):
+    var1, var2, *_ = data.columns
+    range_test = "flagRange(min=10, max=100)"
+    metadict = [
+        {F.VARNAME: var1, F.TESTS: range_test},
+        {F.VARNAME: var2, F.TESTS: "flagAll()"},
+    ]
+    metafobj, _ = initMetaDict(metadict, data)
+    history = FlagHistory()
+    _, flagger_result = run(metafobj, flagger, data, history=history)
+
+    assert len(history) == 2
+    assert history.flaggedBy(var1, 0) == range_test
+    assert history.flaggedBy(var1, 50) is None
+    assert history.flaggedBy(var2, 50) == "flagAll()"
+    assert history.flaggedBy(var2, 50, step=0) is None
+    assert (history.changes(1)["field"] == var2).all()
+
+    flagger_undone = history.undo(flagger_result, 0)
+    assert flagger_undone.getFlags(var1).equals(flagger_result.getFlags(var1))
+    assert (flagger_undone.getFlags(var2) == flagger.UNFLAGGED).all()
+    assert not history.undo(flagger_result, -1).isFlagged().any(axis=None)
+
+    # shape changing steps keep the flags of the dropped rows only
+    flagger_short = flagger_result.getFlagger(iloc=slice(None, 10))
+    step = history.record("shorten", flagger_result, flagger_short)
+    positions, _ = history._reshapes[step].changed[var1]
+    assert positions.tolist() == list(range(10, len(data)))
+    assert history.flaggedBy(var1, 0) is None
+    assert history.flaggedBy(var1, 0, step=step - 1) == range_test
+    assert history.undo(flagger_short, step - 1).getFlags().equals(flagger_result.getFlags())
+
+
+@pytest.mark.parametrize("flagger", TESTFLAGGER)
+def test_flagHistoryJournal(data, flagger):
+    var1, var2, *_ = data.columns
+    history = FlagHistory()
+    flagger = flagger.initFlags(data)
+
+    tracked = history.track(flagger)
+    flagger_new = tracked.setFlags(var1, iloc=[1, 2, 3]).setFlags(var1, iloc=[2, 5], flag=flagger.GOOD)
+    assert flagger._writes is None
+    assert flagger_new._writes[var1][2].tolist() == [1, 2, 3, 5]
+    assert var2 not in flagger_new._writes
+
+    step = history.record("test", flagger, flagger_new)
+    changes = history.changes(step)
+    assert (changes["field"] == var1).all()
+    assert changes["position"].tolist() == [1, 2, 3, 5]
+
+    # NOTE: only the journaled rows are compared
+    base, version, _ = flagger_new._writes[var1]
+    flagger_new._writes = {var1: (base, version, np.array([1]))}
+    step = history.record("test", flagger, flagger_new)
+    assert history.changes(step)["position"].tolist() == [1]
+
+    # the rows written by untracked flaggers are found by comparing all of them
+    step = history.record("test", flagger, flagger.setFlags(var2, iloc=[4]))
+    assert history.changes(step)["position"].tolist() == [4]
+
+
+@pytest.mark.parametrize("flagger", TESTFLAGGER)
+def test_flagHistoryHarmonization(flagger):
+    data = initData(1, end_date="2017-01-02", freq="10min")
+    tests = [
+        "harmonize(freq='15min', inter_method='time', reshape_method='nshift')",
+        "flagRange(min=10, max=100)",
+        "deharmonize()",
+    ]
+    metafobj, _ = initMetaDict([{F.VARNAME: "var1", F.TESTS: t} for t in tests], data)
+    history = FlagHistory()
+    _, flagger_result = run(metafobj, flagger, data, history=history)
+
+    assert set(history._reshapes) == {0, 2}
+    flagger_harm = history.undo(flagger_result, 1)
+    assert flagger_harm.getFlags().index.freq is None or flagger_harm.getFlags().index.freqstr == "15T"
+    assert flagger_harm.isFlagged("var1").any()
+    assert history.undo(flagger_result, -1).getFlags().equals(flagger.initFlags(data).getFlags())
+
+
+def test_funcIndex():
+    index = funcIndex()
+    assert "flagRange" in index and "flagAll" not in index
+    # NOTE: registered by plain calls, not by decoration
+    assert "harmonize" in index and "deharmonize" in index
+    for name, info in index.items():
+        assert FUNC_MAP[name].signature == info.signature
+        assert FUNC_MAP[name].func.__module__ == info.module
+
+
+def _runFresh(code):
+    # NOTE: a fresh interpreter, the modules are already loaded here
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    proc = subprocess.run(
+        [sys.executable, "-c", code], cwd=root, stdout=subprocess.PIPE, universal_newlines=True, check=True
+    )
+    return proc.stdout.strip()
+
+
+def test_lazyImports():
+    code = (
+        "import sys, saqc; "
+        "from saqc.funcs.register import FUNC_MAP; "
+        "assert FUNC_MAP.signature('spikes_flagSpektrumBased'); "
+        "print(sorted(m for m in ('numba', 'scipy', 'sklearn', 'saqc.funcs.spikes_detection') if m in sys.modules))"
+    )
+    assert _runFresh(code) == "[]"
+
+
+def test_lazyHarmonization():
+    # NOTE: `harmonize` and `deharmonize` are not registered by decoration
+    code = """
+import sys
+from saqc.core.core import run
+from saqc.core.config import Fields as F
+from saqc.flagger import SimpleFlagger
+from test.common import initData, initMetaDict
+
+assert "saqc.funcs.harm_functions" not in sys.modules
+data = initData(1, end_date="2017-01-05", freq="10min")
+tests = ["harmonize(freq='15min', inter_method='time', reshape_method='nshift')", "deharmonize()"]
+fobj, _ = initMetaDict([{F.VARNAME: "var1", F.TESTS: t} for t in tests], data)
+data_result, flagger_result = run(fobj, SimpleFlagger(), data)
+assert flagger_result.getFlags().index.equals(data.index)
+print(data_result["var1"].equals(data["var1"]))
+"""
+    assert _runFresh(code) == "True"
@@ -1,6 +1,7 @@
 #! /usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import astor
 import pytest
 import numpy as np
 
@@ -11,8 +12,11 @@ from saqc.core.evaluator import (
     initLocalEnv,
     ConfigChecker,
     ConfigTransformer,
+    ExpressionCache,
+    eliminateCommonSubexpressions,
 )
 
+from saqc.lib.cache import dataIdentity
 from test.common import TESTFLAGGER, initData
 
 
@@ -72,3 +76,79 @@ def test_supportedArguments(flagger):
     ]
     for expr in exprs:
         compileExpression(expr, flagger)
+
+
+def test_commonSubexpressions():
+    flagger = TESTFLAGGER[0]
+    data = initData(3)
+    var1, var2, var3 = data.columns
+    env = initLocalEnv(data, var1, flagger.initFlags(data), np.nan)
+
+    exprs = [
+        f"flagGeneric(func=abs({var1} - {var2}) > 10)",
+        f"flagGeneric(func=(abs({var1} - {var2}) > 20) & ~isflagged({var3}))",
+        f"flagGeneric(func={var3} > 5)",
+        f"procGeneric(func=~isflagged({var3}) | ({var1} * 2 > 0))",
+    ]
+    trees = [ConfigTransformer(env).visit(parseExpression(e)) for e in exprs]
+    sources = [astor.to_source(t) for t in eliminateCommonSubexpressions(trees)]
+
+    assert [s.count("__cse__.valid") for s in sources] == [1, 2, 0, 1]
+    # NOTE: the common subexpression is cached as a whole, not its parts
+    assert "abs(data['var1'] - data['var2'])" in sources[0]
+    assert sources[0].count("data['var1']") == 1
+
+
+@pytest.mark.parametrize("flagger", TESTFLAGGER)
+def test_expressionCache(flagger):
+    data = initData(3).astype(float)
+    var1, var2, var3 = data.columns
+    flagger = flagger.initFlags(data)
+    cache = ExpressionCache()
+    refs = (("data", var1), ("flags", var2), ("index", ""))
+
+    assert not cache.valid("key", refs, data, flagger)
+    assert cache.store("key", data[var1] * 2) is not None
+    assert (cache.lookup("key") == data[var1] * 2).all()
+    assert cache.valid("key", refs, data.copy(), flagger)
+
+    # NOTE: unreferenced variables do not invalidate
+    changed = data.copy()
+    changed[var3] = 0
+    cache.touch(var3)
+    assert cache.valid("key", refs, changed, flagger.setFlags(var3))
+
+    # NOTE: the data is versioned by the writers, not by its values
+    changed[var1] = np.nan
+    cache.touch(var1)
+    assert not cache.valid("key", refs, changed, flagger)
+    cache.store("key", changed[var1])
+    assert cache.valid("key", refs, changed.copy(), flagger)
+    assert not cache.valid("key", refs, changed, flagger.setFlags(var2))
+
+    # NOTE: the data masked by other flags (see `evalCompiled`) invalidates as well
+    cache.mask(flagger, data.columns)
+    assert not cache.valid("key", refs, changed, flagger)
+    cache.store("key", changed[var1])
+    cache.mask(flagger.setFlags(var3), data.columns)
+    assert cache.valid("key", refs, changed, flagger)
+    cache.mask(flagger.setFlags(var1), data.columns)
+    assert not cache.valid("key", refs, changed, flagger)
+
+    cache.store("key", changed[var1])
+    cache.touch()
+    assert not cache.valid("key", refs, changed, flagger)
+
+    # NOTE: another index of the same length
+    cache.store("key", changed[var1])
+    assert not cache.valid("key", refs, changed.shift(1, freq="1h"), flagger)
+    assert cache.valid("key", refs, changed, flagger)
+
+    # NOTE: new column arrays or a new index are detected as writes
+    before = dataIdentity(changed)
+    changed[var2] = changed[var2] * 2
+    cache.detectWrites(before, dataIdentity(changed))
+    assert cache.valid("key", refs, changed, flagger)
+    changed[var1] = changed[var1] * 2
+    cache.detectWrites(before, dataIdentity(changed))
+    assert not cache.valid("key", refs, changed, flagger)
@@ -0,0 +1,127 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pickle
+
+import pytest
+import numpy as np
+
+from saqc.core.core import run
+from saqc.core.plan import compilePlan
+from saqc.core.evaluator import evalExpression
+from saqc.core.config import Fields as F
+from saqc.funcs import register
+from test.common import initData, initMetaDict, TESTFLAGGER
+
+
+@register()
+def scaleData(data, field, flagger, factor, **kwargs):
+    # NOTE: a custom function writing into `data`, without announcing it to the cache
+    data[field] = data[field] * factor
+    return data, flagger
+
+
+@pytest.fixture
+def data():
+    return initData(3)
+
+
+def _config(data):
+    var1, var2, *_ = data.columns
+    return [
+        {F.VARNAME: "'var.*'", F.TESTS: "flagRange(min=10, max=60)"},
+        {F.VARNAME: var1, F.TESTS: "flagGeneric(func=this > 100)"},
+        {F.VARNAME: "dummy", F.TESTS: f"flagGeneric(func=isflagged({var2}))"},
+    ]
+
+
+@pytest.mark.parametrize("flagger", TESTFLAGGER)
+def test_planSteps(data, flagger):
+    fobj, _ = initMetaDict(_config(data), data)
+    plan = compilePlan(fobj, data.columns, flagger)
+
+    assert [s.varname for s in plan.steps] == [*data.columns, data.columns[0], "dummy"]
+    assert plan.variables == (*data.columns, "dummy")
+    assert plan.steps[0].functions == ("flagRange",)
+    with pytest.raises(AttributeError):
+        plan.steps = ()
+
+
+@pytest.mark.parametrize("flagger", TESTFLAGGER)
+@pytest.mark.parametrize("dsl_backend", ["pandas", "numba"])
+def test_planExecute(data, flagger, dsl_backend):
+    fobj, _ = initMetaDict(_config(data), data)
+    plan = compilePlan(fobj, data.columns, flagger, dsl_backend=dsl_backend)
+
+    fobj.seek(0)
+    _, flagger_expected = run(fobj, flagger, data)
+
+    for _ in range(2):
+        _, flagger_result = plan.execute(data)
+        assert (flagger_result.getFlags() == flagger_expected.getFlags()).all(axis=None)
+
+    # NOTE: the plan is reusable for any dataset with the same variables
+    other = initData(3, start_date="2018-01-01", end_date="2018-02-01")
+    _, flagger_result = plan.execute(other)
+    assert flagger_result.getFlags().index.equals(other.index)
+
+    with pytest.raises(ValueError):
+        plan.execute(initData(4))
+
+
+@pytest.mark.parametrize("flagger", TESTFLAGGER)
+def test_planPickle(data, flagger):
+    fobj, _ = initMetaDict(_config(data), data)
+    plan = compilePlan(fobj, data.columns, flagger)
+
+    restored = pickle.loads(pickle.dumps(plan))
+    assert restored.steps == plan.steps
+
+    _, flagger_expected = plan.execute(data)
+    _, flagger_result = restored.execute(data)
+    assert (flagger_result.getFlags() == flagger_expected.getFlags()).all(axis=None)
+
+
+@pytest.mark.parametrize("flagger", TESTFLAGGER)
+def test_planCommonSubexpressions(data, flagger):
+    var1, var2, var3 = data.columns
+    # NOTE: the common subexpression is invalidated by the flags of the first and the data of the last test
+    tests = [
+        (var1, f"flagGeneric(func=abs({var1} - {var2}) > 5000)"),
+        (var2, f"flagGeneric(func=(abs({var1} - {var2}) > 6000) & ~isflagged({var3}))"),
+        (var3, f"flagGeneric(func=(abs({var1} - {var2}) < 10) | isflagged({var3}))"),
+        (var2, f"procGeneric(func=abs({var1} - {var2}) / 2)"),
+        (var3, f"flagGeneric(func=abs({var1} - {var2}) > 3000)"),
+    ]
+    fobj, _ = initMetaDict([{F.VARNAME: v, F.TESTS: t} for v, t in tests], data)
+    plan = compilePlan(fobj, data.columns, flagger)
+    data_result, flagger_result = plan.execute(data)
+
+    data_expected, flagger_expected = data.copy(), flagger.initFlags(data)
+    for var, test in tests:
+        data_expected, flagger_expected = evalExpression(test, data_expected, var, flagger_expected)
+
+    assert flagger_result.isFlagged().any(axis=None)
+    assert (flagger_result.getFlags() == flagger_expected.getFlags()).all(axis=None)
+    assert np.allclose(data_result, data_expected, equal_nan=True)
+
+
+@pytest.mark.parametrize("flagger", TESTFLAGGER)
+def test_planCommonSubexpressionsWrites(data, flagger):
+    var1, var2, var3 = data.columns
+    tests = [
+        # NOTE: the flags of the referenced variables stay untouched, so only the write invalidates
+        (var3, f"flagGeneric(func=abs({var1} - {var2}) > 5000)"),
+        (var2, "scaleData(factor=0.5)"),
+        (var1, f"flagGeneric(func=abs({var1} - {var2}) > 5000)"),
+    ]
+    fobj, _ = initMetaDict([{F.VARNAME: v, F.TESTS: t} for v, t in tests], data)
+    plan = compilePlan(fobj, data.columns, flagger)
+    _, flagger_result = plan.execute(data)
+
+    data_expected, flagger_expected = data.copy(), flagger.initFlags(data)
+    for var, test in tests:
+        data_expected, flagger_expected = evalExpression(test, data_expected, var, flagger_expected)
+
+    assert not flagger_result.isFlagged(var1).equals(flagger_result.isFlagged(var3))
+    assert (flagger_result.getFlags() == flagger_expected.getFlags()).all(axis=None)
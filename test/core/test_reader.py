@@ -152,3 +152,44 @@ def test_configChecks(data, flagger, nodata, caplog):
         _, config_df = initMetaDict([config_dict], data)
         with pytest.raises(expected):
             checkConfig(config_df, data, flagger, nodata)
+
+
+def test_configInvalidValue(data):
+    var = data.columns[0]
+    config = f"""
+    {F.VARNAME}|{F.TESTS}|{F.START}
+    {var}|flagAll()|2017-01-01
+    {var}|flagAll()|not a date
+    """
+    with pytest.raises(ValueError, match="line 3"):
+        initMetaString(config, data)
+
+
+def test_configWildcardsRepeated(data):
+    var1, var2, var3, *_ = data.columns
+    config = f"""
+    {F.VARNAME}|{F.TESTS}
+    'var[12]'|flagAll()
+    {var3}|flagAll()
+    'var[12]'|flagMissing()
+    """
+    _, meta_frame = initMetaString(config, data)
+    assert meta_frame[F.VARNAME].tolist() == [var1, var2, var3, var1, var2]
+    assert meta_frame[F.LINENUMBER].tolist() == [2, 2, 3, 4, 4]
+
+
+def test_configChecksAllErrors(data):
+    flagger = TESTFLAGGER[0].initFlags(data)
+    var1, var2, *_ = data.columns
+    config = f"""
+    {F.VARNAME}|{F.TESTS}
+    {var1}|flagRange(mn=0)
+    {var2}|flagNothing()
+    {var1}|flagRange(mn=0)
+    """
+    _, config_df = initMetaString(config, data)
+    with pytest.raises(TypeError) as exc:
+        checkConfig(config_df, data, flagger, np.nan)
+    msg = str(exc.value)
+    assert "line 2" in msg and "line 3" in msg and "line 4" in msg
+    assert "flagNothing" in msg
@@ -4,12 +4,19 @@ __author__ = "Bert Palm"
 __email__ = "bert.palm@ufz.de"
 __copyright__ = "Copyright 2018, Helmholtz-Zentrum für Umweltforschung GmbH - UFZ"
 
+import json
+
 import pytest
 import numpy as np
 import pandas as pd
 from pandas.api.types import is_bool_dtype
 
 from test.common import TESTFLAGGER
+from saqc.flagger import CategoricalFlagger, MatrixFlagger, SparseFlagger, DmpFlagger, ContinuousFlagger
+from saqc.flagger import dmpflagger
+from saqc.flagger.dmpflagger import FlagFields, projectVersion
+from saqc.flagger.baseflagger import locatorArray
+from saqc.flagger.store import readFlags, writeFlags
 
 
 def _getDataset(rows, cols):
@@ -399,3 +406,223 @@ def test_classicUseCases(data, flagger):
     flagger.clearFlags(field)
     flagged = flagger.setFlags(field, iloc=indices, flag=flagger.BAD).isFlagged(field)
     assert (flagged.iloc[indices] == flagged[flagged]).all()
+
+
+@pytest.mark.parametrize("data", DATASETS)
+@pytest.mark.parametrize("backend", [MatrixFlagger, SparseFlagger])
+def test_flaggerBackends(data, backend):
+    flags = ["NIL", "GOOD", "DOUBTFUL", "BAD"]
+    results = []
+    for flagger in [CategoricalFlagger(flags), backend(flags)]:
+        field, *_ = data.columns
+        flagger = flagger.initFlags(data)
+        flagger = flagger.setFlags(field, loc=data[field] > data[field].median(), flag="DOUBTFUL")
+        flagger = flagger.setFlags(field, iloc=slice(None, None, 3), flag="BAD")
+        flagger = flagger.setFlags(field, iloc=slice(None, None, 2), flag="GOOD")
+        flag = pd.Series("DOUBTFUL", index=data.index[5:15], dtype=flagger.dtype)
+        flagger = flagger.setFlags(field, loc=flag.index, flag=flag)
+        flagger = flagger.setFlags(field, iloc=slice(8, 12), flag="GOOD", force=True)
+        flagger = flagger.setFlagger(flagger.getFlagger(iloc=slice(10, 20)).clearFlags(field))
+        results.append(
+            (flagger.getFlags(), flagger.isFlagged(), flagger.isFlagged(field, flag="DOUBTFUL", comparator=">="))
+        )
+
+    for exp, got in zip(*results):
+        assert exp.equals(got)
+
+
+@pytest.mark.parametrize("backend", [MatrixFlagger, SparseFlagger])
+def test_flaggerBackendsFlagNumber(backend):
+    with pytest.raises(ValueError):
+        backend(list(range(200)))
+
+
+@pytest.mark.parametrize("data", DATASETS)
+def test_dmpFlaggerFields(data):
+    field, *_ = data.columns
+    flagger = DmpFlagger().initFlags(data)
+    mask = data[field] > data[field].median()
+    flagger = flagger.setFlags(field, loc=mask, flag="DOUBTFUL", cause="cause", func_name="test")
+    flagger = flagger.setFlagger(flagger.getFlagger(iloc=slice(10, 20)).clearFlags(field))
+
+    flags = flagger._flags[field]
+    for flag_field in [FlagFields.CAUSE, FlagFields.COMMENT]:
+        assert flags[flag_field].dtype == "category"
+
+    mask.iloc[10:20] = False
+    comment = json.loads(flags.loc[mask, FlagFields.COMMENT].iloc[0])
+    assert (flags.loc[mask, FlagFields.CAUSE] == "cause").all()
+    assert comment == {"comment": "", "commit": flagger.project_version, "test": "test"}
+    assert (flags.loc[~mask, FlagFields.CAUSE] != "cause").all()
+
+
+def test_dmpFlaggerVersion():
+    data = pd.DataFrame({"var": np.arange(10)})
+    assert DmpFlagger().project_version == projectVersion()
+    flagger = DmpFlagger(project_version="v42").initFlags(data).setFlags("var")
+    comments = flagger._flags[("var", FlagFields.COMMENT)]
+    assert all(json.loads(c)["commit"] == "v42" for c in comments)
+
+    flagger.project_version = "v43"
+    flagger = flagger.setFlags("var", force=True)
+    comments = flagger._flags[("var", FlagFields.COMMENT)]
+    assert all(json.loads(c)["commit"] == "v43" for c in comments)
+
+
+def test_dmpFlaggerVersionOnce(monkeypatch):
+    calls = []
+    run = dmpflagger.subprocess.run
+    monkeypatch.setattr(
+        dmpflagger.subprocess, "run", lambda *args, **kwargs: calls.append(args) or run(*args, **kwargs)
+    )
+    projectVersion.cache_clear()
+
+    data = pd.DataFrame({"var": np.arange(10)})
+    DmpFlagger().initFlags(data).setFlags("var")
+    flagger = DmpFlagger(project_version="v42")
+    flagger.project_version = "v43"
+    for _ in range(3):
+        DmpFlagger().initFlags(data).setFlags("var")
+    assert len(calls) <= 1
+
+
+@pytest.mark.parametrize("data", DATASETS)
+def test_locatorArray(data):
+    field, *_ = data.columns
+    index = data.index
+    mask = data[field] > data[field].median()
+
+    assert locatorArray(index).all()
+    assert (locatorArray(index, loc=mask) == mask.values).all()
+    assert (locatorArray(index, loc=index[:10]) == (np.arange(len(index)) < 10)).all()
+    assert (locatorArray(index, iloc=np.arange(10)) == (np.arange(len(index)) < 10)).all()
+    assert (locatorArray(index, iloc=slice(None, 10)) == (np.arange(len(index)) < 10)).all()
+
+    # NOTE: the result must never be a view of the locator
+    locatorArray(index, loc=mask)[:] = False
+    assert mask.any()
+
+
+@pytest.mark.parametrize("data", DATASETS)
+@pytest.mark.parametrize("flagger", TESTFLAGGER)
+def test_setFlagsBatch(data, flagger):
+    flagger = flagger.initFlags(data)
+    field, *_ = data.columns
+    updates = [
+        dict(field=field, loc=data[field] > data[field].median(), flag=flagger.GOOD),
+        dict(field=field, iloc=slice(None, None, 2)),
+        dict(field=field, iloc=slice(None, None, 3), flag=flagger.UNFLAGGED, force=True),
+    ]
+
+    expected = flagger
+    for update in updates:
+        expected = expected.setFlags(**update)
+    result = flagger.setFlagsBatch(updates)
+
+    assert result.getFlags().equals(expected.getFlags())
+    # the passed flagger is left untouched
+    assert (flagger.getFlags() == flagger.UNFLAGGED).all(axis=None)
+
+
+@pytest.mark.parametrize("data", DATASETS)
+@pytest.mark.parametrize("flagger", TESTFLAGGER)
+def test_isFlaggedCache(data, flagger):
+    flagger = flagger.initFlags(data)
+    field, *other = data.columns
+
+    # the cached masks are not exposed
+    flagged = flagger.isFlagged(field)
+    flagged[:] = True
+    assert not flagger.isFlagged(field).any()
+    assert not flagger.isFlagged().any(axis=None)
+
+    versions = {c: flagger._version(c) for c in data.columns}
+    flagged = flagger.setFlags(field, iloc=slice(None, None, 2))
+
+    # only the versions of the modified columns change
+    assert flagged._version(field) != versions[field]
+    assert all(flagged._version(c) == versions[c] for c in other)
+    assert flagged.isFlagged(field).values.tolist() == [True, False] * (len(data) // 2)
+    assert not flagged.isFlagged(field, flag=flagger.BAD).any()
+    assert flagged.isFlagged(field, flag=flagger.BAD, comparator="==").sum() == len(data) // 2
+    assert not flagger.isFlagged(field).any()
+
+    # trimmed down flaggers do not reuse the masks of their origin
+    assert flagged.getFlagger(loc=data.index)._version(field) == flagged._version(field)
+    trimmed = flagged.getFlagger(iloc=slice(1, None))
+    assert trimmed._version(field) != flagged._version(field)
+    assert trimmed.isFlagged(field).values.tolist() == [False, True] * (len(data) // 2 - 1) + [False]
+
+    # replacing the flags invalidates all masks
+    merged = flagger.setFlagger(flagged)
+    assert all(merged._version(c) != versions[c] for c in data.columns)
+    assert merged.isFlagged(field).equals(flagged.isFlagged(field))
+
+
+def test_continuousFlagger():
+    data = pd.DataFrame({"var": np.arange(6, dtype=float)})
+    flagger = ContinuousFlagger(min_=0.0, max_=1.0).initFlags(data)
+
+    assert flagger.isSUSPICIOUS(0.5) and not flagger.isSUSPICIOUS(1.0)
+    assert (flagger.isSUSPICIOUS(np.array([0.0, 0.5, 1.0])) == [False, True, False]).all()
+    with pytest.raises(TypeError):
+        flagger.setFlags("var", flag=1.5)
+    with pytest.raises(TypeError):
+        flagger.setFlags("var", flag=pd.Series([0.5, 2.0] * 3, dtype=float))
+
+    flagger = flagger.setFlags("var", iloc=slice(0, 4), flag=0.4)
+    # factor scales the flag and is clipped into the interval
+    flagger = flagger.setFlags("var", iloc=slice(2, 4), flag=0.4, factor=4)
+    assert flagger.getFlags("var").tolist() == [0.4, 0.4, 1.0, 1.0, -1.0, -1.0]
+
+    # modify scales the existing flags and keeps the larger one
+    flagger = flagger.setFlags("var", flag=0.5, factor=1.5, modify=True)
+    assert flagger.getFlags("var").tolist() == [0.75, 0.75, 1.0, 1.0, 0.75, 0.75]
+
+    # existing flags are not lowered without force
+    assert flagger.setFlags("var", flag=0.1).getFlags("var").equals(flagger.getFlags("var"))
+
+
+def test_sparseFlagger():
+    data = pd.DataFrame({"var": np.arange(1000)}, index=pd.date_range("2000", periods=1000, freq="1min"))
+    flagger = SparseFlagger(["NIL", "GOOD", "BAD"]).initFlags(data)
+    assert len(flagger._sparse) == 0
+
+    flagger = flagger.setFlags("var", iloc=[3, 500, 7])
+    positions, codes = flagger._sparse["var"]
+    assert positions.tolist() == [3, 7, 500]
+    assert (codes == 2).all()
+
+    # new positions are merged into the stored ones
+    merged = flagger.setFlags("var", iloc=[8, 7], flag="GOOD", force=True)
+    assert merged._sparse["var"][0].tolist() == [3, 7, 8, 500]
+    assert merged._sparse["var"][1].tolist() == [2, 1, 1, 2]
+    assert flagger.setFlags("var", iloc=[7, 8], flag="GOOD")._sparse["var"][0].tolist() == [3, 7, 8, 500]
+
+    # the positions are translated into the trimmed down flagger
+    trimmed = flagger.getFlagger(iloc=slice(5, None))
+    assert trimmed._sparse["var"][0].tolist() == [2, 495]
+    assert trimmed.isFlagged("var").sum() == 2
+
+    # unflagging drops the stored flags
+    assert len(flagger.clearFlags("var")._sparse["var"][0]) == 0
+
+
+@pytest.mark.parametrize("data", DATASETS)
+@pytest.mark.parametrize("flagger", TESTFLAGGER)
+def test_flagStore(data, flagger, tmp_path):
+    field, *_ = data.columns
+    flagger = flagger.initFlags(data).setFlags(field, iloc=slice(None, None, 3))
+    path = str(tmp_path / "flags")
+    writeFlags(path, flagger)
+
+    flags = readFlags(path, flagger)
+    assert flags.equals(flagger.getFlags())
+    assert flagger.initFlags(flags=flags).getFlags().equals(flagger.getFlags())
+
+    # alignment to another index
+    index = data.index[5:].append(data.index[:5] - pd.Timedelta("365d"))
+    flags = readFlags(path, flagger, index=index)
+    assert flags.index.equals(index)
+    assert flags.iloc[:-5].equals(flagger.getFlags().iloc[5:])
+    assert (flags.iloc[-5:] == flagger.UNFLAGGED).all(axis=None)
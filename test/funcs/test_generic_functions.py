@@ -7,6 +7,7 @@ import pandas as pd
 
 from test.common import initData, TESTFLAGGER, TESTNODATA
 from saqc.core.core import run
+from saqc.core.plan import compilePlan
 from saqc.core.config import Fields as F
 
 from test.common import initData, TESTFLAGGER, TESTNODATA, initMetaDict, initMetaString
@@ -238,3 +239,113 @@ def test_variableAssignments(data, flagger):
         "dummy1",
     }
     assert set(result_flagger.getFlags().columns) == set(data.columns) | {"dummy1", "dummy2"}
+
+
+@pytest.mark.parametrize("flagger", TESTFLAGGER)
+@pytest.mark.parametrize("nodata", TESTNODATA)
+def test_numbaBackend(data, flagger, nodata):
+    var1, var2, *_ = data.columns
+    data.iloc[::5, 0] = nodata
+    flagger = flagger.initFlags(data).setFlags(var2, iloc=slice(None, None, 3))
+
+    tests = [
+        f"flagGeneric(func=({var1} > 100) & ({var2} < 1000) | isflagged({var2}))",
+        f"flagGeneric(func=~ismissing({var1}) & (abs(this - {var2}) > mean({var2})))",
+        f"flagGeneric(func=(this % 7 == 0) | (sqrt({var2}) < std(this) / 10))",
+        f"flagGeneric(func=isflagged({var2}, BAD))",
+        f"procGeneric(func=-{var1} * 2 + {var2} ** 2 / 3)",
+        f"procGeneric(func=exp(this / max(this)) - NODATA)",
+    ]
+
+    for expr in tests:
+        data_expected, flagger_expected = evalExpression(expr, data, var1, flagger, nodata)
+        data_result, flagger_result = evalExpression(expr, data, var1, flagger, nodata, dsl_backend="numba")
+        assert data_result.dtypes.equals(data_expected.dtypes)
+        assert np.allclose(data_result, data_expected, equal_nan=True)
+        assert (flagger_result.isFlagged() == flagger_expected.isFlagged()).all(axis=None)
+
+
+@pytest.mark.parametrize("flagger", TESTFLAGGER[:2])
+def test_numbaBackendFallback(data, flagger):
+    var1, var2, *_ = data.columns
+    # NOTE: unsupported dtypes are left to the pandas evaluation
+    data = data.astype(object)
+    flagger = flagger.initFlags(data)
+
+    for expr in [f"procGeneric(func={var1} * 2 + {var2})", f"flagGeneric(func=({var1} > 100) & ({var2} < 1000))"]:
+        data_expected, flagger_expected = evalExpression(expr, data, var1, flagger)
+        data_result, flagger_result = evalExpression(expr, data, var1, flagger, dsl_backend="numba")
+        assert data_result.equals(data_expected)
+        assert (flagger_result.isFlagged() == flagger_expected.isFlagged()).all(axis=None)
+
+
+@pytest.mark.parametrize("flagger", TESTFLAGGER[:2])
+def test_numbaBackendErrors(data, flagger):
+    var1, *_ = data.columns
+    flagger = flagger.initFlags(data)
+
+    with pytest.raises(TypeError):
+        evalExpression(f"flagGeneric(func=~({var1} * 2))", data.astype(float), var1, flagger, dsl_backend="numba")
+
+    with pytest.raises(ValueError):
+        evalExpression(f"flagGeneric(func={var1} > 2)", data, var1, flagger, dsl_backend="cython")
+
+
+@pytest.mark.parametrize("flagger", TESTFLAGGER)
+def test_windowFunctions(data, flagger):
+    data = data.astype(float)
+    data.iloc[::7, 0] = np.nan
+    # NOTE: irregular timestamps
+    data = data.drop(data.index[5:50:3])
+    flagger = flagger.initFlags(data)
+    var1, var2, *_ = data.columns
+    this = data[var1]
+
+    tests = [
+        ('rolling_mean(this, "3h")', this.rolling("3h").mean()),
+        ('rolling_std(this, "1d")', this.rolling("1d").std()),
+        ('rolling_max(this, "2h")', this.rolling("2h").max()),
+        ("rolling_mean(this, 4)", this.rolling(4, min_periods=1).mean()),
+        ("shift(this)", this.shift()),
+        ("shift(this, -2)", this.shift(-2)),
+        ("diff(this, 3)", this.diff(3)),
+        (f'this - rolling_mean({var2} * 2, "1h")', this - (data[var2] * 2).rolling("1h").mean()),
+    ]
+
+    for expr, expected in tests:
+        for dsl_backend in ("pandas", "numba"):
+            result_data, _ = evalExpression(f"procGeneric(func={expr})", data, var1, flagger, dsl_backend=dsl_backend)
+            assert np.allclose(result_data[var1], expected, equal_nan=True)
+
+
+@pytest.mark.parametrize("flagger", TESTFLAGGER)
+def test_windowFunctionsConfig(data, flagger):
+    var1, *_ = data.columns
+
+    config = f"""
+    {F.VARNAME} ; {F.TESTS}
+    {var1}      ; flagGeneric(func=abs(this - rolling_mean(this, "1h")) > 3 * rolling_std(this, "1h"))
+    """
+    _, flagger_result = run(initMetaString(config, data)[0], flagger, data)
+    assert not flagger_result.isFlagged(var1).any()
+
+    config = f"""
+    {F.VARNAME} ; {F.TESTS}
+    {var1}      ; flagGeneric(func=rolling_mean(this, "1h") > var_unknown)
+    """
+    with pytest.raises(NameError):
+        run(initMetaString(config, data)[0], flagger, data)
+
+    # NOTE: strings are only valid windows and checked along with the configuration
+    for expr, error in [
+        ('rolling_mean(this, "1x") > 0', ValueError),
+        ('rolling_max(this, "-1h") > 0', ValueError),
+        ('this + "a" > 0', TypeError),
+        ('rolling_mean("1h", this) > 0', TypeError),
+    ]:
+        config = f"""
+        {F.VARNAME} ; {F.TESTS}
+        {var1}      ; flagGeneric(func={expr})
+        """
+        with pytest.raises(error):
+            compilePlan(initMetaString(config, data)[0], data.columns, flagger)
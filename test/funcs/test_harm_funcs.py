@@ -1,25 +1,38 @@
 #! /usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import contextvars
+
 import pytest
 
 import numpy as np
 import pandas as pd
 
-from test.common import TESTFLAGGER, initData
+from test.common import TESTFLAGGER, initData, initMetaDict
 
+from saqc.core.core import run
+from saqc.core.config import Fields as F
+from saqc.lib.tools import getFuncFromInput
+from saqc.lib.scope import runScope
 from saqc.funcs.harm_functions import (
+    HarmonizationHeap,
+    harmWrapper,
     harm_harmonize,
     harm_deharmonize,
     _interpolate,
     _interpolateGrid,
     _insertGrid,
     _outsortCrap,
+    _backtrackFlags,
+    _toMerged,
     harm_linear2Grid,
     harm_interpolate2Grid,
     harm_shift2Grid,
     harm_aggregate2Grid,
     harm_downsample,
+    harm_harmonizeFields,
+    harm_deharmonizeFields,
+    _downsampleBins,
 )
 
 
@@ -35,6 +48,15 @@ INTERPOLATIONS2 = ["fagg", "time", "polynomial"]
 
 FREQS = ["15min", "30min"]
 
+BINFUNCS = ["sum", "mean", "min", "max", "median", "count"]
+
+
+@pytest.fixture(autouse=True)
+def scope():
+    # NOTE: the harmonization stores its backtracking information in the run scope
+    with runScope() as scope:
+        yield scope
+
 
 @pytest.fixture
 def data():
@@ -120,6 +142,68 @@ def test_heapConsistency(data, flagger):
     assert np.all(data.dropna() == data_deharm.dropna())
 
 
+@pytest.mark.parametrize("flagger", TESTFLAGGER)
+def test_harmRunScope(data, flagger):
+    freq = "15Min"
+
+    # NOTE: a new context does not see the scope of the `scope` fixture
+    with pytest.raises(RuntimeError):
+        contextvars.Context().run(harm_harmonize, data, "data", flagger.initFlags(data), freq, "time", "nshift")
+
+    with runScope() as scope:
+        heap = scope.get("harmonization", HarmonizationHeap)
+        data_harm, flagger_harm = harm_harmonize(data, "data", flagger.initFlags(data), freq, "time", "nshift")
+        assert len(heap) == 1
+        data_deharm, flagger_deharm = harm_deharmonize(data_harm, "data", flagger_harm)
+        assert len(heap) == 0
+
+    assert data.equals(data_deharm)
+    assert (data.index == flagger_deharm.getFlags().index).all()
+
+
+@pytest.mark.parametrize("flagger", TESTFLAGGER)
+def test_harmSpilledHeap(data, flagger, tmp_path):
+    flagger = flagger.initFlags(data)
+
+    result = {}
+    for spill_threshold in [None, 0]:
+        heap = HarmonizationHeap(spill_dir=str(tmp_path), spill_threshold=spill_threshold)
+        harmonize, deharmonize = harmWrapper(heap=heap)
+        data_harm, flagger_harm = harmonize(data, "data", flagger, "15min", "time", "nshift")
+        assert (len(list(tmp_path.iterdir())) > 0) == (spill_threshold is not None)
+        flagger_harm = flagger_harm.setFlags("data", loc=data_harm.index[3:4])
+        result[spill_threshold] = deharmonize(data_harm, "data", flagger_harm)
+        assert len(heap) == 0
+        assert len(list(tmp_path.iterdir())) == 0
+
+    (data_mem, flagger_mem), (data_spill, flagger_spill) = result[None], result[0]
+    assert data.equals(data_spill)
+    assert data_mem.equals(data_spill)
+    assert flagger_mem.getFlags().equals(flagger_spill.getFlags())
+
+
+@pytest.mark.parametrize("flagger", TESTFLAGGER)
+def test_harmSpillOptions(flagger, tmp_path, monkeypatch):
+    spilled = []
+    _spill = HarmonizationHeap._spill
+
+    def spill(self, field, entry):
+        spilled.append((field, self.spill_dir))
+        return _spill(self, field, entry)
+
+    monkeypatch.setattr(HarmonizationHeap, "_spill", spill)
+
+    data = initData(1, end_date="2017-01-02", freq="10min")
+    tests = ["harmonize(freq='15min', inter_method='time', reshape_method='nshift')", "deharmonize()"]
+    fobj, _ = initMetaDict([{F.VARNAME: "var1", F.TESTS: t} for t in tests], data)
+
+    # NOTE: the options only apply to a new scope, not to the one of the `scope` fixture
+    data_result, _ = contextvars.Context().run(run, fobj, flagger, data, spill_dir=str(tmp_path), spill_threshold=0)
+    assert spilled == [("var1", str(tmp_path))]
+    assert data_result["var1"].equals(data["var1"])
+    assert len(list(tmp_path.iterdir())) == 0
+
+
 @pytest.mark.parametrize("flagger", TESTFLAGGER)
 @pytest.mark.parametrize("reshaper", RESHAPERS)
 @pytest.mark.parametrize("co_flagging", COFLAGGING)
@@ -273,6 +357,36 @@ def test_multivariatHarmonization(multi_data, flagger, shift_comment):
     assert (pre_flags.index == flags.index).all()
 
 
+@pytest.mark.parametrize("flagger", TESTFLAGGER)
+@pytest.mark.parametrize("fields", ["data.*", ["data", "data2", "data3"]])
+def test_harmonizeFields(multi_data, flagger, fields):
+    flagger = flagger.initFlags(multi_data)
+    freq = "15min"
+
+    # the sequential way
+    exp_harm_data, exp_harm_flagger = multi_data, flagger
+    for var in multi_data.columns:
+        exp_harm_data, exp_harm_flagger = harm_harmonize(exp_harm_data, var, exp_harm_flagger, freq, "time", "nshift")
+    exp_data, exp_flagger = exp_harm_data, exp_harm_flagger
+    for var in multi_data.columns:
+        exp_data, exp_flagger = harm_deharmonize(exp_data, var, exp_flagger)
+
+    data, flagger_harm = harm_harmonizeFields(multi_data, "data", flagger, freq, "time", "nshift", fields=fields)
+    assert exp_harm_data.equals(data)
+    assert exp_harm_flagger.getFlags().equals(flagger_harm.getFlags())
+
+    data, flagger_deharm = harm_deharmonizeFields(data, "data", flagger_harm, fields=fields)
+    assert multi_data.equals(data[multi_data.columns])
+    assert exp_data[multi_data.columns].equals(data[multi_data.columns])
+    # NOTE:
+    # the sequential deharmonization leaves nan flags for the missing values
+    # of the variables deharmonized first, we get them flagged
+    exp_flags = exp_flagger.getFlags()[multi_data.columns]
+    flags = flagger_deharm.getFlags()[multi_data.columns]
+    assert flags[exp_flags.notna()].equals(exp_flags[exp_flags.notna()])
+    assert flags.isna().sum().sum() == 0
+
+
 @pytest.mark.parametrize("method", INTERPOLATIONS2)
 def test_gridInterpolation(data, method):
     freq = "15min"
@@ -307,6 +421,119 @@ def test_outsortCrap(data, flagger):
     assert f_drop.index.sort_values().equals(drop_index.sort_values())
 
 
+@pytest.mark.parametrize("flagger", TESTFLAGGER)
+@pytest.mark.parametrize("co_flagging", COFLAGGING)
+def test_backtrackFlags(flagger, co_flagging):
+    pre_index = pd.DatetimeIndex(["2020-01-01 00:00", "2020-01-01 00:25"])
+    grid = pd.date_range("2020-01-01 00:00", "2020-01-01 00:30", freq="10min")
+    flagger_pre = flagger.initFlags(pd.DataFrame({"data": [1.0, 2.0]}, index=pre_index))
+    flagger_post = flagger.initFlags(pd.DataFrame({"data": np.arange(len(grid))}, index=grid))
+    flagger_post = flagger_post.setFlags("data", loc=grid[:1], flag=flagger.BAD)
+    flagger_post = flagger_post.setFlags("data", loc=grid[1:2], flag=flagger.GOOD)
+
+    flags = _backtrackFlags(flagger_post, flagger_pre, "10min", "invert_fshift", co_flagging=co_flagging).getFlags()
+
+    # both, 00:00 and 00:10, are projected back onto 00:00 -> the worse flag wins
+    exp = [flagger.BAD, flagger.UNFLAGGED]
+    assert (flags["data"] == exp).all()
+
+
+@pytest.mark.parametrize("flagger", TESTFLAGGER)
+def test_deharmonizeDrops(flagger):
+    index = pd.DatetimeIndex(["2011-01-01 00:00", "2011-01-01 00:14", "2011-01-01 00:16", "2011-01-01 00:30"])
+    data = pd.DataFrame({"data": [1.0, 2.0, 3.0, 4.0]}, index=index)
+    flagger = flagger.initFlags(data).setFlags("data", loc=index[1:2], flag=flagger.GOOD)
+
+    data_harm, flagger_harm = harm_harmonize(
+        data, "data", flagger, "15min", "time", "nshift", drop_flags=[flagger.GOOD]
+    )
+    flagger_harm = flagger_harm.setFlags("data", loc=data_harm.index[1:2], flag=flagger.BAD)
+    data_deharm, flagger_deharm = harm_deharmonize(data_harm, "data", flagger_harm)
+
+    # the dropped value at 00:14 keeps its flag, the flag of the grid point 00:15 is projected onto 00:16
+    assert data_deharm["data"].equals(data["data"])
+    exp = [flagger.UNFLAGGED, flagger.GOOD, flagger.BAD, flagger.UNFLAGGED]
+    assert (flagger_deharm.getFlags()["data"] == exp).all()
+
+
+def _backtrackFlagsReference(flagger_post, flagger_pre, freq, track_method, co_flagging):
+    # NOTE: the former implementation of `_backtrackFlags`, based on reindexing and merging the flags frames
+    flags_post = flagger_post.getFlags()
+    flags_pre = flagger_pre.getFlags()
+    flags_header = flags_post.columns
+    tolerance = pd.Timedelta(freq)
+    if co_flagging is True:
+        method = {"invert_fshift": "bfill", "invert_bshift": "ffill"}.get(track_method, "nearest")
+        if method == "nearest":
+            tolerance = tolerance / 2
+        flags_post = flags_post.reindex(flags_pre.index, method=method, tolerance=tolerance)
+        replacement_mask = flags_post.squeeze() > flags_pre.squeeze()
+        flags_pre = flags_pre.squeeze(axis=1)
+        flags_post = flags_post.squeeze(axis=1)
+        flags_pre.loc[replacement_mask] = flags_post.loc[replacement_mask]
+    else:
+        method = {"invert_fshift": "backward", "invert_bshift": "forward"}.get(track_method, "nearest")
+        if method == "nearest":
+            tolerance = tolerance / 2
+        flags_post = pd.merge_asof(
+            flags_post,
+            pd.DataFrame(flags_pre.index.values, index=flags_pre.index, columns=["pre_index"]),
+            left_index=True,
+            right_index=True,
+            tolerance=tolerance,
+            direction=method,
+        )
+        flags_post.dropna(subset=["pre_index"], inplace=True)
+        flags_post.set_index(["pre_index"], inplace=True)
+        flags_post.columns = flags_header
+        # NOTE: the worst of several grid points projected onto the same original timestamp wins
+        flags_post = flags_post.groupby(level=0).max()
+        replacement_mask = flags_post.squeeze() > flags_pre.loc[flags_post.index, :].squeeze()
+        flags_pre = flags_pre.squeeze(axis=1)
+        flags_post = flags_post.squeeze(axis=1)
+        flags_pre.loc[replacement_mask[replacement_mask].index] = flags_post.loc[replacement_mask]
+    return flags_pre
+
+
+@pytest.mark.parametrize("flagger", TESTFLAGGER)
+@pytest.mark.parametrize("co_flagging", COFLAGGING)
+@pytest.mark.parametrize("track_method", ["invert_fshift", "invert_bshift", "invert_nearest"])
+def test_backtrackFlagsReference(flagger, co_flagging, track_method):
+    rng = np.random.RandomState(42)
+    start = pd.Timestamp("2020-01-01")
+    pre_index = pd.DatetimeIndex(start + pd.to_timedelta(np.unique(rng.randint(0, 600, 40)), unit="min"))
+    # NOTE: a grid finer than the tolerance, several grid points are projected onto the same original timestamp
+    grid = pd.date_range(start, start + pd.Timedelta("10h"), freq="2min")
+    flagger_pre = flagger.initFlags(pd.DataFrame({"data": np.arange(len(pre_index))}, index=pre_index))
+    flagger_post = flagger.initFlags(pd.DataFrame({"data": np.arange(len(grid))}, index=grid))
+    for flag in [flagger.GOOD, flagger.BAD]:
+        flagger_pre = flagger_pre.setFlags("data", loc=pre_index[rng.rand(len(pre_index)) > 0.7], flag=flag)
+        flagger_post = flagger_post.setFlags("data", loc=grid[rng.rand(len(grid)) > 0.7], flag=flag, force=True)
+
+    flags = _backtrackFlags(flagger_post, flagger_pre, "10min", track_method, co_flagging=co_flagging).getFlags()
+    exp = _backtrackFlagsReference(flagger_post, flagger_pre, "10min", track_method, co_flagging)
+    assert flags["data"].equals(exp)
+
+
+@pytest.mark.parametrize("flagger", TESTFLAGGER)
+def test_toMerged(multi_data, flagger):
+    flagger = flagger.initFlags(multi_data)
+    pre_flags = flagger.getFlags()
+
+    to_insert = multi_data["data"].dropna().resample("15min").mean()
+    flagger_to_insert = flagger.initFlags(to_insert.to_frame())
+    data, flagger_out = _toMerged(multi_data, flagger, "data", to_insert, flagger_to_insert)
+
+    # the passed flagger is left untouched
+    assert pre_flags.equals(flagger.getFlags())
+    assert data.columns.equals(multi_data.columns[[1, 2, 0]])
+    assert data.index.equals(flagger_out.getFlags().index)
+    assert data["data"].dropna().equals(to_insert.dropna())
+    # rows only present, because of the harmonized variable are gone
+    dropped = multi_data.index.difference(data.index)
+    assert multi_data.loc[dropped, ["data2", "data3"]].isna().all(axis=None)
+
+
 @pytest.mark.parametrize("flagger", TESTFLAGGER)
 def test_wrapper(data, flagger):
     # we are only testing, whether the wrappers do pass processing:
@@ -318,3 +545,26 @@ def test_wrapper(data, flagger):
     harm_aggregate2Grid(data, field, flagger, freq, value_func="sum", flag_func="max", method="nagg", drop_flags=None)
     harm_shift2Grid(data, field, flagger, freq, method="nshift", drop_flags=None)
     harm_interpolate2Grid(data, field, flagger, freq, method="spline")
+
+
+@pytest.mark.parametrize("sample_func", [None] + BINFUNCS)
+@pytest.mark.parametrize("agg_func", BINFUNCS)
+@pytest.mark.parametrize("max_invalid", [np.inf, 2])
+def test_downsampleBins(sample_func, agg_func, max_invalid):
+    # the native bin reduction needs to match the nested resampling it replaces
+    index = pd.date_range("2011-01-01 02:13:00", "2011-01-03", freq="7min")
+    data = pd.Series(np.sin(np.arange(len(index))), index=index)
+    data = data.drop(data["2011-01-01 09:00":"2011-01-01 14:21"].index)
+    data.iloc[::11] = np.nan
+
+    agg = getFuncFromInput(agg_func)
+
+    def aggregator(x):
+        if sample_func is not None:
+            x = getattr(x.resample("30min"), sample_func)()
+        return agg(x) if x.isna().sum() < max_invalid else np.nan
+
+    expected = data.resample("3h").apply(aggregator)
+    result = _downsampleBins(data, "3h", "30min", sample_func, agg_func, max_invalid)
+    assert result.index.equals(expected.index)
+    assert np.allclose(result, expected.astype(float), equal_nan=True)
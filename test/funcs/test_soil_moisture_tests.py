@@ -5,7 +5,12 @@ import pytest
 import numpy as np
 import pandas as pd
 
+import saqc.lib.tools
 from saqc.funcs.soil_moisture_tests import sm_flagFrost, sm_flagPrecipitation, sm_flagConstants, sm_flagRandomForest
+from saqc.lib.scope import runScope
+from saqc.lib.cache import resultCache
+from saqc.lib.tools import retrieveTrustworthyOriginal
+from saqc.lib.sampling import estimateSamplingRate, samplingRate
 
 from test.common import TESTFLAGGER, initData
 
@@ -54,6 +59,70 @@ def test_sm_flagConstantss(flagger):
     assert (flagger.isFlagged()[100:120]).all()[0]
 
 
+@pytest.mark.parametrize("flagger", TESTFLAGGER)
+def test_retrieveTrustworthyOriginalCache(flagger, monkeypatch):
+    data = initData(1, start_date="2011-01-01 00:00:00", end_date="2011-01-02 00:00:00", freq="5min")
+    field = data.columns[0]
+    flagger = flagger.initFlags(data)
+
+    calls = []
+    compute = saqc.lib.tools._retrieveTrustworthyOriginal
+    monkeypatch.setattr(
+        saqc.lib.tools, "_retrieveTrustworthyOriginal", lambda *args: calls.append(args) or compute(*args)
+    )
+
+    with runScope():
+        # NOTE: both, `constants_flagVarianceBased` and `sm_flagConstants` itself, need the original series
+        sm_flagConstants(data, field, flagger, window="1h", precipitation_window="1h")
+        assert len(calls) == 1
+
+        series, rate = retrieveTrustworthyOriginal(data, field, flagger)
+        series[:] = 0
+        cached, cached_rate = retrieveTrustworthyOriginal(data.copy(), field, flagger)
+        assert len(calls) == 1
+        assert cached.equals(data[field]) and cached_rate == rate
+
+        flagged = flagger.setFlags(field, iloc=slice(0, 10))
+        trimmed, _ = retrieveTrustworthyOriginal(data, field, flagged)
+        assert len(calls) == 2
+        assert trimmed.equals(data[field].iloc[10:])
+
+        retrieveTrustworthyOriginal(data, field, flagged, level=flagger.BAD)
+        assert len(calls) == 3
+
+
+@pytest.mark.parametrize("freq", ["250ms", "15min", "2D", "1D2h"])
+def test_estimateSamplingRate(freq):
+    index = pd.date_range("2011-01-01", periods=100, freq=freq)
+    estimate = estimateSamplingRate(index)
+    assert estimate.rate == pd.Timedelta(freq) and estimate.regular
+    assert pd.Timedelta(estimate.offset) == pd.Timedelta(freq)
+
+    # gaps, duplicates and off-grid timestamps do not change the dominant interval
+    irregular = index.delete([10, 11, 12, 50]).append(index[[70]] + pd.Timedelta(freq) / 3).sort_values()
+    irregular = irregular.append(irregular[-1:])
+    estimate = estimateSamplingRate(irregular)
+    assert estimate.rate == pd.Timedelta(freq) and not estimate.regular
+    assert estimate.intervals.sum() == len(irregular) - 2
+    assert 0.9 < estimate.share < 1
+
+    empty = estimateSamplingRate(index[:1])
+    assert pd.isnull(empty.rate) and empty.offset is None and empty.intervals.empty
+
+
+def test_samplingRateCache():
+    data = initData(2, start_date="2011-01-01 00:00:00", end_date="2011-01-02 00:00:00", freq="5min")
+    var1, var2 = data.columns
+    data.iloc[::2, 0] = np.nan
+    with runScope():
+        assert samplingRate(data, var1).rate == pd.Timedelta("10min")
+        assert samplingRate(data, var2).rate == pd.Timedelta("5min")
+        assert samplingRate(data.copy(), var1).intervals.equals(samplingRate(data, var1).intervals)
+        data.iloc[:, 0] = 1.0
+        resultCache().touch(var1)
+        assert samplingRate(data.copy(), var1).rate == pd.Timedelta("5min")
+
+
 @pytest.mark.parametrize("flagger", TESTFLAGGER)
 def test_sm_flagRandomForest(flagger):
     ### CREATE MWE DATA